@@ -2,8 +2,14 @@
 YouTube Downloader Backend Application
 """
 
-# 導出 Celery 應用程式
-from .celery import celery_app
-
 __version__ = "0.1.0"
 __author__ = "Your Name"
+
+
+def __getattr__(name):
+    # Celery 應用（及其加載的任務模塊）在第一次訪問 celery_app 屬性時才導入；
+    # 模塊以 backend/ 為根導入（與 celery -A celery_app 一致），需在 sys.path 中
+    if name == "celery_app":
+        from celery_app import celery_app
+        return celery_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,45 @@
+"""Alembic 遷移環境：數據庫 URL 取自 DATABASE_URL（與應用一致），而非 alembic.ini"""
+
+from logging.config import fileConfig
+
+from alembic import context
+
+from db.base import Base, engine
+import models  # noqa: F401  註冊所有模型到 Base.metadata
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """生成 SQL 腳本而不連接數據庫: alembic upgrade head --sql"""
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite 不支持大部分 ALTER TABLE，以重建表的方式遷移
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,51 @@
+"""create download_tasks
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "download_tasks",
+        sa.Column("id", sa.String(length=64), nullable=False),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("url", sa.Text(), nullable=True),
+        sa.Column("video_id", sa.String(length=32), nullable=True),
+        sa.Column("format", sa.String(length=16), nullable=True),
+        sa.Column("quality", sa.String(length=16), nullable=True),
+        sa.Column("priority", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("stage", sa.String(length=16), nullable=True),
+        sa.Column("progress", sa.Integer(), nullable=True),
+        sa.Column("title", sa.Text(), nullable=True),
+        sa.Column("size", sa.BigInteger(), nullable=True),
+        sa.Column("download_url", sa.Text(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("timings", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_download_tasks_created_at", "download_tasks", ["created_at"])
+    op.create_index("ix_download_tasks_video_id", "download_tasks", ["video_id"])
+    op.create_index("ix_download_tasks_status_created_at", "download_tasks", ["status", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_download_tasks_status_created_at", table_name="download_tasks")
+    op.drop_index("ix_download_tasks_video_id", table_name="download_tasks")
+    op.drop_index("ix_download_tasks_created_at", table_name="download_tasks")
+    op.drop_table("download_tasks")
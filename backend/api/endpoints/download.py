@@ -1,29 +1,89 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, Tuple
+import asyncio
+import json
+import logging
 from datetime import datetime
 
+from core.bandwidth import BandwidthScheduler, get_bandwidth_scheduler
+from core.config import settings
+from core.dispatch import dispatch_playlist
+from core.downloader import DownloadError, VideoUnavailable, get_downloader, summarize_info
+from core.events import TERMINAL_STATUSES, EventBus, get_event_bus
+from core.metadata_cache import MetadataCache, get_metadata_cache
+from core.pagination import decode_cursor, encode_cursor
+from core.result_cache import ResultCache, get_result_cache
+from core.singleflight import InFlightRegistry, get_inflight_registry
+from core.storage import StorageManager, get_storage_manager
+from core.submission import DownloadRequest, DownloadTask, new_task, submit_downloads
+from core.task_store import TaskStore, get_task_store
+
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # 數據模型
-class DownloadRequest(BaseModel):
-    url: str
-    format: Optional[str] = "mp4"
-    quality: Optional[str] = "720p"
-
-class DownloadTask(BaseModel):
-    id: str
-    url: str
-    format: str
-    quality: str
-    status: str
-    created_at: str
-    progress: Optional[int] = 0
-    download_url: Optional[str] = None
-
-# 模擬數據存儲
-download_tasks = {}
+class PlaylistTask(DownloadTask):
+    # 匯總欄位見 tasks/playlist.py
+    kind: str = "playlist"
+    title: Optional[str] = None
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    bytes: int = 0
+    batches: int = 0
+    batches_done: int = 0
+    expanded: bool = False
+    elapsed: Optional[float] = None
+    # 字節每秒（已完成文件總大小 / 從提交到結束的時間）
+    throughput: Optional[float] = None
+    error: Optional[str] = None
+    children: List[str] = []
+
+class TaskPage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+    limit: int
+
+class VideoInfo(BaseModel):
+    id: Optional[str] = None
+    title: Optional[str] = None
+    duration: Optional[float] = None
+    uploader: Optional[str] = None
+    thumbnail: Optional[str] = None
+    webpage_url: Optional[str] = None
+    formats: List[Dict[str, Any]] = []
+
+class BandwidthLimits(BaseModel):
+    # 0 表示不限制；未提供的欄位保持不變
+    global_bps: Optional[int] = Field(None, ge=0)
+    worker_bps: Optional[int] = Field(None, ge=0)
+    host_connections: Optional[int] = Field(None, ge=0)
+
+class FilePin(BaseModel):
+    pinned: bool
+
+class BatchItemResult(BaseModel):
+    index: int
+    task: Optional[DownloadTask] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[BatchItemResult]
+
+TASK_FIELDS = list(DownloadTask.model_fields)
+
+def history_item(row) -> Dict[str, Any]:
+    item = {column: getattr(row, column) for column in row.__table__.columns.keys()}
+    for column in ("created_at", "updated_at", "completed_at"):
+        if item[column] is not None:
+            item[column] = item[column].isoformat()
+    return item
 
 @router.get("/test")
 async def test_endpoint():
@@ -37,46 +97,399 @@ async def test_endpoint():
         }
     }
 
-@router.get("/tasks", response_model=List[DownloadTask])
-async def list_tasks():
-    """獲取所有下載任務"""
-    return list(download_tasks.values())
+# 任務存儲可能是 Redis（阻塞 IO），以下端點使用同步函數，由 FastAPI 在線程池中執行
+@router.get("/tasks", response_model=TaskPage)
+def list_tasks(
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.TASK_LIST_DEFAULT_LIMIT, ge=1, le=settings.TASK_LIST_MAX_LIMIT),
+    status: Optional[str] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="以逗號分隔的返回欄位，例如 id,status,progress"),
+    store: TaskStore = Depends(get_task_store),
+):
+    """分頁獲取下載任務（按創建時間升序），以 next_cursor 請求下一頁"""
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    projection = None
+    if fields:
+        projection = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(projection) - set(TASK_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"未知欄位: {', '.join(sorted(unknown))}")
+
+    items, next_key = store.list_page(limit, after=after, status=status, format=format)
+    items = [{f: item.get(f) for f in (projection or TASK_FIELDS)} for item in items]
+
+    # 存儲中的記錄在寫入時已通過 DownloadTask 校驗，這裡直接序列化，避免逐條重新驗證
+    return JSONResponse({
+        "items": items,
+        "next_cursor": encode_cursor(next_key),
+        "limit": limit,
+    })
+
+# 歷史查詢使用異步會話，在事件循環中等待數據庫而不佔用線程池；
+# SQLAlchemy 與數據庫模型在第一次查詢時才導入，不計入 API 進程的啟動時間
+async def get_history_db():
+    from db.base import get_async_db
+
+    async for session in get_async_db():
+        yield session
+
+@router.get("/history", response_model=TaskPage)
+async def list_history(
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.TASK_LIST_DEFAULT_LIMIT, ge=1, le=settings.TASK_LIST_MAX_LIMIT),
+    status: Optional[str] = None,
+    video_id: Optional[str] = None,
+    db=Depends(get_history_db),
+):
+    """
+    分頁查詢數據庫中的任務歷史（按創建時間倒序），包括已從任務存儲中刪除的任務
+
+    以 (created_at, id) 做 keyset 分頁，過濾與排序都走索引，不隨歷史行數變慢。
+    最近幾秒內的狀態變化可能尚未寫入（見 TASK_HISTORY_FLUSH_INTERVAL）。
+    """
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    from sqlalchemy import and_, or_, select
+    from models import DownloadTaskRecord
+
+    query = select(DownloadTaskRecord)
+    if status:
+        query = query.where(DownloadTaskRecord.status == status)
+    if video_id:
+        query = query.where(DownloadTaskRecord.video_id == video_id)
+    if before:
+        created_at = datetime.fromtimestamp(before[0])
+        query = query.where(or_(
+            DownloadTaskRecord.created_at < created_at,
+            and_(DownloadTaskRecord.created_at == created_at, DownloadTaskRecord.id < before[1]),
+        ))
+    query = query.order_by(DownloadTaskRecord.created_at.desc(), DownloadTaskRecord.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).scalars().all()
+
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_key = (rows[-1].created_at.timestamp(), rows[-1].id)
+    return JSONResponse({
+        "items": [history_item(row) for row in rows],
+        "next_cursor": encode_cursor(next_key),
+        "limit": limit,
+    })
 
 @router.post("/tasks", response_model=DownloadTask)
-async def create_task(request: DownloadRequest):
-    """創建新的下載任務"""
-    task_id = str(uuid.uuid4())[:8]
-    
-    task = DownloadTask(
-        id=task_id,
-        url=request.url,
-        format=request.format,
-        quality=request.quality,
-        status="queued",
-        created_at=datetime.now().isoformat()
+def create_task(
+    request: DownloadRequest,
+    store: TaskStore = Depends(get_task_store),
+    cache: ResultCache = Depends(get_result_cache),
+    registry: InFlightRegistry = Depends(get_inflight_registry),
+    metadata: MetadataCache = Depends(get_metadata_cache),
+):
+    """
+    創建新的下載任務
+
+    相同影片已下載過時直接返回已完成的任務；正在排隊或下載時返回該進行中的任務。
+    已知不可用的影片直接返回 422。
+    """
+    task, error = submit_downloads([request], store, cache, registry, metadata)[0]
+    if task is None:
+        raise HTTPException(status_code=422, detail=error)
+    if error:
+        raise HTTPException(status_code=503, detail=error)
+    return task
+
+async def _read_batch_items(request: Request) -> List[Any]:
+    """
+    讀取 JSON 數組或 NDJSON 流形式的批量請求體
+
+    NDJSON 隨數據塊到達逐行切分，每塊只掃描一次；行數超過上限時停止讀取。
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items: List[Any] = []
+        line = bytearray()
+        async for chunk in request.stream():
+            start = 0
+            while (end := chunk.find(b"\n", start)) >= 0:
+                line += chunk[start:end]
+                if line.strip():
+                    items.append(bytes(line))
+                line.clear()
+                start = end + 1
+            line += chunk[start:]
+            if len(items) > settings.TASK_BATCH_MAX_SIZE:
+                return items
+        if line.strip():
+            items.append(bytes(line))
+        return items
+
+    body = await request.body()
+    try:
+        items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="請求體不是有效的 JSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="請求體必須是 JSON 數組")
+    return items
+
+@router.post("/tasks/batch", response_model=BatchResponse)
+async def create_tasks_batch(
+    request: Request,
+    store: TaskStore = Depends(get_task_store),
+    cache: ResultCache = Depends(get_result_cache),
+    registry: InFlightRegistry = Depends(get_inflight_registry),
+    metadata: MetadataCache = Depends(get_metadata_cache),
+):
+    """
+    批量創建下載任務
+
+    接受 JSON 數組或 NDJSON（application/x-ndjson）。所有有效項目在一次存儲往返中寫入，
+    並以一個 Celery group 投遞；無效項目在結果中返回各自的錯誤。
+    緩存命中與進行中去重的規則與單個創建相同。
+    """
+    raw_items = await _read_batch_items(request)
+    if len(raw_items) > settings.TASK_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"單次最多提交 {settings.TASK_BATCH_MAX_SIZE} 個任務"
+        )
+
+    results: List[BatchItemResult] = []
+    valid: List[Tuple[BatchItemResult, DownloadRequest]] = []
+    for index, raw in enumerate(raw_items):
+        try:
+            if isinstance(raw, (bytes, str)):
+                item = DownloadRequest.model_validate_json(raw)
+            else:
+                item = DownloadRequest.model_validate(raw)
+        except ValidationError as e:
+            results.append(BatchItemResult(index=index, error=e.errors(include_url=False)[0]["msg"]))
+            continue
+        result = BatchItemResult(index=index)
+        results.append(result)
+        valid.append((result, item))
+
+    submitted = await run_in_threadpool(
+        submit_downloads, [item for _, item in valid], store, cache, registry, metadata
     )
+    for (result, _), (task, error) in zip(valid, submitted):
+        result.task = task
+        result.error = error
+
+    accepted = sum(1 for r in results if r.error is None)
+    return BatchResponse(accepted=accepted, rejected=len(results) - accepted, results=results)
+
+@router.get("/tasks/{task_id}", response_model=DownloadTask)
+def get_task(
+    task_id: str,
+    store: TaskStore = Depends(get_task_store),
+    registry: InFlightRegistry = Depends(get_inflight_registry),
+):
+    """
+    獲取下載任務詳情
+
+    下載中的任務失去租約說明 worker 已停止心跳，響應中報告為失敗讓客戶端重新提交。
+    只讀不寫：worker 可能仍在收尾或重新取得租約，任務狀態只由 worker 寫入
+    （worker 崩潰時任務由 Celery 重新投遞，之後照常更新）。
+    """
+    task = store.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="任務不存在")
     
-    download_tasks[task_id] = task.dict()
+    if task["status"] == "processing" and task.get("lease_key"):
+        if registry.owner(task["lease_key"]) != task_id:
+            task = dict(task, status="failed")
     
     return task
 
-@router.get("/tasks/{task_id}", response_model=DownloadTask)
-async def get_task(task_id: str):
-    """獲取下載任務詳情"""
-    if task_id not in download_tasks:
+def task_state(task: Dict[str, Any]) -> Dict[str, Any]:
+    """推送給客戶端的任務狀態"""
+    return {f: task.get(f) for f in TASK_FIELDS}
+
+@router.get("/tasks/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    store: TaskStore = Depends(get_task_store),
+    bus: EventBus = Depends(get_event_bus),
+):
+    """
+    以 Server-Sent Events 推送任務狀態
+
+    連接後先發送一次當前狀態，之後只在狀態變化時推送，任務結束後關閉流。
+    """
+    subscription = bus.subscribe([task_id])
+    await subscription.ready()
+    task = await run_in_threadpool(store.get, task_id)
+    if task is None:
+        subscription.close()
         raise HTTPException(status_code=404, detail="任務不存在")
-    
-    return download_tasks[task_id]
+
+    async def event_stream():
+        state = task_state(task)
+        try:
+            yield f"event: task\ndata: {json.dumps(state, ensure_ascii=False)}\n\n"
+            while state["status"] not in TERMINAL_STATUSES:
+                event = await subscription.get(timeout=settings.SSE_KEEPALIVE_INTERVAL)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                updated = dict(state, **{k: v for k, v in event.items() if k in state})
+                if updated == state:
+                    continue
+                state = updated
+                yield f"event: task\ndata: {json.dumps(state, ensure_ascii=False)}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/ws/tasks")
+async def tasks_websocket(
+    websocket: WebSocket,
+    store: TaskStore = Depends(get_task_store),
+    bus: EventBus = Depends(get_event_bus),
+):
+    """
+    多任務進度 WebSocket
+
+    客戶端發送 {"action": "subscribe" | "unsubscribe", "task_ids": [...]}，
+    服務端在訂閱時推送當前狀態，之後只在狀態變化時推送 {"type": "task", "task": {...}}。
+    """
+    await websocket.accept()
+    subscription = bus.subscribe()
+    states: Dict[str, Dict[str, Any]] = {}
+
+    async def receive_commands():
+        while True:
+            message = await websocket.receive_json()
+            task_ids = [str(t) for t in message.get("task_ids", [])]
+            if message.get("action") == "unsubscribe":
+                subscription.remove(task_ids)
+                for task_id in task_ids:
+                    states.pop(task_id, None)
+                continue
+            subscription.add(task_ids)
+            await subscription.ready()
+            for task_id in task_ids:
+                task = await run_in_threadpool(store.get, task_id)
+                if task is None:
+                    subscription.remove([task_id])
+                    await websocket.send_json({"type": "error", "task_id": task_id, "detail": "任務不存在"})
+                    continue
+                states[task_id] = task_state(task)
+                await websocket.send_json({"type": "task", "task": states[task_id]})
+
+    async def push_events():
+        while True:
+            event = await subscription.get()
+            state = states.get(event.get("id"))
+            if state is None:
+                continue
+            updated = dict(state, **{k: v for k, v in event.items() if k in state})
+            if updated == state:
+                continue
+            states[updated["id"]] = updated
+            await websocket.send_json({"type": "task", "task": updated})
+
+    tasks = [asyncio.create_task(receive_commands()), asyncio.create_task(push_events())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            exc = task.exception()
+            if exc is not None and not isinstance(exc, WebSocketDisconnect):
+                logger.warning("任務 WebSocket 異常關閉: %s", exc)
+    finally:
+        for task in tasks:
+            task.cancel()
+        subscription.close()
 
 @router.delete("/tasks/{task_id}")
-async def delete_task(task_id: str):
+def delete_task(task_id: str, store: TaskStore = Depends(get_task_store)):
     """刪除下載任務"""
-    if task_id not in download_tasks:
+    if not store.delete(task_id):
         raise HTTPException(status_code=404, detail="任務不存在")
     
-    del download_tasks[task_id]
     return {"message": "任務已刪除", "task_id": task_id}
 
+@router.post("/playlists", response_model=PlaylistTask)
+def create_playlist(request: DownloadRequest, store: TaskStore = Depends(get_task_store)):
+    """
+    下載播放列表或頻道
+
+    創建父任務後由 worker 惰性展開，子任務按批投遞；
+    父任務的 progress、completed / failed 隨各批結束更新，可用 /tasks/{task_id}/events 訂閱。
+    """
+    playlist = PlaylistTask(**new_task(request).model_dump())
+    record = playlist.model_dump()
+    store.create(record)
+    try:
+        dispatch_playlist(record)
+    except Exception as e:
+        logger.error("投遞播放列表任務失敗: %s", e)
+        store.update(playlist.id, status="failed")
+        raise HTTPException(status_code=503, detail="任務佇列暫時不可用")
+    return playlist
+
+@router.get("/playlists/{playlist_id}", response_model=PlaylistTask)
+def get_playlist(playlist_id: str, store: TaskStore = Depends(get_task_store)):
+    """獲取播放列表父任務的匯總進度與子任務 ID"""
+    playlist = store.get(playlist_id)
+    if playlist is None or playlist.get("kind") != "playlist":
+        raise HTTPException(status_code=404, detail="播放列表任務不存在")
+    return playlist
+
+@router.get("/info", response_model=VideoInfo)
+def get_video_info(url: str, metadata: MetadataCache = Depends(get_metadata_cache)):
+    """獲取影片元數據與可用格式（經元數據緩存）"""
+    try:
+        info = metadata.get_info(url, get_downloader().extract_info)
+    except VideoUnavailable as e:
+        raise HTTPException(status_code=404, detail=f"影片不可用: {e}")
+    except DownloadError as e:
+        raise HTTPException(status_code=502, detail=f"提取影片信息失敗: {e}")
+    return summarize_info(info)
+
+@router.get("/cache/stats")
+def get_cache_stats(
+    cache: ResultCache = Depends(get_result_cache),
+    metadata: MetadataCache = Depends(get_metadata_cache),
+):
+    """獲取下載結果緩存與元數據緩存的命中統計"""
+    return dict(cache.stats(), metadata=metadata.stats())
+
+@router.get("/bandwidth")
+def get_bandwidth(scheduler: BandwidthScheduler = Depends(get_bandwidth_scheduler)):
+    """獲取集群下載帶寬限額與本進程的調度統計"""
+    return scheduler.stats()
+
+@router.put("/bandwidth")
+def update_bandwidth(limits: BandwidthLimits, scheduler: BandwidthScheduler = Depends(get_bandwidth_scheduler)):
+    """運行時調整集群下載帶寬限額，各 worker 在 BANDWIDTH_CONFIG_REFRESH 秒內生效"""
+    return scheduler.set_limits(**limits.model_dump())
+
+@router.get("/storage")
+def get_storage(storage: StorageManager = Depends(get_storage_manager)):
+    """獲取下載目錄配額、水位、預留與淘汰統計"""
+    return storage.stats()
+
+@router.put("/storage/files/{filename}")
+def pin_file(filename: str, pin: FilePin, storage: StorageManager = Depends(get_storage_manager)):
+    """固定或取消固定下載文件，固定的文件不會被配額淘汰"""
+    if not storage.index.set_pinned(filename, pin.pinned):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return {"filename": filename, "pinned": pin.pinned}
+
 @router.get("/formats")
 async def get_available_formats():
     """獲取支持的格式"""
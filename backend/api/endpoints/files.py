@@ -0,0 +1,103 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+import logging
+import mimetypes
+import os
+
+from core.checkpoint import is_partial_file
+from core.config import settings
+from core.file_delivery import (
+    FileRangeResponse,
+    RangeNotSatisfiable,
+    etag_matches,
+    http_date,
+    if_range_matches,
+    not_modified_since,
+    parse_range,
+)
+from core.file_index import FileIndex, get_file_index
+from core.storage import StorageManager, get_storage_manager
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def resolve_download(filename: str) -> str:
+    """下載目錄中的文件路徑，拒絕目錄穿越、子目錄與未完成下載的臨時文件"""
+    if (not filename or filename != os.path.basename(filename) or filename.startswith(".")
+            or is_partial_file(filename)):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    path = os.path.join(settings.DOWNLOAD_DIR, filename)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return path
+
+def index_in_background(index: FileIndex, filename: str) -> None:
+    try:
+        index.index(filename)
+    except OSError as e:
+        logger.warning("計算文件摘要失敗 %s: %s", filename, e)
+
+# 文件索引可能是 Redis（阻塞 IO），處理函數為同步函數；文件內容由響應在事件循環中異步發送
+@router.api_route("/{filename}", methods=["GET", "HEAD"])
+def serve_download(
+    filename: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    index: FileIndex = Depends(get_file_index),
+    storage: StorageManager = Depends(get_storage_manager),
+):
+    """
+    發送下載文件
+
+    - 強 ETag 來自文件索引中的 SHA-256；尚未索引的文件使用弱 ETag 並在後台補算
+    - 支持 If-None-Match / If-Modified-Since（304）、Range 與多區間 Range（206）、If-Range
+    - 配置 DOWNLOAD_ACCEL_REDIRECT 時只返回 X-Accel-Redirect，由 nginx 發送文件內容
+    - 在後台記錄訪問時間，供配額淘汰按 LRU 順序選擇文件
+    """
+    path = resolve_download(filename)
+    stat = os.stat(path)
+    entry = index.lookup(filename, stat)
+    if entry is not None:
+        etag = f'"{entry["sha256"]}"'
+    else:
+        etag = f'W/"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        background_tasks.add_task(index_in_background, index, filename)
+    background_tasks.add_task(storage.touch, filename, entry)
+
+    headers = {
+        "etag": etag,
+        "last-modified": http_date(stat.st_mtime),
+        "accept-ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (if_none_match and etag_matches(if_none_match, etag)) or (
+        not if_none_match and if_modified_since and not_modified_since(if_modified_since, stat.st_mtime)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if settings.DOWNLOAD_ACCEL_REDIRECT:
+        headers["x-accel-redirect"] = settings.DOWNLOAD_ACCEL_REDIRECT.rstrip("/") + "/" + filename
+        return Response(headers=headers, media_type=media_type)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range_matches(if_range, etag, stat.st_mtime)):
+        try:
+            ranges = parse_range(range_header, stat.st_size, settings.FILE_MAX_RANGES)
+        except RangeNotSatisfiable:
+            headers["content-range"] = f"bytes */{stat.st_size}"
+            return Response(status_code=416, headers=headers)
+
+    return FileRangeResponse(
+        path,
+        stat.st_size,
+        media_type,
+        ranges=ranges,
+        headers=headers,
+        send_body=request.method != "HEAD",
+        chunk_size=settings.FILE_READ_CHUNK_SIZE,
+    )
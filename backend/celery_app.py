@@ -1,6 +1,15 @@
 from celery import Celery
+from celery.signals import (
+    before_task_publish, setup_logging, task_postrun, task_prerun, worker_init, worker_process_init,
+    worker_process_shutdown,
+)
+from kombu import Queue
 import os
 
+import logging_config
+from core import metrics
+from core.routing import DEFAULT_PRIORITY, DEFAULT_QUEUE, MAX_PRIORITY, WORKLOAD_QUEUES, broker_priority
+
 # 創建 Celery 應用實例
 celery_app = Celery(
     'youtube_downloader',
@@ -19,7 +28,87 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=30 * 60,  # 30分鐘
     task_soft_time_limit=25 * 60,  # 25分鐘
+    # 按工作量分隊列（audio / video-short / video-long / metadata），見 core/routing.py；
+    # 各隊列由獨立的 worker 池消費: celery -A celery_app worker -Q <隊列> --concurrency=<n>
+    task_queues=[Queue(DEFAULT_QUEUE)] + [Queue(name) for name in WORKLOAD_QUEUES],
+    task_default_queue=DEFAULT_QUEUE,
+    task_routes=("core.routing.route_task",),
+    # Redis broker 優先級：每個隊列拆為 0-9 共 10 個子隊列，數值越小越先消費
+    broker_transport_options={
+        "priority_steps": list(range(MAX_PRIORITY + 1)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
+    task_default_priority=broker_priority(DEFAULT_PRIORITY),
+    # 下載任務耗時長，每個 worker 進程只預取一個，避免高優先級任務排在已預取的任務後面
+    worker_prefetch_multiplier=1,
 )
 
+# prefork 子進程退出時不執行 atexit，在這裡寫入尚未刷新的任務歷史
+@worker_process_shutdown.connect
+def flush_task_history(**kwargs):
+    from core.config import settings
+    if settings.TASK_HISTORY_ENABLED:
+        from core.task_history import get_task_history
+        get_task_history().stop()
+
+# Prometheus 指標：投遞時在消息頭記錄時間，worker 據此計算排隊時間；任務耗時按隊列與結果分組
+@before_task_publish.connect
+def record_task_published(headers=None, **kwargs):
+    if headers is not None:
+        metrics.record_task_published(headers)
+
+@task_prerun.connect
+def record_task_started(task_id=None, task=None, **kwargs):
+    metrics.record_task_started(task_id, task, task.request)
+
+@task_postrun.connect
+def record_task_finished(task_id=None, task=None, retval=None, state=None, **kwargs):
+    metrics.record_task_finished(task_id, task, task.request, state, retval)
+
+# worker 主進程在啟動子進程前清空多進程指標目錄，並導出各子進程匯總後的指標
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    from core.config import settings
+    metrics.reset_multiprocess_dir()
+    if settings.CELERY_METRICS_PORT:
+        metrics.start_metrics_server(settings.CELERY_METRICS_PORT)
+
+# worker 主進程在啟動子進程前預先加載 yt-dlp 提取器與數據庫模型，prefork 子進程以寫時複製共享，
+# 不必各自導入；gc.freeze 把預載的對象移出垃圾回收的分代，子進程的回收不會逐頁改寫（複製）它們
+@worker_init.connect
+def preload_worker_modules(**kwargs):
+    import gc
+    from core.config import settings
+    extractors = [name.strip() for name in settings.WORKER_PRELOAD_EXTRACTORS.split(",") if name.strip()]
+    if extractors:
+        from core.downloader import preload_extractors
+        preload_extractors(extractors)
+    if settings.TASK_HISTORY_ENABLED:
+        import core.task_history  # noqa: F401
+    gc.freeze()
+
+# 使用 logging_config 的日誌管道代替 Celery 默認的日誌配置；prefork 子進程重新啟動自己的寫出線程
+@setup_logging.connect
+def configure_logging(**kwargs):
+    logging_config.setup_logging("celery.log")
+
+@worker_process_init.connect
+def restart_log_listener(**kwargs):
+    logging_config.setup_logging("celery.log")
+
+@worker_process_shutdown.connect
+def stop_log_listener(**kwargs):
+    logging_config.stop_logging()
+
+# 任務執行期間的日誌記錄帶上應用的任務 ID（沒有時為 Celery 任務 ID）
+@task_prerun.connect
+def bind_log_task_id(task_id=None, kwargs=None, **extra):
+    logging_config.task_id_var.set((kwargs or {}).get("task_id") or task_id)
+
+@task_postrun.connect
+def unbind_log_task_id(**kwargs):
+    logging_config.task_id_var.set(None)
+
 # 如果有異步任務，在這裡配置
 # 例如：celery_app.conf.beat_schedule = { ... }
@@ -0,0 +1,324 @@
+"""
+集群級下載帶寬與連接數調度
+
+多個 worker 主機共享同一個上游，由令牌桶統一限速：
+- 全局桶：所有 worker 合計的字節每秒上限
+- worker 桶：每台 worker 主機（含其全部子進程）的字節每秒上限
+- 上游主機連接槽：每個上游域名同時打開的連接數上限
+
+下載引擎每收到一塊數據調用 throttle(字節數)：先從桶中預支令牌（允許欠賬），
+欠賬時按速率睡眠相應時間，從而把實際吞吐壓到預算以內。
+限額為 0 表示不限制，此時不訪問令牌桶與連接槽，只按下面的間隔讀取限額。
+
+限額存儲在共享後端，可在運行時通過 API 調整；各進程每 BANDWIDTH_CONFIG_REFRESH 秒重新讀取。
+"""
+
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from core.config import settings
+from core.metrics import DOWNLOAD_BYTES, DOWNLOAD_THROTTLED
+from core.redis_client import get_redis_client
+
+LIMIT_FIELDS = ("global_bps", "worker_bps", "host_connections")
+
+# 連接槽租約時間（秒），下載過程中隨數據到達續約；worker 崩潰後槽位自動釋放
+SLOT_TTL = 60
+SLOT_POLL_INTERVAL = 0.5
+
+
+def upstream_host(url: str) -> str:
+    """上游域名：取主機名的最後兩段（r1---sn-xxx.googlevideo.com -> googlevideo.com）"""
+    host = (urlparse(url).hostname or "").lower()
+    labels = host.split(".")
+    if len(labels) <= 2 or host.replace(".", "").isdigit():
+        return host
+    return ".".join(labels[-2:])
+
+
+class ConnectionLease:
+    """上游連接槽租約，持有期間定期 keepalive() 續約"""
+
+    def __init__(self, scheduler: "BandwidthScheduler", host: str, holder: str, count: int):
+        self.scheduler = scheduler
+        self.host = host
+        self.holder = holder
+        self.count = count
+        self._renewed_at = time.monotonic()
+
+    def keepalive(self) -> None:
+        if self.count and time.monotonic() - self._renewed_at >= SLOT_TTL / 3:
+            self._renewed_at = time.monotonic()
+            self.scheduler._renew_slots(self.host, self.holder, self.count, SLOT_TTL)
+
+    def release(self) -> None:
+        if self.count:
+            self.scheduler._release_slots(self.host, self.holder, self.count)
+            self.count = 0
+
+    def __enter__(self) -> "ConnectionLease":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class BandwidthScheduler:
+    """帶寬調度介面，子類實現令牌桶、連接槽與限額的存儲"""
+
+    def __init__(self, defaults: Dict[str, int], burst_seconds: float, refresh: float, worker: Optional[str] = None):
+        self.defaults = {field: int(defaults.get(field) or 0) for field in LIMIT_FIELDS}
+        self.burst_seconds = burst_seconds
+        self.refresh = refresh
+        self.worker = worker or socket.gethostname()
+        self._limits: Dict[str, int] = dict(self.defaults)
+        self._limits_loaded_at = float("-inf")
+        self._stats = {"bytes": 0, "throttled_seconds": 0.0, "throttle_events": 0, "slot_wait_seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def limits(self) -> Dict[str, int]:
+        """當前生效的限額（帶本地緩存）"""
+        now = time.monotonic()
+        if now - self._limits_loaded_at >= self.refresh:
+            stored = self._load_limits()
+            self._limits = {field: int(stored.get(field, self.defaults[field])) for field in LIMIT_FIELDS}
+            self._limits_loaded_at = now
+        return dict(self._limits)
+
+    def set_limits(self, **limits: Optional[int]) -> Dict[str, int]:
+        """調整限額，未傳入（None）的欄位保持不變"""
+        updates = {k: max(0, int(v)) for k, v in limits.items() if k in LIMIT_FIELDS and v is not None}
+        if updates:
+            self._store_limits(updates)
+        self._limits_loaded_at = float("-inf")
+        return self.limits()
+
+    def throttle(self, nbytes: int) -> float:
+        """登記收到的字節數，超出預算時阻塞；返回睡眠的秒數"""
+        limits = self.limits()
+        wait = 0.0
+        buckets = (("global", limits["global_bps"]), (f"worker:{self.worker}", limits["worker_bps"]))
+        for name, rate in buckets:
+            if rate > 0:
+                wait = max(wait, self._reserve(name, rate, rate * self.burst_seconds, nbytes))
+        if wait > 0:
+            time.sleep(wait)
+        DOWNLOAD_BYTES.labels(self.worker).inc(nbytes)
+        if wait > 0:
+            DOWNLOAD_THROTTLED.labels(self.worker).inc(wait)
+        with self._lock:
+            self._stats["bytes"] += nbytes
+            if wait > 0:
+                self._stats["throttled_seconds"] += wait
+                self._stats["throttle_events"] += 1
+        return wait
+
+    def connections(self, url: str, count: int) -> ConnectionLease:
+        """
+        為一次下載佔用上游主機的 count 個連接槽，槽位不足時等待
+
+        count 超過上限時按上限計，避免永遠無法取得。
+        """
+        host = upstream_host(url)
+        limit = self.limits()["host_connections"]
+        if limit <= 0 or not host:
+            return ConnectionLease(self, host, "", 0)
+        count = max(1, min(count, limit))
+        holder = uuid.uuid4().hex
+        start = time.monotonic()
+        while not self._try_acquire_slots(host, holder, count, limit, SLOT_TTL):
+            time.sleep(SLOT_POLL_INTERVAL)
+            limit = self.limits()["host_connections"]
+            if limit <= 0:
+                return ConnectionLease(self, host, "", 0)
+            count = max(1, min(count, limit))
+        with self._lock:
+            self._stats["slot_wait_seconds"] += time.monotonic() - start
+        return ConnectionLease(self, host, holder, count)
+
+    def stats(self) -> Dict[str, Any]:
+        """本進程的調度統計與當前限額"""
+        with self._lock:
+            stats = dict(self._stats)
+        return dict(stats, worker=self.worker, limits=self.limits())
+
+    def _load_limits(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _store_limits(self, limits: Dict[str, int]) -> None:
+        raise NotImplementedError
+
+    def _reserve(self, bucket: str, rate: float, burst: float, nbytes: int) -> float:
+        """從桶中預支 nbytes 個令牌，返回需要等待的秒數"""
+        raise NotImplementedError
+
+    def _try_acquire_slots(self, host: str, holder: str, count: int, limit: int, ttl: int) -> bool:
+        raise NotImplementedError
+
+    def _renew_slots(self, host: str, holder: str, count: int, ttl: int) -> None:
+        raise NotImplementedError
+
+    def _release_slots(self, host: str, holder: str, count: int) -> None:
+        raise NotImplementedError
+
+
+class InMemoryBandwidthScheduler(BandwidthScheduler):
+    """進程內調度（單進程部署或測試）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stored: Dict[str, int] = {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._slots: Dict[str, Dict[str, Tuple[int, float]]] = {}
+        self._state_lock = threading.Lock()
+
+    def _load_limits(self) -> Dict[str, Any]:
+        return dict(self._stored)
+
+    def _store_limits(self, limits: Dict[str, int]) -> None:
+        self._stored.update(limits)
+
+    def _reserve(self, bucket: str, rate: float, burst: float, nbytes: int) -> float:
+        now = time.monotonic()
+        with self._state_lock:
+            tokens, updated = self._buckets.get(bucket, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate) - nbytes
+            self._buckets[bucket] = (tokens, now)
+        return -tokens / rate if tokens < 0 else 0.0
+
+    def _active_slots(self, host: str) -> Dict[str, Tuple[int, float]]:
+        now = time.monotonic()
+        slots = self._slots.setdefault(host, {})
+        for holder in [h for h, (_, expires) in slots.items() if expires <= now]:
+            del slots[holder]
+        return slots
+
+    def _try_acquire_slots(self, host: str, holder: str, count: int, limit: int, ttl: int) -> bool:
+        with self._state_lock:
+            slots = self._active_slots(host)
+            if sum(n for n, _ in slots.values()) + count > limit:
+                return False
+            slots[holder] = (count, time.monotonic() + ttl)
+            return True
+
+    def _renew_slots(self, host: str, holder: str, count: int, ttl: int) -> None:
+        with self._state_lock:
+            slots = self._active_slots(host)
+            if holder in slots:
+                slots[holder] = (count, time.monotonic() + ttl)
+
+    def _release_slots(self, host: str, holder: str, count: int) -> None:
+        with self._state_lock:
+            self._slots.get(host, {}).pop(holder, None)
+
+
+class RedisBandwidthScheduler(BandwidthScheduler):
+    """
+    Redis 調度（多 worker 主機共享）
+
+    - {prefix}:bandwidth:limits         限額哈希
+    - {prefix}:bandwidth:bucket:{name}  令牌桶狀態（tokens、ts），以 Redis 服務器時間計算
+    - {prefix}:bandwidth:slots:{host}   連接槽有序集合，成員為 holder#i，分數為過期時間
+    """
+
+    # 令牌桶：補充 -> 預支 -> 返回需等待的秒數（字符串，避免 Lua 數字被截斷為整數）
+    RESERVE_SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local requested = tonumber(ARGV[3])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate) - requested
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[1], 3600)
+    if tokens >= 0 then
+        return '0'
+    end
+    return tostring(-tokens / rate)
+    """
+
+    ACQUIRE_SLOTS_SCRIPT = """
+    local count = tonumber(ARGV[2])
+    local limit = tonumber(ARGV[3])
+    local ttl = tonumber(ARGV[4])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+    if redis.call('ZCARD', KEYS[1]) + count > limit then
+        return 0
+    end
+    for i = 1, count do
+        redis.call('ZADD', KEYS[1], now + ttl, ARGV[1] .. '#' .. i)
+    end
+    redis.call('EXPIRE', KEYS[1], ttl * 2)
+    return 1
+    """
+
+    RENEW_SLOTS_SCRIPT = """
+    local count = tonumber(ARGV[2])
+    local ttl = tonumber(ARGV[3])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    for i = 1, count do
+        redis.call('ZADD', KEYS[1], 'XX', now + ttl, ARGV[1] .. '#' .. i)
+    end
+    redis.call('EXPIRE', KEYS[1], ttl * 2)
+    return 1
+    """
+
+    def __init__(self, client, *args, prefix: str = "ytdl", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.redis = client
+        self.prefix = prefix
+        self._reserve_script = client.register_script(self.RESERVE_SCRIPT)
+        self._acquire_script = client.register_script(self.ACQUIRE_SLOTS_SCRIPT)
+        self._renew_script = client.register_script(self.RENEW_SLOTS_SCRIPT)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix, "bandwidth") + parts)
+
+    def _load_limits(self) -> Dict[str, Any]:
+        return self.redis.hgetall(self._key("limits"))
+
+    def _store_limits(self, limits: Dict[str, int]) -> None:
+        self.redis.hset(self._key("limits"), mapping=limits)
+
+    def _reserve(self, bucket: str, rate: float, burst: float, nbytes: int) -> float:
+        return float(self._reserve_script(keys=[self._key("bucket", bucket)], args=[rate, burst, nbytes]))
+
+    def _try_acquire_slots(self, host: str, holder: str, count: int, limit: int, ttl: int) -> bool:
+        return bool(self._acquire_script(keys=[self._key("slots", host)], args=[holder, count, limit, ttl]))
+
+    def _renew_slots(self, host: str, holder: str, count: int, ttl: int) -> None:
+        self._renew_script(keys=[self._key("slots", host)], args=[holder, count, ttl])
+
+    def _release_slots(self, host: str, holder: str, count: int) -> None:
+        members: List[str] = [f"{holder}#{i}" for i in range(1, count + 1)]
+        self.redis.zrem(self._key("slots", host), *members)
+
+
+_scheduler: Optional[BandwidthScheduler] = None
+
+
+def get_bandwidth_scheduler() -> BandwidthScheduler:
+    """返回進程內共享的帶寬調度器，後端與任務存儲一致"""
+    global _scheduler
+    if _scheduler is None:
+        defaults = {
+            "global_bps": settings.BANDWIDTH_GLOBAL_BPS,
+            "worker_bps": settings.BANDWIDTH_WORKER_BPS,
+            "host_connections": settings.BANDWIDTH_HOST_CONNECTIONS,
+        }
+        args = (defaults, settings.BANDWIDTH_BURST_SECONDS, settings.BANDWIDTH_CONFIG_REFRESH)
+        if settings.TASK_STORE_BACKEND == "redis":
+            _scheduler = RedisBandwidthScheduler(get_redis_client(), *args, prefix=settings.TASK_STORE_PREFIX)
+        else:
+            _scheduler = InMemoryBandwidthScheduler(*args)
+    return _scheduler
@@ -0,0 +1,132 @@
+"""
+下載斷點
+
+yt-dlp 自身會續傳 .part 文件（HTTP Range）與分片下載（.ytdl 記錄的分片序號），
+但只要文件名相同就會續傳，並不檢查續傳的是否為同一條媒體流。
+這裡在 .part 旁邊記錄 {文件名}.checkpoint.json：
+
+- format_ids    上次選中的格式，續傳時固定使用這些格式，避免把不同流的字節拼接在一起
+- parts         每個格式的臨時文件、已下載字節數與分片序號
+- attempts      已執行的次數（含軟時限後的自我續排）
+
+寫入節流為每 CHECKPOINT_INTERVAL 秒一次，經臨時文件替換保證原子性；
+下載完成後連同記錄一起刪除。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+
+# 下載目錄中屬於未完成下載的文件，不對外提供
+PARTIAL_SUFFIXES = (".part", ".ytdl", CHECKPOINT_SUFFIX, ".checkpoint.json.tmp")
+
+
+def is_partial_file(filename: str) -> bool:
+    return filename.endswith(PARTIAL_SUFFIXES) or ".part-Frag" in filename
+
+
+class DownloadCheckpoint:
+    """單個下載的斷點記錄，record() 可在多個分片線程中調用"""
+
+    def __init__(self, download_dir: str, stem: str, interval: float = 5.0):
+        self.path = os.path.join(download_dir, stem + CHECKPOINT_SUFFIX)
+        self.interval = interval
+        self.state: Dict[str, Any] = {"format_ids": [], "parts": {}, "attempts": 0}
+        self._dirty = False
+        self._saved_at = float("-inf")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, download_dir: str, stem: str, interval: float = 5.0) -> "DownloadCheckpoint":
+        """讀取已有的斷點，不存在或損壞時返回空斷點"""
+        checkpoint = cls(download_dir, stem, interval)
+        try:
+            with open(checkpoint.path, encoding="utf-8") as f:
+                checkpoint.state.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("斷點記錄無法讀取，將重新下載 %s: %s", checkpoint.path, e)
+        return checkpoint
+
+    @property
+    def format_ids(self) -> List[str]:
+        return list(self.state.get("format_ids") or [])
+
+    @property
+    def downloaded_bytes(self) -> int:
+        return sum(part.get("downloaded_bytes") or 0 for part in self.state["parts"].values())
+
+    def begin_attempt(self, **fields: Any) -> int:
+        """開始一次執行，記錄任務參數並返回執行序號"""
+        with self._lock:
+            self.state.update(fields)
+            self.state["attempts"] = int(self.state.get("attempts") or 0) + 1
+            self._dirty = True
+        self.save()
+        return self.state["attempts"]
+
+    def record(self, d: Dict[str, Any]) -> None:
+        """記錄 yt-dlp progress hook 事件，按間隔寫出"""
+        info = d.get("info_dict") or {}
+        format_ids = [f.get("format_id") for f in info.get("requested_formats") or []] or [info.get("format_id")]
+        part = {
+            "tmpfilename": d.get("tmpfilename") or d.get("filename"),
+            "downloaded_bytes": d.get("downloaded_bytes") or 0,
+            "total_bytes": d.get("total_bytes") or d.get("total_bytes_estimate"),
+            "fragment_index": d.get("fragment_index"),
+            "fragment_count": d.get("fragment_count"),
+            "finished": d.get("status") == "finished",
+        }
+        with self._lock:
+            self.state["format_ids"] = [f for f in format_ids if f]
+            self.state["parts"][str(info.get("format_id"))] = part
+            self._dirty = True
+            due = time.monotonic() - self._saved_at >= self.interval
+        if due or part["finished"]:
+            self.save()
+
+    def save(self) -> None:
+        """原子地寫出當前狀態"""
+        with self._lock:
+            if not self._dirty:
+                return
+            state = dict(self.state, updated_at=time.time())
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("寫出斷點記錄失敗 %s: %s", self.path, e)
+
+    def discard(self) -> None:
+        """放棄斷點：刪除記錄及其中的臨時文件，下次從頭下載"""
+        for part in self.state["parts"].values():
+            tmpfilename = part.get("tmpfilename")
+            for path in (tmpfilename, f"{tmpfilename}.ytdl") if tmpfilename else ():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self.state.update(format_ids=[], parts={})
+        self.clear()
+
+    def clear(self) -> None:
+        """下載完成後刪除記錄"""
+        with self._lock:
+            self._dirty = False
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
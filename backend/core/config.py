@@ -7,4 +7,141 @@ class Settings:
     REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
+    # 任務存儲及結果緩存等共享狀態的後端: "redis"（API 與各 worker 共享）或 "memory"（單進程，僅用於測試與本地調試）
+    TASK_STORE_BACKEND = os.getenv("TASK_STORE_BACKEND", "redis").lower()
+    TASK_STORE_PREFIX = os.getenv("TASK_STORE_PREFIX", "ytdl")
+
+    # GET /api/download/tasks 分頁大小
+    TASK_LIST_DEFAULT_LIMIT = int(os.getenv("TASK_LIST_DEFAULT_LIMIT", "50"))
+    TASK_LIST_MAX_LIMIT = int(os.getenv("TASK_LIST_MAX_LIMIT", "500"))
+
+    # POST /api/download/tasks/batch 單次最多任務數
+    TASK_BATCH_MAX_SIZE = int(os.getenv("TASK_BATCH_MAX_SIZE", "1000"))
+
+    # 下載文件目錄（/downloads 靜態路徑）
+    DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR", "downloads")
+
+    # 下載結果緩存條目的存活時間，應與下載文件的保留時間一致
+    RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+
+    # 進行中下載去重的租約時間：排隊階段覆蓋 task_time_limit，下載階段由 worker 心跳續約
+    SINGLEFLIGHT_QUEUED_TTL = int(os.getenv("SINGLEFLIGHT_QUEUED_TTL", str(30 * 60)))
+    SINGLEFLIGHT_HEARTBEAT_TTL = int(os.getenv("SINGLEFLIGHT_HEARTBEAT_TTL", "60"))
+
+    # SSE 進度流在無事件時發送保活註釋的間隔（秒）
+    SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+
+    # worker 進度上報節流：最小寫入間隔（秒）與最小進度變化（百分點）
+    PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", "0.5"))
+    PROGRESS_MIN_DELTA = float(os.getenv("PROGRESS_MIN_DELTA", "1"))
+
+    # 下載引擎：DASH/HLS 分片並發數、讀寫緩衝區上限與 HTTP 分塊大小（字節）
+    FRAGMENT_CONCURRENCY = int(os.getenv("FRAGMENT_CONCURRENCY", "4"))
+    DOWNLOAD_BUFFER_SIZE = int(os.getenv("DOWNLOAD_BUFFER_SIZE", str(1024 * 1024)))
+    HTTP_CHUNK_SIZE = int(os.getenv("HTTP_CHUNK_SIZE", str(10 * 1024 * 1024)))
+
+    # 影片元數據緩存：進程內 LRU 條目數、成功條目 / 否定條目存活時間（秒），
+    # 以及距媒體 URL 簽名過期至少保留的時間（秒）
+    METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", "256"))
+    METADATA_CACHE_TTL = int(os.getenv("METADATA_CACHE_TTL", str(6 * 3600)))
+    METADATA_NEGATIVE_TTL = int(os.getenv("METADATA_NEGATIVE_TTL", "600"))
+    METADATA_EXPIRY_MARGIN = int(os.getenv("METADATA_EXPIRY_MARGIN", "1800"))
+
+    # /downloads 文件分發：讀取塊大小（字節）、單個請求最多的 Range 區間數，
+    # 以及交給 nginx 發送時的 X-Accel-Redirect 內部路徑前綴（為空時由應用直接發送）
+    FILE_READ_CHUNK_SIZE = int(os.getenv("FILE_READ_CHUNK_SIZE", str(1024 * 1024)))
+    FILE_MAX_RANGES = int(os.getenv("FILE_MAX_RANGES", "16"))
+    DOWNLOAD_ACCEL_REDIRECT = os.getenv("DOWNLOAD_ACCEL_REDIRECT", "")
+
+    # 隊列路由：預估工作量（時長秒數 × 畫質係數，720p 為 1）不超過該值的影片進入 video-short
+    VIDEO_SHORT_MAX_SECONDS = int(os.getenv("VIDEO_SHORT_MAX_SECONDS", "1200"))
+
+    # 集群下載帶寬調度（0 表示不限制）：全局與每台 worker 主機的字節每秒上限、
+    # 每個上游域名的最大併發連接數；令牌桶容量為速率 × BANDWIDTH_BURST_SECONDS，
+    # 運行時調整的限額每 BANDWIDTH_CONFIG_REFRESH 秒生效一次
+    BANDWIDTH_GLOBAL_BPS = int(os.getenv("BANDWIDTH_GLOBAL_BPS", "0"))
+    BANDWIDTH_WORKER_BPS = int(os.getenv("BANDWIDTH_WORKER_BPS", "0"))
+    BANDWIDTH_HOST_CONNECTIONS = int(os.getenv("BANDWIDTH_HOST_CONNECTIONS", "0"))
+    BANDWIDTH_BURST_SECONDS = float(os.getenv("BANDWIDTH_BURST_SECONDS", "1"))
+    BANDWIDTH_CONFIG_REFRESH = float(os.getenv("BANDWIDTH_CONFIG_REFRESH", "5"))
+
+    # 斷點續傳：斷點記錄的最小寫出間隔（秒）、暫時性錯誤的重試次數與退避基數（秒），
+    # 以及到達軟時限後自我重新排隊的最多次數
+    CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", "5"))
+    DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "3"))
+    DOWNLOAD_RETRY_BACKOFF = int(os.getenv("DOWNLOAD_RETRY_BACKOFF", "30"))
+    DOWNLOAD_MAX_CONTINUATIONS = int(os.getenv("DOWNLOAD_MAX_CONTINUATIONS", "12"))
+
+    # 播放列表 / 頻道：每批投遞的子任務數、最多展開的條目數，
+    # 以及批次回調等待子任務結束的輪詢間隔與最長等待時間（秒）
+    PLAYLIST_BATCH_SIZE = int(os.getenv("PLAYLIST_BATCH_SIZE", "50"))
+    PLAYLIST_MAX_ENTRIES = int(os.getenv("PLAYLIST_MAX_ENTRIES", "5000"))
+    PLAYLIST_POLL_INTERVAL = int(os.getenv("PLAYLIST_POLL_INTERVAL", "15"))
+    PLAYLIST_WAIT_TIMEOUT = int(os.getenv("PLAYLIST_WAIT_TIMEOUT", str(12 * 3600)))
+
+    # 轉碼階段（transcode 隊列）：ffmpeg / ffprobe 可執行文件、每個 ffmpeg 進程的線程數
+    # （transcode worker 的併發數默認等於 CPU 核心數，每個進程一個線程即可用滿），
+    # 以及重新編碼 h264 時的 x264 preset 與 CRF
+    FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+    FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+    TRANSCODE_THREADS = int(os.getenv("TRANSCODE_THREADS", "1"))
+    TRANSCODE_PRESET = os.getenv("TRANSCODE_PRESET", "veryfast")
+    TRANSCODE_CRF = int(os.getenv("TRANSCODE_CRF", "23"))
+
+    # 下載目錄配額：上限字節數（0 表示按文件系統容量）、觸發淘汰的高水位與淘汰目標的低水位（比例），
+    # 後台水位檢查間隔與訪問時間的最小記錄間隔（秒），
+    # 無法估計大小時的預留字節數，以及預留在 worker 崩潰後自動失效的時間（秒）
+    STORAGE_QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_BYTES", "0"))
+    STORAGE_HIGH_WATERMARK = float(os.getenv("STORAGE_HIGH_WATERMARK", "0.9"))
+    STORAGE_LOW_WATERMARK = float(os.getenv("STORAGE_LOW_WATERMARK", "0.8"))
+    STORAGE_CHECK_INTERVAL = float(os.getenv("STORAGE_CHECK_INTERVAL", "60"))
+    STORAGE_TOUCH_INTERVAL = float(os.getenv("STORAGE_TOUCH_INTERVAL", "300"))
+    STORAGE_DEFAULT_RESERVATION = int(os.getenv("STORAGE_DEFAULT_RESERVATION", str(256 * 1024 * 1024)))
+    STORAGE_RESERVATION_TTL = int(os.getenv("STORAGE_RESERVATION_TTL", "3600"))
+
+    # 任務歷史數據庫：SQLite 開啟 WAL；其他數據庫（PostgreSQL）使用連接池，
+    # 每個進程最多 DB_POOL_SIZE + DB_MAX_OVERFLOW 個連接
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./db.sqlite3")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    # 異步 PostgreSQL（asyncpg）每個連接的預備語句緩存條目數，重複的查詢跳過服務端解析與規劃；
+    # 經 pgbouncer 事務池連接時設為 0
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+    # 任務歷史寫入：狀態變化先在進程內合併，每 TASK_HISTORY_FLUSH_INTERVAL 秒或累積
+    # TASK_HISTORY_BATCH_SIZE 個任務時批量寫入；數據庫不可用時最多暫存 TASK_HISTORY_MAX_PENDING 個任務
+    TASK_HISTORY_ENABLED = os.getenv("TASK_HISTORY_ENABLED", "true").lower() == "true"
+    TASK_HISTORY_FLUSH_INTERVAL = float(os.getenv("TASK_HISTORY_FLUSH_INTERVAL", "2"))
+    TASK_HISTORY_BATCH_SIZE = int(os.getenv("TASK_HISTORY_BATCH_SIZE", "500"))
+    TASK_HISTORY_MAX_PENDING = int(os.getenv("TASK_HISTORY_MAX_PENDING", "50000"))
+
+    # Prometheus 指標：Celery worker 主進程導出指標的 HTTP 端口（0 表示不導出；API 使用 /metrics）。
+    # 多進程匯總由 prometheus_client 讀取的環境變量 PROMETHEUS_MULTIPROC_DIR 開啟
+    CELERY_METRICS_PORT = int(os.getenv("CELERY_METRICS_PORT", "0"))
+
+    # /health/ready：後台探測依賴的間隔與單次探測時限（秒），結果超過 HEALTH_PROBE_MAX_AGE 秒未刷新視為過期；
+    # HEALTH_REQUIRE_WORKERS 為 true 時沒有在線的 Celery worker 也視為不就緒
+    HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "5"))
+    HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+    HEALTH_PROBE_MAX_AGE = float(os.getenv("HEALTH_PROBE_MAX_AGE", "15"))
+    HEALTH_REQUIRE_WORKERS = os.getenv("HEALTH_REQUIRE_WORKERS", "false").lower() == "true"
+
+    # 日誌（見 logging_config.py）：LOG_MODE 為 "async"（隊列 + 後台寫出線程）或 "sync"，
+    # LOG_FORMAT 為 "json" 或 "text"；異步隊列最多暫存 LOG_QUEUE_SIZE 條記錄，
+    # 帶 rate_limit_key 的高頻消息每 LOG_RATE_LIMIT_INTERVAL 秒最多輸出一條
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_MODE = os.getenv("LOG_MODE", "async").lower()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+    LOG_DIR = os.getenv("LOG_DIR", "logs")
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_RATE_LIMIT_INTERVAL = float(os.getenv("LOG_RATE_LIMIT_INTERVAL", "5"))
+
+    # worker 主進程在 fork 子進程前預先導入 yt-dlp 並初始化以逗號分隔的提取器（為空時不預載），
+    # 子進程以寫時複製共享這些模塊，不必各自導入；任務歷史開啟時一併加載數據庫模型
+    WORKER_PRELOAD_EXTRACTORS = os.getenv("WORKER_PRELOAD_EXTRACTORS", "Youtube,YoutubeTab,Generic")
+
 settings = Settings()
@@ -0,0 +1,143 @@
+"""
+下載任務投遞
+
+API 進程按名稱發送 Celery 任務，不需要導入 worker 端的任務模塊。
+Celery 任務 ID 與下載任務 ID 相同，方便以 AsyncResult 查詢狀態。
+
+隊列由 celery_app 的路由函數按格式、畫質與時長決定（見 core/routing.py）。
+影片時長未知（任務記錄沒有 duration 欄位，即元數據未緩存）時先投遞到 metadata 隊列，
+由元數據 worker 提取後再按時長投遞下載任務。
+
+下載結果的容器與目標格式不同時，下載任務把文件交給 transcode 隊列的轉碼任務。
+
+播放列表由 expand_playlist 任務惰性展開，每批子任務以一個 chord 投遞，
+全部結束後由 playlist_batch_done 回調把該批結果匯總到父任務。
+"""
+
+from typing import Any, Dict, List
+
+from celery import chord, group
+
+from celery_app import celery_app
+from core.metrics import redis_queue_depths
+from core.routing import (
+    AUDIO_FORMATS,
+    DOWNLOAD_TASK_NAME,
+    METADATA_TASK_NAME,
+    PLAYLIST_BATCH_TASK_NAME,
+    PLAYLIST_TASK_NAME,
+    TRANSCODE_TASK_NAME,
+    broker_priority,
+)
+
+
+def download_signature(task: Dict[str, Any]):
+    """為下載任務記錄構建 Celery signature"""
+    return celery_app.signature(
+        DOWNLOAD_TASK_NAME,
+        kwargs={
+            "task_id": task["id"],
+            "url": task["url"],
+            "format": task["format"],
+            "quality": task["quality"],
+            "duration": task.get("duration"),
+        },
+    ).set(task_id=task["id"], priority=broker_priority(task.get("priority")))
+
+
+def metadata_signature(task: Dict[str, Any]):
+    """先提取元數據、再按時長投遞下載的 Celery signature"""
+    return celery_app.signature(
+        METADATA_TASK_NAME,
+        kwargs={
+            "task_id": task["id"],
+            "url": task["url"],
+            "format": task["format"],
+            "quality": task["quality"],
+            "priority": task.get("priority"),
+        },
+    ).set(task_id=f"{task['id']}-metadata", priority=broker_priority(task.get("priority")))
+
+
+def needs_metadata(task: Dict[str, Any]) -> bool:
+    return "duration" not in task and (task.get("format") or "").lower() not in AUDIO_FORMATS
+
+
+def submit_signature(task: Dict[str, Any]):
+    return metadata_signature(task) if needs_metadata(task) else download_signature(task)
+
+
+def dispatch_download(task: Dict[str, Any]) -> None:
+    """投遞單個下載任務"""
+    submit_signature(task).apply_async()
+
+
+def dispatch_downloads(tasks: List[Dict[str, Any]]) -> None:
+    """以一個 group 投遞多個下載任務，共用同一個 broker 連接"""
+    if not tasks:
+        return
+    if len(tasks) == 1:
+        dispatch_download(tasks[0])
+        return
+    group(submit_signature(task) for task in tasks).apply_async()
+
+
+def dispatch_transcode(task: Dict[str, Any], **kwargs: Any) -> None:
+    """投遞轉碼任務，kwargs 為轉碼任務的參數（源文件、編碼、已完成階段的耗時等）"""
+    celery_app.signature(
+        TRANSCODE_TASK_NAME,
+        kwargs=dict(kwargs, task_id=task["id"], url=task["url"], format=task["format"], quality=task["quality"]),
+    ).apply_async(task_id=f"{task['id']}-transcode", priority=broker_priority(task.get("priority")))
+
+
+def dispatch_playlist(task: Dict[str, Any]) -> None:
+    """投遞播放列表展開任務，Celery 任務 ID 與父任務 ID 相同"""
+    celery_app.signature(
+        PLAYLIST_TASK_NAME,
+        kwargs={
+            "playlist_id": task["id"],
+            "url": task["url"],
+            "format": task["format"],
+            "quality": task["quality"],
+            "priority": task.get("priority"),
+        },
+    ).apply_async(task_id=task["id"], priority=broker_priority(task.get("priority")))
+
+
+def dispatch_playlist_batch(playlist_id: str, tasks: List[Dict[str, Any]], task_ids: List[str]) -> None:
+    """
+    以 chord 投遞一批播放列表子任務
+
+    tasks 為本批新建的任務記錄；task_ids 為本批全部子任務（含緩存命中與附加到進行中任務的），
+    由回調從任務存儲讀取最終狀態。本批沒有需要投遞的任務時直接執行回調。
+
+    任一子任務以異常結束（包括被硬時限終止）時 chord 不執行回調，
+    因此以同一個匯總任務作為錯誤回調，父任務同樣能結束。
+    """
+    callback = celery_app.signature(PLAYLIST_BATCH_TASK_NAME, args=(playlist_id, task_ids))
+    if not tasks:
+        callback.clone(args=([],)).apply_async()
+        return
+    callback.link_error(celery_app.signature(PLAYLIST_BATCH_TASK_NAME, args=(playlist_id, task_ids)))
+    chord([submit_signature(task) for task in tasks])(callback)
+
+
+_broker_client = None
+
+
+def queue_depths() -> Dict[str, int]:
+    """broker 中各工作量隊列的待處理消息數（僅支持 Redis broker，其他 broker 返回空）"""
+    global _broker_client
+    broker_url = celery_app.conf.broker_url or ""
+    if not broker_url.startswith(("redis://", "rediss://")):
+        return {}
+    if _broker_client is None:
+        import redis
+        _broker_client = redis.Redis.from_url(broker_url, socket_timeout=2, socket_connect_timeout=2)
+    options = celery_app.conf.broker_transport_options
+    return redis_queue_depths(
+        _broker_client,
+        [queue.name for queue in celery_app.conf.task_queues],
+        options.get("priority_steps", [0]),
+        options.get("sep", ":"),
+    )
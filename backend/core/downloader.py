@@ -0,0 +1,431 @@
+"""
+YouTube 下載引擎
+
+封裝 yt-dlp：
+- extract_info / get_video_info: 只提取影片元數據（完整 / 摘要）
+- download_video: 按格式與畫質下載到 download_path，可傳入已提取的元數據跳過提取，
+  DASH/HLS 分片以 fragment_concurrency 個線程並發下載，
+  HTTP 以大緩衝區分塊讀寫，進度通過回調上報，每塊數據經集群帶寬調度限速
+
+yt-dlp 在第一次提取或下載時才導入：API 進程只用到這裡的異常與工具函數，
+worker 主進程在 fork 前通過 preload_extractors 預先導入（見 celery_app.py）。
+"""
+
+import itertools
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+from core.bandwidth import BandwidthScheduler, get_bandwidth_scheduler
+from core.checkpoint import DownloadCheckpoint
+from core.config import settings
+from core.video import AUDIO_FORMATS, parse_quality
+
+if TYPE_CHECKING:
+    import yt_dlp
+
+# 進度回調接收的字典:
+#   status            "downloading" | "finished"
+#   progress          總體百分比 0-100（合併下載時跨所有分段累計）
+#   downloaded_bytes  當前分段已下載字節數
+#   total_bytes       當前分段總字節數（未知時為估計值或 None）
+#   speed / eta       字節每秒 / 剩餘秒數，未知時為 None
+#   fragment_index / fragment_count  分片進度（僅 DASH/HLS）
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+# yt-dlp 可直接合併輸出的容器
+MERGE_FORMATS = ("mp4", "webm", "mkv")
+
+# 不能直接下載得到的目標格式先下載為哪種容器，再由轉碼階段重新封裝（見 core/transcoder.py）
+SOURCE_CONTAINERS = {"avi": "mp4"}
+
+
+# 完整元數據中下載用不到且體積較大的欄位，提取後丟棄以減少緩存佔用
+HEAVY_INFO_FIELDS = ("automatic_captions", "subtitles", "heatmap")
+
+
+class DownloadError(Exception):
+    """影片信息提取或下載失敗"""
+
+
+class VideoUnavailable(DownloadError):
+    """影片不存在、已刪除、私有或受地區限制等確定性失敗，重試無意義"""
+
+
+def _wrap_error(e: "yt_dlp.utils.DownloadError") -> DownloadError:
+    """區分確定性失敗（提取器報告的預期錯誤）與網絡等暫時性失敗"""
+    import yt_dlp
+
+    cause = (e.exc_info or (None, None))[1]
+    if isinstance(cause, yt_dlp.utils.ExtractorError) and cause.expected:
+        return VideoUnavailable(cause.orig_msg or str(e))
+    return DownloadError(str(e))
+
+
+def _wrap_entry_error(e: Exception) -> DownloadError:
+    """播放列表惰性翻頁時提取器的異常不經 YoutubeDL 包裝，在這裡直接區分"""
+    import yt_dlp
+
+    if isinstance(e, yt_dlp.utils.DownloadError):
+        return _wrap_error(e)
+    if isinstance(e, yt_dlp.utils.ExtractorError) and e.expected:
+        return VideoUnavailable(e.orig_msg or str(e))
+    return DownloadError(str(e))
+
+
+def build_format_selector(format: str, quality: Optional[str]) -> str:
+    """根據目標格式與畫質生成 yt-dlp 格式選擇表達式"""
+    if format in AUDIO_FORMATS:
+        # 優先選擇已是目標格式的音軌，省去轉碼
+        return f"bestaudio[ext={format}]/bestaudio/best"
+    height = parse_quality(quality)
+    limit = f"[height<={height}]" if height else ""
+    return "/".join([
+        f"bestvideo{limit}[ext={format}]+bestaudio",
+        f"best{limit}[ext={format}]",
+        f"bestvideo{limit}+bestaudio",
+        f"best{limit}",
+        "best",
+    ])
+
+
+def media_url(info: Dict[str, Any]) -> str:
+    """元數據中的媒體 URL（用於確定上游主機），沒有時返回頁面 URL"""
+    for item in [info] + list(info.get("formats") or []):
+        if item.get("url"):
+            return item["url"]
+    return info.get("webpage_url") or ""
+
+
+def summarize_info(info: Dict[str, Any]) -> Dict[str, Any]:
+    """提取 API 與緩存需要的元數據欄位"""
+    return {
+        "id": info.get("id"),
+        "title": info.get("title"),
+        "duration": info.get("duration"),
+        "uploader": info.get("uploader"),
+        "thumbnail": info.get("thumbnail"),
+        "webpage_url": info.get("webpage_url"),
+        "formats": [
+            {
+                "format_id": f.get("format_id"),
+                "ext": f.get("ext"),
+                "height": f.get("height"),
+                "vcodec": f.get("vcodec"),
+                "acodec": f.get("acodec"),
+                "protocol": f.get("protocol"),
+                "filesize": f.get("filesize") or f.get("filesize_approx"),
+            }
+            for f in info.get("formats") or []
+        ],
+    }
+
+
+class _ProgressHook:
+    """
+    把 yt-dlp 的 progress_hooks 事件轉換為 ProgressCallback 的格式
+
+    on_bytes 在每塊數據到達後以新增字節數調用（可能來自多個分片線程），
+    可在其中阻塞以限速。續傳時 yt-dlp 報告的 downloaded_bytes 包含已下載的部分，
+    新增字節數從斷點記錄的字節數起算，之前的字節不會再次計入。
+    """
+
+    def __init__(
+        self,
+        callback: Optional[ProgressCallback],
+        on_bytes: Optional[Callable[[int], None]] = None,
+        checkpoint: Optional[DownloadCheckpoint] = None,
+    ):
+        self.callback = callback
+        self.on_bytes = on_bytes
+        self.checkpoint = checkpoint
+        self.finished_parts = set()
+        # 格式 ID -> 已計入 on_bytes 的字節數
+        self.received: Dict[str, int] = {}
+        if checkpoint is not None:
+            for part, state in checkpoint.state["parts"].items():
+                self.received[part] = state.get("downloaded_bytes") or 0
+        self.lock = threading.Lock()
+
+    def __call__(self, d: Dict[str, Any]) -> None:
+        if d.get("status") not in ("downloading", "finished"):
+            return
+        info = d.get("info_dict") or {}
+        parts = [f.get("format_id") for f in info.get("requested_formats") or []] or [info.get("format_id")]
+        part = info.get("format_id")
+
+        downloaded = d.get("downloaded_bytes") or 0
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        if self.checkpoint is not None:
+            self.checkpoint.record(d)
+        if self.on_bytes is not None:
+            with self.lock:
+                delta = downloaded - self.received.get(str(part), 0)
+                if delta > 0:
+                    self.received[str(part)] = downloaded
+            if delta > 0:
+                self.on_bytes(delta)
+        if self.callback is None:
+            return
+        if d["status"] == "finished":
+            self.finished_parts.add(part)
+            part_progress = 100.0
+        elif total:
+            part_progress = min(100.0, downloaded * 100.0 / total)
+        elif d.get("fragment_count"):
+            part_progress = (d.get("fragment_index") or 0) * 100.0 / d["fragment_count"]
+        else:
+            part_progress = 0.0
+
+        done = len(self.finished_parts - {part})
+        progress = (done * 100.0 + part_progress) / max(len(parts), 1)
+        self.callback({
+            "status": d["status"],
+            "progress": round(min(progress, 100.0), 2),
+            "downloaded_bytes": downloaded,
+            "total_bytes": total,
+            "speed": d.get("speed"),
+            "eta": d.get("eta"),
+            "fragment_index": d.get("fragment_index"),
+            "fragment_count": d.get("fragment_count"),
+        })
+
+
+class YouTubeDownloader:
+    """基於 yt-dlp 的下載引擎，實例可在同一進程內重複使用"""
+
+    def __init__(
+        self,
+        download_path: Optional[str] = None,
+        fragment_concurrency: Optional[int] = None,
+        buffer_size: Optional[int] = None,
+        http_chunk_size: Optional[int] = None,
+        ydl_opts: Optional[Dict[str, Any]] = None,
+        bandwidth: Optional[BandwidthScheduler] = None,
+    ):
+        self.download_path = download_path or settings.DOWNLOAD_DIR
+        self.fragment_concurrency = fragment_concurrency or settings.FRAGMENT_CONCURRENCY
+        self.buffer_size = buffer_size or settings.DOWNLOAD_BUFFER_SIZE
+        self.http_chunk_size = http_chunk_size or settings.HTTP_CHUNK_SIZE
+        self.ydl_opts = ydl_opts or {}
+        # 集群帶寬調度；None 表示不限速
+        self.bandwidth = bandwidth
+        os.makedirs(self.download_path, exist_ok=True)
+
+    def _options(self, **overrides: Any) -> Dict[str, Any]:
+        options = {
+            "quiet": True,
+            "no_warnings": True,
+            "noprogress": True,
+            "noplaylist": True,
+            "retries": 3,
+            "fragment_retries": 3,
+            "socket_timeout": 30,
+            # DASH/HLS 分片並發數
+            "concurrent_fragment_downloads": self.fragment_concurrency,
+            # 讀寫緩衝區上限，yt-dlp 會按吞吐自動放大到該值
+            "buffersize": self.buffer_size,
+            # 非分片流按區間分塊請求，避免單個長連接被上游限速
+            "http_chunk_size": self.http_chunk_size,
+        }
+        options.update(self.ydl_opts)
+        options.update(overrides)
+        return options
+
+    def extract_info(self, url: str) -> Dict[str, Any]:
+        """
+        提取完整元數據（不下載），結果可 JSON 序列化
+
+        包含各格式帶簽名的媒體 URL，可傳給 download_video(info=...) 直接下載。
+        """
+        import yt_dlp
+
+        try:
+            with yt_dlp.YoutubeDL(self._options()) as ydl:
+                info = ydl.extract_info(url, download=False)
+        except yt_dlp.utils.DownloadError as e:
+            raise _wrap_error(e) from e
+        info = ydl.sanitize_info(info, remove_private_keys=True)
+        for field in HEAVY_INFO_FIELDS:
+            info.pop(field, None)
+        return info
+
+    def get_video_info(self, url: str) -> Dict[str, Any]:
+        """提取影片元數據摘要（不下載）"""
+        return summarize_info(self.extract_info(url))
+
+    def extract_playlist(self, url: str, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        平鋪提取播放列表或頻道（不解析各影片的格式）
+
+        返回 id、title 與 entries；entries 是惰性迭代器，yt-dlp 按頁請求上游，
+        消費者取多少才翻多少頁，不需要先取得完整列表。
+        每個條目包含 id、url、title 與 duration（平鋪結果中可能為 None）。
+        單個影片 URL 視為只有一個條目的列表。
+        """
+        import yt_dlp
+
+        options = self._options(extract_flat="in_playlist", noplaylist=False)
+        ydl = yt_dlp.YoutubeDL(options)
+        try:
+            result = ydl.extract_info(url, download=False, process=False)
+            # 頻道首頁等 URL 先解析為實際的列表頁
+            for _ in range(3):
+                if result.get("_type") not in ("url", "url_transparent"):
+                    break
+                result = ydl.extract_info(result["url"], download=False, process=False,
+                                          ie_key=result.get("ie_key"))
+        except yt_dlp.utils.DownloadError as e:
+            ydl.close()
+            raise _wrap_error(e) from e
+
+        if result.get("_type") not in ("playlist", "multi_video"):
+            ydl.close()
+            entries: Iterator[Dict[str, Any]] = iter([{
+                "id": result.get("id"),
+                "url": result.get("webpage_url") or url,
+                "title": result.get("title"),
+                "duration": result.get("duration"),
+            }])
+        else:
+            entries = self._iter_playlist(ydl, result)
+        return {
+            "id": result.get("id"),
+            "title": result.get("title"),
+            "entries": itertools.islice(entries, limit) if limit else entries,
+        }
+
+    def _iter_playlist(self, ydl: "yt_dlp.YoutubeDL", playlist: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        import yt_dlp
+
+        try:
+            yield from self._iter_entries(playlist)
+        except (yt_dlp.utils.DownloadError, yt_dlp.utils.ExtractorError) as e:
+            raise _wrap_entry_error(e) from e
+        finally:
+            ydl.close()
+
+    def _iter_entries(self, playlist: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        for entry in playlist.get("entries") or []:
+            if not entry:
+                continue
+            # 頻道的分頁（影片、直播等）以嵌套列表返回
+            if entry.get("_type") in ("playlist", "multi_video"):
+                yield from self._iter_entries(entry)
+                continue
+            entry_url = entry.get("url") or entry.get("webpage_url")
+            if entry_url:
+                yield {
+                    "id": entry.get("id"),
+                    "url": entry_url,
+                    "title": entry.get("title"),
+                    "duration": entry.get("duration"),
+                }
+
+    def download_video(
+        self,
+        url: str,
+        format: str = "mp4",
+        quality: str = "720p",
+        filename: Optional[str] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        info: Optional[Dict[str, Any]] = None,
+        checkpoint: Optional[DownloadCheckpoint] = None,
+    ) -> Dict[str, Any]:
+        """
+        下載影片並返回結果
+
+        filename 為不含副檔名的文件名，默認為 "{影片 ID}_{畫質}"。
+        info 為 extract_info 的結果，傳入時跳過提取直接按其中的媒體 URL 下載。
+        checkpoint 為該文件名的斷點：續傳時固定使用上次的格式，中斷時寫出最新進度，完成後刪除。
+        返回 filepath、filename、size、vcodec / acodec（未知時為 None）與 info（見 summarize_info）。
+        文件的容器可能與 format 不同（例如 mp3 只有其他編碼的音軌），由轉碼階段轉換。
+        """
+        import yt_dlp
+
+        stem = filename or f"%(id)s_{quality.lower()}"
+        container = SOURCE_CONTAINERS.get(format, format)
+        selector = build_format_selector(container, quality)
+        if checkpoint is not None and checkpoint.format_ids:
+            if info is None:
+                info = self.extract_info(url)
+            available = {f.get("format_id") for f in info.get("formats") or []}
+            if set(checkpoint.format_ids) <= available:
+                selector = "+".join(checkpoint.format_ids)
+            else:
+                # 上次的格式已不可用，已下載的部分不能拼接到其他流上
+                checkpoint.discard()
+
+        lease = None
+        if self.bandwidth is not None:
+            # 分片下載最多同時打開 fragment_concurrency 個連接，按此佔用上游連接槽
+            lease = self.bandwidth.connections(media_url(info) if info else url, self.fragment_concurrency)
+
+        def on_bytes(nbytes: int) -> None:
+            lease.keepalive()
+            self.bandwidth.throttle(nbytes)
+
+        hooks = []
+        if progress_callback or lease is not None or checkpoint is not None:
+            hooks.append(_ProgressHook(progress_callback, on_bytes if lease is not None else None, checkpoint))
+        overrides: Dict[str, Any] = {
+            "format": selector,
+            "outtmpl": os.path.join(self.download_path, f"{stem}.%(ext)s"),
+            "progress_hooks": hooks,
+        }
+        if container in MERGE_FORMATS:
+            overrides["merge_output_format"] = container
+
+        try:
+            with yt_dlp.YoutubeDL(self._options(**overrides)) as ydl:
+                if info is not None:
+                    info = ydl.process_ie_result(dict(info), download=True)
+                else:
+                    info = ydl.extract_info(url, download=True)
+        except yt_dlp.utils.DownloadError as e:
+            raise _wrap_error(e) from e
+        finally:
+            if lease is not None:
+                lease.release()
+            if checkpoint is not None:
+                checkpoint.save()
+
+        downloads = info.get("requested_downloads") or []
+        filepath = downloads[0].get("filepath") if downloads else None
+        if not filepath or not os.path.isfile(filepath):
+            raise DownloadError(f"下載完成但找不到輸出文件: {url}")
+
+        if checkpoint is not None:
+            checkpoint.clear()
+        return {
+            "filepath": filepath,
+            "filename": os.path.basename(filepath),
+            "size": os.path.getsize(filepath),
+            "vcodec": info.get("vcodec"),
+            "acodec": info.get("acodec"),
+            "info": summarize_info(ydl.sanitize_info(info)),
+        }
+
+
+_downloader: Optional[YouTubeDownloader] = None
+
+
+def get_downloader() -> YouTubeDownloader:
+    """返回進程內共享的下載引擎"""
+    global _downloader
+    if _downloader is None:
+        _downloader = YouTubeDownloader(bandwidth=get_bandwidth_scheduler())
+    return _downloader
+
+
+def preload_extractors(names: List[str]) -> None:
+    """
+    導入 yt-dlp 並初始化指定的提取器（例如 "Youtube"）
+
+    worker 主進程在 fork 子進程前調用，提取器模塊與正則等只在主進程中加載一次。
+    """
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL({"quiet": True, "no_warnings": True}) as ydl:
+        for name in names:
+            ydl.get_info_extractor(name)
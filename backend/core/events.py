@@ -0,0 +1,274 @@
+"""
+任務進度事件
+
+worker 在任務狀態變化時發佈事件，API 進程以 SSE / WebSocket 推送給客戶端，
+取代客戶端輪詢 GET /api/download/tasks/{task_id}。
+
+- InMemoryEventBus: 進程內直接分發（開發環境、eager 模式）
+- RedisEventBus: 經 Redis pub/sub 傳遞；每個 API 進程只保持一個 pub/sub 連接，
+  只訂閱本進程有訂閱者的任務頻道，再在進程內按 task_id 分發給各個訂閱者
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Set
+
+from core.config import settings
+from core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# 到達這些狀態後不會再有更新
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class Subscription:
+    """一個客戶端連接的訂閱，可隨時增減關注的 task_id"""
+
+    # 隊列滿時丟棄最舊的事件，客戶端只關心最新狀態
+    MAX_PENDING = 100
+
+    def __init__(self, bus: "EventBus", loop: asyncio.AbstractEventLoop):
+        self.bus = bus
+        self.loop = loop
+        self.task_ids: Set[str] = set()
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=self.MAX_PENDING)
+
+    def add(self, task_ids: Iterable[str]) -> None:
+        task_ids = set(task_ids) - self.task_ids
+        self.task_ids |= task_ids
+        self.bus._attach(self, task_ids)
+
+    def remove(self, task_ids: Iterable[str]) -> None:
+        task_ids = set(task_ids) & self.task_ids
+        self.task_ids -= task_ids
+        self.bus._detach(self, task_ids)
+
+    def close(self) -> None:
+        self.remove(set(self.task_ids))
+
+    async def ready(self) -> None:
+        """等待已添加的 task_id 在總線上生效；讀取任務快照前調用，快照之後的事件不會遺漏"""
+        await self.bus._ready()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """等待下一個事件，超時返回 None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def _put(self, event: Dict[str, Any]) -> None:
+        # 只在事件循環線程中調用
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class EventBus:
+    """事件總線：publish 可在任意線程同步調用，subscribe 需在事件循環中調用"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, task_id: str, event: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, task_ids: Iterable[str] = ()) -> Subscription:
+        subscription = Subscription(self, asyncio.get_running_loop())
+        subscription.add(task_ids)
+        return subscription
+
+    def _attach(self, subscription: Subscription, task_ids: Set[str]) -> bool:
+        """加入訂閱者，返回是否有任務從無人關注變為有人關注"""
+        added = False
+        with self._lock:
+            for task_id in task_ids:
+                if task_id not in self._subscribers:
+                    self._subscribers[task_id] = set()
+                    added = True
+                self._subscribers[task_id].add(subscription)
+        return added
+
+    def _detach(self, subscription: Subscription, task_ids: Set[str]) -> bool:
+        """移除訂閱者，返回是否有任務不再有人關注"""
+        removed = False
+        with self._lock:
+            for task_id in task_ids:
+                subscribers = self._subscribers.get(task_id)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[task_id]
+                    removed = True
+        return removed
+
+    async def _ready(self) -> None:
+        pass
+
+    def _dispatch_local(self, task_id: str, event: Dict[str, Any]) -> None:
+        """分發給本進程內關注該任務的訂閱者（線程安全）"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription._put, event)
+
+
+class InMemoryEventBus(EventBus):
+    """進程內事件總線"""
+
+    def publish(self, task_id: str, event: Dict[str, Any]) -> None:
+        self._dispatch_local(task_id, dict(event, id=task_id))
+
+
+class RedisEventBus(EventBus):
+    """
+    Redis pub/sub 事件總線，頻道為 {prefix}:task_events:{task_id}
+
+    本進程的第一個訂閱者關注某任務時 SUBSCRIBE 其頻道，最後一個離開時 UNSUBSCRIBE，
+    沒有客戶端關注的任務事件不會發送到本進程。訂閱變更與接收共用一個連接，
+    變更在事件循環中按本進程的訂閱者集合整體同步，先後觸發的多次變更不會互相覆蓋。
+    """
+
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, client, url: str, prefix: str = "ytdl"):
+        super().__init__()
+        self.redis = client
+        self.url = url
+        self.prefix = prefix
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._syncs: Set[asyncio.Future] = set()
+        self._sync_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._client = None
+        self._pubsub = None
+        # 已在 pub/sub 連接上訂閱的頻道；_retry 表示上次同步失敗，由監聽任務稍後重試
+        self._channels: Set[str] = set()
+        self._retry = False
+
+    def _channel(self, task_id: str) -> str:
+        return f"{self.prefix}:task_events:{task_id}"
+
+    def publish(self, task_id: str, event: Dict[str, Any]) -> None:
+        self.redis.publish(self._channel(task_id), json.dumps(dict(event, id=task_id), ensure_ascii=False))
+
+    def subscribe(self, task_ids: Iterable[str] = ()) -> Subscription:
+        if self._listener is None or self._listener.done():
+            self._loop = asyncio.get_running_loop()
+            self._sync_lock = asyncio.Lock()
+            self._wakeup = asyncio.Event()
+            self._channels = set()
+            self._listener = self._loop.create_task(self._listen())
+        return super().subscribe(task_ids)
+
+    def _attach(self, subscription: Subscription, task_ids: Set[str]) -> bool:
+        added = super()._attach(subscription, task_ids)
+        if added:
+            self._request_sync()
+        return added
+
+    def _detach(self, subscription: Subscription, task_ids: Set[str]) -> bool:
+        removed = super()._detach(subscription, task_ids)
+        if removed:
+            self._request_sync()
+        return removed
+
+    async def _ready(self) -> None:
+        await self._sync()
+
+    def _request_sync(self) -> None:
+        if self._loop is None or self._loop.is_closed():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._sync(), self._loop)
+        self._syncs.add(future)
+        future.add_done_callback(self._syncs.discard)
+
+    def _connect(self):
+        import redis.asyncio as aioredis
+
+        return aioredis.Redis.from_url(self.url, decode_responses=True)
+
+    async def _sync(self) -> None:
+        """使連接上訂閱的頻道與本進程的訂閱者一致"""
+        async with self._sync_lock:
+            with self._lock:
+                wanted = {self._channel(task_id) for task_id in self._subscribers}
+            added, removed = wanted - self._channels, self._channels - wanted
+            if not (added or removed):
+                return
+            try:
+                if self._pubsub is None:
+                    self._client = self._connect()
+                    self._pubsub = self._client.pubsub()
+                if added:
+                    await self._pubsub.subscribe(*added)
+                if removed:
+                    await self._pubsub.unsubscribe(*removed)
+            except Exception as e:
+                logger.warning("更新任務事件訂閱失敗: %s", e)
+                await self._close_connection()
+                self._retry = True
+            else:
+                self._channels = wanted
+                self._retry = False
+            self._wakeup.set()
+
+    async def _close_connection(self) -> None:
+        pubsub, client = self._pubsub, self._client
+        self._pubsub = self._client = None
+        self._channels = set()
+        for resource in (pubsub, client):
+            if resource is not None:
+                try:
+                    await resource.aclose()
+                except Exception:
+                    pass
+
+    async def _listen(self) -> None:
+        prefix = f"{self.prefix}:task_events:"
+        while True:
+            pubsub = self._pubsub
+            if pubsub is None or not pubsub.subscribed:
+                if self._retry:
+                    await asyncio.sleep(self.RECONNECT_DELAY)
+                    await self._sync()
+                    continue
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("任務事件訂閱中斷，%.1f 秒後重連: %s", self.RECONNECT_DELAY, e)
+                async with self._sync_lock:
+                    if self._pubsub is pubsub:
+                        await self._close_connection()
+                await asyncio.sleep(self.RECONNECT_DELAY)
+                await self._sync()
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            task_id = message["channel"][len(prefix):]
+            self._dispatch_local(task_id, json.loads(message["data"]))
+
+
+_event_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    """返回進程內共享的事件總線，後端與任務存儲一致"""
+    global _event_bus
+    if _event_bus is None:
+        if settings.TASK_STORE_BACKEND == "redis":
+            _event_bus = RedisEventBus(get_redis_client(), settings.REDIS_URL, prefix=settings.TASK_STORE_PREFIX)
+        else:
+            _event_bus = InMemoryEventBus()
+    return _event_bus
@@ -0,0 +1,210 @@
+"""
+大文件分發
+
+- parse_range: 解析 Range 請求頭（單區間、多區間、後綴區間），合併重疊區間
+- FileRangeResponse: 發送整個文件、單個區間（206）或 multipart/byteranges
+  服務器支持 ASGI zerocopysend 擴展時以 sendfile 零拷貝發送，
+  否則在線程池中以 os.pread 大塊讀取，不經過 Python 層的逐塊 seek
+- etag_matches / if_range_matches: 條件請求的 ETag 比較（RFC 9110）
+"""
+
+import os
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+
+import anyio
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# (起始, 結束) 均為閉區間字節偏移
+ByteRange = Tuple[int, int]
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+class RangeNotSatisfiable(ValueError):
+    """Range 語法正確但沒有任何區間落在文件內"""
+
+
+def parse_range(header: str, size: int, max_ranges: int) -> Optional[List[ByteRange]]:
+    """
+    解析 Range 請求頭，返回按起始位置排序並合併後的區間
+
+    語法錯誤或區間數超過 max_ranges 時返回 None（忽略 Range，發送整個文件）；
+    沒有可滿足的區間時拋出 RangeNotSatisfiable。
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges: List[ByteRange] = []
+    specs = spec.split(",")
+    if len(specs) > max_ranges:
+        return None
+    for item in specs:
+        first, sep, last = item.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if start < 0 or (last and end < start):
+                    return None
+            else:
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable(header)
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _etags(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match 的弱比較"""
+    return any(tag == "*" or _opaque(tag) == _opaque(etag) for tag in _etags(header))
+
+
+def if_range_matches(header: str, etag: Optional[str], mtime: float) -> bool:
+    """If-Range 成立時才按 Range 發送：強 ETag 完全相同，或日期與 Last-Modified 相同"""
+    header = header.strip()
+    if header.startswith('"') or header.startswith("W/"):
+        return etag is not None and not etag.startswith("W/") and header == etag
+    try:
+        return int(parsedate_to_datetime(header).timestamp()) == int(mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+def not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= int(parsedate_to_datetime(header).timestamp())
+    except (TypeError, ValueError):
+        return False
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+class FileRangeResponse(Response):
+    """發送文件的全部或部分區間"""
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        media_type: str,
+        ranges: Optional[List[ByteRange]] = None,
+        headers: Optional[dict] = None,
+        send_body: bool = True,
+        chunk_size: int = 1024 * 1024,
+        background: Optional[BackgroundTask] = None,
+    ):
+        self.path = path
+        self.size = size
+        self.chunk_size = chunk_size
+        self.send_body = send_body
+        self.background = background
+        self.body = b""
+        self.status_code = 206 if ranges else 200
+        self.media_type = media_type
+
+        # 每個片段為 (前綴字節, 區間)；多區間時前綴為 multipart 分段頭
+        self.parts: List[Tuple[bytes, Optional[ByteRange]]] = []
+        self.trailer = b""
+        extra = dict(headers or {})
+        if not ranges:
+            self.parts.append((b"", (0, size - 1) if size else None))
+            content_type = media_type
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.parts.append((b"", (start, end)))
+            extra["content-range"] = f"bytes {start}-{end}/{size}"
+            content_type = media_type
+        else:
+            boundary = secrets.token_hex(16)
+            for start, end in ranges:
+                head = (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+                )
+                prefix = (b"\r\n" if self.parts else b"") + head.encode("latin-1")
+                self.parts.append((prefix, (start, end)))
+            self.trailer = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            content_type = f"multipart/byteranges; boundary={boundary}"
+
+        length = len(self.trailer) + sum(
+            len(prefix) + (r[1] - r[0] + 1 if r else 0) for prefix, r in self.parts
+        )
+        extra["content-length"] = str(length)
+        extra["content-type"] = content_type
+        extra.setdefault("accept-ranges", "bytes")
+        self.init_headers(extra)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_body and scope.get("method") != "HEAD":
+            zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+            with open(self.path, "rb") as f:
+                for prefix, byte_range in self.parts:
+                    if prefix:
+                        await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                    if byte_range is None:
+                        continue
+                    if zerocopy:
+                        await self._zerocopy_send(send, f, byte_range)
+                    else:
+                        await self._pread_send(send, f.fileno(), byte_range)
+            if self.trailer:
+                await send({"type": "http.response.body", "body": self.trailer, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+    async def _zerocopy_send(self, send: Send, f, byte_range: ByteRange) -> None:
+        start, end = byte_range
+        await send({
+            "type": ZEROCOPY_EXTENSION,
+            "file": f,
+            "offset": start,
+            "count": end - start + 1,
+            "more_body": True,
+        })
+
+    async def _pread_send(self, send: Send, fd: int, byte_range: ByteRange) -> None:
+        offset, end = byte_range
+        while offset <= end:
+            length = min(self.chunk_size, end - offset + 1)
+            chunk = await anyio.to_thread.run_sync(os.pread, fd, length, offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
@@ -0,0 +1,293 @@
+"""
+下載文件索引
+
+以文件名為鍵記錄 downloads/ 中每個文件的大小、修改時間、SHA-256、最近訪問時間與固定狀態：
+- /downloads 以其中的摘要作為強 ETag，無需在請求路徑上讀取文件內容
+- 存儲配額管理（core/storage.py）以其中的總字節數與按訪問時間排序的未固定文件做 LRU 淘汰，
+  不需要遍歷目錄
+
+摘要只在大小與修改時間都和磁盤上的文件一致時有效；
+文件被替換後條目自動失效，由 index() 重新計算（保留訪問時間與固定狀態）。
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import settings
+from core.redis_client import get_redis_client
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """計算文件的 SHA-256（十六進制）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileIndex:
+    """
+    文件索引介面
+
+    條目包含 size、mtime_ns、sha256（尚未計算時缺失）、atime（最近訪問的 Unix 時間）、
+    pinned（固定的文件不會被淘汰），以及可選的 cache_key（對應的結果緩存鍵）。
+    """
+
+    def __init__(self, download_dir: str):
+        self.download_dir = download_dir
+
+    def lookup(self, filename: str, stat: os.stat_result) -> Optional[Dict[str, Any]]:
+        """返回與 stat 一致且已計算摘要的條目，不存在或已過時返回 None"""
+        entry = self.get(filename)
+        if (entry is None or not entry.get("sha256")
+                or entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns):
+            return None
+        return entry
+
+    def index(self, filename: str, **meta: Any) -> Dict[str, Any]:
+        """為文件計算摘要並寫入索引（讀取整個文件，應在 worker 或後台任務中調用）"""
+        path = os.path.join(self.download_dir, filename)
+        stat = os.stat(path)
+        entry = self.lookup(filename, stat)
+        if entry is not None and not meta:
+            return entry
+        previous = self.get(filename) or {}
+        entry = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": entry["sha256"] if entry is not None else file_digest(path),
+            "atime": previous.get("atime") or time.time(),
+            "pinned": previous.get("pinned", False),
+        }
+        entry.update({k: v for k, v in meta.items() if v is not None})
+        self.put(filename, entry)
+        return entry
+
+    def register(self, filename: str, stat: os.stat_result) -> bool:
+        """只以 stat 登記尚未索引的文件（不計算摘要），已有條目時返回 False"""
+        if self.get(filename) is not None:
+            return False
+        self.put(filename, {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "atime": max(stat.st_atime, stat.st_mtime),
+            "pinned": False,
+        })
+        return True
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, filename: str, entry: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def delete(self, filename: str) -> None:
+        raise NotImplementedError
+
+    def touch(self, filename: str, atime: Optional[float] = None) -> None:
+        """更新最近訪問時間，文件未索引時忽略"""
+        raise NotImplementedError
+
+    def set_pinned(self, filename: str, pinned: bool) -> bool:
+        """固定或取消固定，文件未索引時返回 False"""
+        raise NotImplementedError
+
+    def total_bytes(self) -> int:
+        """已索引文件的大小總和"""
+        raise NotImplementedError
+
+    def least_recent(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """按最近訪問時間升序返回至多 limit 個未固定的文件"""
+        raise NotImplementedError
+
+
+class InMemoryFileIndex(FileIndex):
+    """進程內文件索引"""
+
+    def __init__(self, download_dir: str):
+        super().__init__(download_dir)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(filename)
+            return dict(entry) if entry is not None else None
+
+    def put(self, filename: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            previous = self._entries.get(filename)
+            self._total += entry.get("size", 0) - (previous.get("size", 0) if previous else 0)
+            self._entries[filename] = dict(entry)
+
+    def delete(self, filename: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(filename, None)
+            if entry is not None:
+                self._total -= entry.get("size", 0)
+
+    def touch(self, filename: str, atime: Optional[float] = None) -> None:
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None:
+                entry["atime"] = atime or time.time()
+
+    def set_pinned(self, filename: str, pinned: bool) -> bool:
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None:
+                return False
+            entry["pinned"] = pinned
+            return True
+
+    def total_bytes(self) -> int:
+        return self._total
+
+    def least_recent(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            unpinned = [(name, dict(entry)) for name, entry in self._entries.items() if not entry.get("pinned")]
+        unpinned.sort(key=lambda item: item[1].get("atime") or 0)
+        return unpinned[:limit]
+
+
+class RedisFileIndex(FileIndex):
+    """
+    Redis 文件索引
+
+    鍵佈局（prefix 默認為 ytdl）:
+    - {prefix}:file:{filename}   條目哈希
+    - {prefix}:files:lru         zset，成員為未固定的文件名，score 為 atime
+    - {prefix}:files:bytes       已索引文件的大小總和
+
+    寫入與刪除以 Lua 腳本同時維護三者，多個進程併發更新時總和保持一致。
+    """
+
+    INT_FIELDS = ("size", "mtime_ns")
+
+    # KEYS: 條目, lru, bytes；ARGV: 文件名, 欄位/值...
+    PUT_SCRIPT = """
+    local old = tonumber(redis.call('HGET', KEYS[1], 'size') or '0')
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+    local entry = redis.call('HMGET', KEYS[1], 'size', 'atime', 'pinned')
+    redis.call('INCRBY', KEYS[3], (tonumber(entry[1]) or 0) - old)
+    if entry[3] == '1' then
+        redis.call('ZREM', KEYS[2], ARGV[1])
+    else
+        redis.call('ZADD', KEYS[2], tonumber(entry[2]) or 0, ARGV[1])
+    end
+    return 1
+    """
+
+    DELETE_SCRIPT = """
+    local size = tonumber(redis.call('HGET', KEYS[1], 'size') or '0')
+    if redis.call('DEL', KEYS[1]) == 1 then
+        redis.call('INCRBY', KEYS[3], -size)
+    end
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return 1
+    """
+
+    # ARGV: 文件名, atime
+    TOUCH_SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], 'atime', ARGV[2])
+    redis.call('ZADD', KEYS[2], 'XX', tonumber(ARGV[2]), ARGV[1])
+    return 1
+    """
+
+    # ARGV: 文件名, pinned（0 / 1）
+    PIN_SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], 'pinned', ARGV[2])
+    if ARGV[2] == '1' then
+        redis.call('ZREM', KEYS[2], ARGV[1])
+    else
+        redis.call('ZADD', KEYS[2], tonumber(redis.call('HGET', KEYS[1], 'atime') or '0'), ARGV[1])
+    end
+    return 1
+    """
+
+    def __init__(self, client, download_dir: str, prefix: str = "ytdl"):
+        super().__init__(download_dir)
+        self.redis = client
+        self.prefix = prefix
+        self._put_script = client.register_script(self.PUT_SCRIPT)
+        self._delete_script = client.register_script(self.DELETE_SCRIPT)
+        self._touch_script = client.register_script(self.TOUCH_SCRIPT)
+        self._pin_script = client.register_script(self.PIN_SCRIPT)
+
+    def _key(self, filename: str) -> str:
+        return f"{self.prefix}:file:{filename}"
+
+    def _keys(self, filename: str) -> List[str]:
+        return [self._key(filename), f"{self.prefix}:files:lru", f"{self.prefix}:files:bytes"]
+
+    def _decode(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not entry:
+            return None
+        for field in self.INT_FIELDS:
+            if field in entry:
+                entry[field] = int(entry[field])
+        if "atime" in entry:
+            entry["atime"] = float(entry["atime"])
+        entry["pinned"] = entry.get("pinned") == "1"
+        return entry
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        return self._decode(self.redis.hgetall(self._key(filename)))
+
+    def put(self, filename: str, entry: Dict[str, Any]) -> None:
+        fields: List[Any] = []
+        for field, value in entry.items():
+            if isinstance(value, bool):
+                value = int(value)
+            fields += [field, value]
+        self._put_script(keys=self._keys(filename), args=[filename] + fields)
+
+    def delete(self, filename: str) -> None:
+        self._delete_script(keys=self._keys(filename), args=[filename])
+
+    def touch(self, filename: str, atime: Optional[float] = None) -> None:
+        self._touch_script(keys=self._keys(filename), args=[filename, atime or time.time()])
+
+    def set_pinned(self, filename: str, pinned: bool) -> bool:
+        return bool(self._pin_script(keys=self._keys(filename), args=[filename, int(pinned)]))
+
+    def total_bytes(self) -> int:
+        return int(self.redis.get(f"{self.prefix}:files:bytes") or 0)
+
+    def least_recent(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        filenames = self.redis.zrange(f"{self.prefix}:files:lru", 0, limit - 1)
+        if not filenames:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        for filename in filenames:
+            pipe.hgetall(self._key(filename))
+        entries = [self._decode(raw) for raw in pipe.execute()]
+        # 條目已被刪除但仍在 zset 中時（不應出現）按空條目返回，由淘汰流程清理
+        return [(filename, entry or {}) for filename, entry in zip(filenames, entries)]
+
+
+_file_index: Optional[FileIndex] = None
+
+
+def get_file_index() -> FileIndex:
+    """返回進程內共享的文件索引，後端與任務存儲一致"""
+    global _file_index
+    if _file_index is None:
+        if settings.TASK_STORE_BACKEND == "redis":
+            _file_index = RedisFileIndex(get_redis_client(), settings.DOWNLOAD_DIR, prefix=settings.TASK_STORE_PREFIX)
+        else:
+            _file_index = InMemoryFileIndex(settings.DOWNLOAD_DIR)
+    return _file_index
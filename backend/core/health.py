@@ -0,0 +1,186 @@
+"""
+存活與就緒檢查
+
+/health/live 只說明進程能處理請求，不訪問任何依賴。
+/health/ready 返回後台探測線程緩存的結果：每 HEALTH_PROBE_INTERVAL 秒併發探測一次數據庫、
+Redis、broker 與 Celery worker，編排系統無論以多高頻率探測都不會給這些依賴增加負載。
+超過 HEALTH_PROBE_MAX_AGE 秒未刷新的結果視為過期，必需依賴的結果過期或失敗時不就緒。
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Probe(NamedTuple):
+    name: str
+    # 失敗時拋出異常；返回值作為探測結果的附加欄位
+    check: Callable[[], Optional[Dict[str, Any]]]
+    # 非必需的依賴只報告狀態，不影響就緒
+    required: bool = True
+
+
+class HealthProber:
+    """在後台線程中定期探測依賴，按需返回緩存的就緒狀態"""
+
+    def __init__(self, probes: List[Probe], timeout: float, max_age: float):
+        self.probes = probes
+        self.timeout = timeout
+        self.max_age = max_age
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> None:
+        """併發執行所有探測，最多等待 timeout 秒"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.probes)), thread_name_prefix="health-probe")
+        futures = {}
+        for probe in self.probes:
+            # 上一輪超時的探測仍在執行時不重複提交，其結果隨時間過期
+            previous = self._in_flight.get(probe.name)
+            if previous is not None and not previous.done():
+                continue
+            futures[probe.name] = self._in_flight[probe.name] = self._executor.submit(self._run_probe, probe)
+        wait(futures.values(), timeout=self.timeout)
+        for name, future in futures.items():
+            try:
+                result = future.result(timeout=0)
+            except FutureTimeoutError:
+                result = {"status": "timeout", "latency_ms": round(self.timeout * 1000, 1),
+                          "error": f"{self.timeout:.1f}s 內未返回"}
+                result["checked_at"] = time.time()
+            with self._lock:
+                self._results[name] = result
+
+    def _run_probe(self, probe: Probe) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            result = dict(probe.check() or {}, status="ok")
+        except Exception as e:
+            result = {"status": "error", "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        result["checked_at"] = time.time()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回緩存的探測結果與就緒狀態（不訪問任何依賴）"""
+        now = time.time()
+        with self._lock:
+            results = {name: dict(result) for name, result in self._results.items()}
+        ready = True
+        checks = {}
+        for probe in self.probes:
+            result = results.get(probe.name, {"status": "pending"})
+            if "checked_at" in result:
+                result["age"] = round(now - result.pop("checked_at"), 1)
+                if result["status"] == "ok" and result["age"] > self.max_age:
+                    result["status"] = "stale"
+            result["required"] = probe.required
+            if probe.required and result["status"] != "ok":
+                ready = False
+            checks[probe.name] = result
+        return {"status": "ready" if ready else "not_ready", "checks": checks}
+
+    def start(self, interval: float) -> None:
+        """啟動後台探測線程"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="health-prober", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+        if self._executor is not None:
+            # 不等待仍卡在依賴上的探測線程
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("依賴探測失敗: %s", e)
+            self._stop.wait(interval)
+
+
+def check_database() -> None:
+    # 使用應用的連接池，探測不新建連接
+    from db.base import engine
+
+    with engine.connect() as connection:
+        connection.exec_driver_sql("SELECT 1")
+
+
+def check_redis() -> None:
+    from core.redis_client import get_redis_client
+
+    get_redis_client().ping()
+
+
+_broker_connection = None
+_broker_lock = threading.Lock()
+
+
+def _get_broker_connection():
+    """復用同一個 broker 連接發送探測與控制命令"""
+    global _broker_connection
+    from celery_app import celery_app
+
+    with _broker_lock:
+        if _broker_connection is None:
+            _broker_connection = celery_app.connection_for_write(connect_timeout=settings.HEALTH_PROBE_TIMEOUT)
+        try:
+            _broker_connection.ensure_connection(max_retries=1)
+        except Exception:
+            _broker_connection.release()
+            _broker_connection = None
+            raise
+        return celery_app, _broker_connection
+
+
+def check_broker() -> None:
+    _get_broker_connection()
+
+
+def check_workers() -> Dict[str, Any]:
+    celery_app, connection = _get_broker_connection()
+    replies = celery_app.control.ping(timeout=settings.HEALTH_PROBE_TIMEOUT / 2, connection=connection)
+    workers = sorted(name for reply in replies for name in reply)
+    if not workers:
+        raise RuntimeError("沒有回應的 Celery worker")
+    return {"workers": len(workers)}
+
+
+_health_prober: Optional[HealthProber] = None
+
+
+def get_health_prober() -> HealthProber:
+    """返回進程內共享的依賴探測器"""
+    global _health_prober
+    if _health_prober is None:
+        probes = [Probe("database", check_database)]
+        if settings.TASK_STORE_BACKEND == "redis":
+            probes.append(Probe("redis", check_redis))
+        probes.append(Probe("broker", check_broker))
+        probes.append(Probe("workers", check_workers, required=settings.HEALTH_REQUIRE_WORKERS))
+        _health_prober = HealthProber(
+            probes,
+            timeout=settings.HEALTH_PROBE_TIMEOUT,
+            max_age=settings.HEALTH_PROBE_MAX_AGE,
+        )
+    return _health_prober
@@ -0,0 +1,275 @@
+"""
+影片元數據緩存
+
+yt-dlp 的 extract_info 是請求中最慢的一步（數百毫秒到數秒），
+create_task 校驗、/info 查詢與 worker 下載都先查這裡：
+
+- 本地層：進程內有界 LRU，命中不產生任何 IO
+- 共享層：Redis（TASK_STORE_BACKEND=redis 時），API 與各 worker 共享提取結果
+
+條目的存活時間：
+- 成功條目默認 METADATA_CACHE_TTL 秒，但不超過媒體 URL 簽名的過期時間
+  減去 METADATA_EXPIRY_MARGIN（留給排隊與下載本身的時間）
+- 影片不可用（已刪除、私有等）作為否定條目緩存 METADATA_NEGATIVE_TTL 秒；
+  網絡錯誤等暫時性失敗不緩存
+
+命中統計為本進程的計數。
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from core.config import settings
+from core.downloader import VideoUnavailable
+from core.metrics import CACHE_REQUESTS
+from core.redis_client import get_redis_client
+from core.video import extract_video_id
+
+# 本進程計數名 -> ytdl_cache_requests_total 的 result 標籤
+RESULT_LABELS = {
+    "local_hits": "local_hit",
+    "shared_hits": "shared_hit",
+    "negative_hits": "negative_hit",
+    "misses": "miss",
+}
+
+# googlevideo 清單 URL 以路徑段攜帶過期時間: .../expire/1700000000/...
+EXPIRE_PATH_RE = re.compile(r"/expire/(\d+)")
+
+
+def metadata_key(url: str) -> str:
+    """YouTube 影片以影片 ID 為鍵，其他 URL 以其摘要為鍵"""
+    video_id = extract_video_id(url)
+    if video_id is not None:
+        return video_id
+    return "url-" + hashlib.sha1(url.strip().encode()).hexdigest()
+
+
+def media_url_expiry(info: Dict[str, Any]) -> Optional[float]:
+    """元數據中所有媒體 URL 最早的簽名過期時間（epoch 秒），沒有簽名時返回 None"""
+    expiry = None
+    formats = list(info.get("formats") or []) + list(info.get("requested_formats") or [])
+    for item in formats + [info]:
+        for field in ("url", "manifest_url"):
+            url = item.get(field)
+            if not url:
+                continue
+            values = parse_qs(urlparse(url).query).get("expire") or EXPIRE_PATH_RE.findall(url)
+            for value in values:
+                if value.isdigit() and (expiry is None or int(value) < expiry):
+                    expiry = int(value)
+    return expiry
+
+
+class MetadataCache:
+    """元數據緩存介面，子類只需實現共享層讀寫"""
+
+    def __init__(self, max_entries: int, ttl: int, negative_ttl: int, expiry_margin: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.expiry_margin = expiry_margin
+        # key -> 條目；條目為 {"info": ..., "expires_at": ...} 或 {"error": ..., "expires_at": ...}
+        self._local: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._counters = {"local_hits": 0, "shared_hits": 0, "negative_hits": 0, "misses": 0}
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def peek(self, url: str) -> Optional[Dict[str, Any]]:
+        """查詢緩存但不提取，未命中返回 None"""
+        return self.peek_many([url])[0]
+
+    def peek_many(self, urls: List[str]) -> List[Optional[Dict[str, Any]]]:
+        entries, local = self._lookup_many([metadata_key(url) for url in urls])
+        for entry, is_local in zip(entries, local):
+            if entry is None:
+                self._count("misses")
+            elif "error" in entry:
+                self._count("negative_hits")
+            else:
+                self._count("local_hits" if is_local else "shared_hits")
+        return entries
+
+    def get_info(self, url: str, extract: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        返回完整元數據，未命中時調用 extract 提取並寫入緩存
+
+        影片不可用時拋出 VideoUnavailable（包括命中否定條目）。
+        同一進程內對同一影片的併發未命中只提取一次：提取在該影片的加載鎖內進行，
+        取得鎖後先重新查詢本地層與共享層，結果寫入緩存後才移除加載鎖。
+        """
+        entry = self.peek(url)
+        if entry is None:
+            key = metadata_key(url)
+            with self._lock:
+                loading = self._loading.setdefault(key, threading.Lock())
+            with loading:
+                # 等待期間其他線程或進程可能已寫入結果
+                entry = self._lookup_many([key])[0][0]
+                if entry is None:
+                    entry = self._extract(url, extract)
+                with self._lock:
+                    if self._loading.get(key) is loading:
+                        del self._loading[key]
+        if "error" in entry:
+            raise VideoUnavailable(entry["error"])
+        return entry["info"]
+
+    def put(self, url: str, info: Dict[str, Any]) -> Dict[str, Any]:
+        """寫入成功提取的元數據，存活時間受媒體 URL 簽名過期時間限制"""
+        now = time.time()
+        ttl = self.ttl
+        expiry = media_url_expiry(info)
+        if expiry is not None:
+            ttl = min(ttl, int(expiry - self.expiry_margin - now))
+        entry = {"info": info, "expires_at": now + ttl}
+        if ttl > 0:
+            self._put(metadata_key(url), entry, ttl)
+        return entry
+
+    def put_unavailable(self, url: str, reason: str) -> Dict[str, Any]:
+        """寫入否定條目"""
+        entry = {"error": reason, "expires_at": time.time() + self.negative_ttl}
+        self._put(metadata_key(url), entry, self.negative_ttl)
+        return entry
+
+    def invalidate(self, url: str) -> None:
+        key = metadata_key(url)
+        with self._lock:
+            self._local.pop(key, None)
+        self._delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._local)
+        hits = counters["local_hits"] + counters["shared_hits"] + counters["negative_hits"]
+        total = hits + counters["misses"]
+        return dict(
+            counters,
+            hits=hits,
+            hit_ratio=round(hits / total, 4) if total else 0.0,
+            local_entries=size,
+            max_entries=self.max_entries,
+        )
+
+    def _extract(self, url: str, extract: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        try:
+            info = extract(url)
+        except VideoUnavailable as e:
+            return self.put_unavailable(url, str(e))
+        return self.put(url, info)
+
+    def _put(self, key: str, entry: Dict[str, Any], ttl: int) -> None:
+        self._local_put(key, entry)
+        self._store(key, entry, ttl)
+
+    def _lookup_many(self, keys: List[str]) -> Tuple[List[Optional[Dict[str, Any]]], List[bool]]:
+        """依次查詢本地層與共享層，返回條目及其是否來自本地層；共享層的命中寫入本地層"""
+        entries = self._local_get_many(keys)
+        local = [entry is not None for entry in entries]
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if missing:
+            now = time.time()
+            for i, entry in zip(missing, self._load_many([keys[i] for i in missing])):
+                if entry is not None and entry["expires_at"] > now:
+                    entries[i] = entry
+                    self._local_put(keys[i], entry)
+        return entries, local
+
+    def _local_get_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        now = time.time()
+        results = []
+        with self._lock:
+            for key in keys:
+                entry = self._local.get(key)
+                if entry is not None and entry["expires_at"] <= now:
+                    del self._local[key]
+                    entry = None
+                if entry is not None:
+                    self._local.move_to_end(key)
+                results.append(entry)
+        return results
+
+    def _local_put(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._local[key] = entry
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+        CACHE_REQUESTS.labels("metadata", RESULT_LABELS[name]).inc()
+
+    def _load_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def _store(self, key: str, entry: Dict[str, Any], ttl: int) -> None:
+        raise NotImplementedError
+
+    def _delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryMetadataCache(MetadataCache):
+    """只有進程內 LRU 的元數據緩存"""
+
+    def _load_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        return [None] * len(keys)
+
+    def _store(self, key: str, entry: Dict[str, Any], ttl: int) -> None:
+        pass
+
+    def _delete(self, key: str) -> None:
+        pass
+
+
+class RedisMetadataCache(MetadataCache):
+    """進程內 LRU + Redis 共享層，條目為 {prefix}:metadata:{key}，帶 TTL"""
+
+    def __init__(self, client, max_entries: int, ttl: int, negative_ttl: int, expiry_margin: int,
+                 prefix: str = "ytdl"):
+        super().__init__(max_entries, ttl, negative_ttl, expiry_margin)
+        self.redis = client
+        self.prefix = prefix
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.prefix}:metadata:{key}"
+
+    def _load_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        raw = self.redis.mget([self._entry_key(k) for k in keys])
+        return [json.loads(v) if v is not None else None for v in raw]
+
+    def _store(self, key: str, entry: Dict[str, Any], ttl: int) -> None:
+        self.redis.set(self._entry_key(key), json.dumps(entry, ensure_ascii=False), ex=ttl)
+
+    def _delete(self, key: str) -> None:
+        self.redis.delete(self._entry_key(key))
+
+
+_metadata_cache: Optional[MetadataCache] = None
+
+
+def get_metadata_cache() -> MetadataCache:
+    """返回進程內共享的元數據緩存，共享層後端與任務存儲一致"""
+    global _metadata_cache
+    if _metadata_cache is None:
+        args: Tuple[int, int, int, int] = (
+            settings.METADATA_CACHE_SIZE,
+            settings.METADATA_CACHE_TTL,
+            settings.METADATA_NEGATIVE_TTL,
+            settings.METADATA_EXPIRY_MARGIN,
+        )
+        if settings.TASK_STORE_BACKEND == "redis":
+            _metadata_cache = RedisMetadataCache(get_redis_client(), *args, prefix=settings.TASK_STORE_PREFIX)
+        else:
+            _metadata_cache = InMemoryMetadataCache(*args)
+    return _metadata_cache
@@ -0,0 +1,270 @@
+"""
+Prometheus 指標
+
+進程內直接更新的指標（HTTP 請求延遲、Celery 任務耗時與排隊時間、下載字節數、緩存查詢）
+在設置 PROMETHEUS_MULTIPROC_DIR 時以 prometheus_client 的多進程模式寫入該目錄下的 mmap 文件，
+多個 uvicorn worker 或 prefork 子進程的數值在導出時匯總；未設置時為普通的進程內指標。
+
+隊列深度、存儲用量與緩存命中率在抓取時計算（ScrapeCollector），只由 API 的 /metrics 導出。
+Celery worker 主進程按 CELERY_METRICS_PORT 另外提供一個 HTTP 端口，導出其子進程寫入的指標。
+
+常用查詢：
+- 每台 worker 的下載速率       rate(ytdl_download_bytes_total[1m])
+- 路由 P99 延遲               histogram_quantile(0.99, sum by (le, route) (rate(ytdl_http_request_duration_seconds_bucket[5m])))
+- 近期緩存命中率              1 - sum by (cache) (rate(ytdl_cache_requests_total{result="miss"}[5m]))
+                              / sum by (cache) (rate(ytdl_cache_requests_total[5m]))
+"""
+
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from prometheus_client import (
+    REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess, start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "ytdl_http_request_duration_seconds",
+    "HTTP 請求處理時間（到響應發送完畢）",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+TASK_DURATION = Histogram(
+    "ytdl_celery_task_duration_seconds",
+    "Celery 任務執行時間",
+    ["task", "queue", "outcome"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800),
+)
+
+TASK_WAIT = Histogram(
+    "ytdl_celery_task_wait_seconds",
+    "Celery 任務從投遞（或 ETA / countdown 到期）到開始執行的排隊時間",
+    ["task", "queue"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 1800, 3600),
+)
+
+DOWNLOAD_BYTES = Counter(
+    "ytdl_download_bytes_total",
+    "下載引擎從上游收到的字節數",
+    ["worker"],
+)
+
+DOWNLOAD_THROTTLED = Counter(
+    "ytdl_download_throttled_seconds_total",
+    "下載因帶寬限額而等待的時間",
+    ["worker"],
+)
+
+# result: 結果緩存為 hit / miss；元數據緩存為 local_hit / shared_hit / negative_hit / miss
+CACHE_REQUESTS = Counter(
+    "ytdl_cache_requests_total",
+    "緩存查詢次數",
+    ["cache", "result"],
+)
+
+# before_task_publish 寫入消息頭的投遞時間
+PUBLISHED_AT_HEADER = "published_at"
+
+_task_started: Dict[str, float] = {}
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def reset_multiprocess_dir() -> None:
+    """清空多進程指標目錄（只應在任何子進程啟動前由主進程調用）"""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        return
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def metrics_source():
+    """進程內直接更新的指標：多進程模式下為各進程文件的匯總"""
+    if multiprocess_enabled():
+        return multiprocess.MultiProcessCollector(None)
+    return REGISTRY
+
+
+def render_metrics(*collectors) -> bytes:
+    """以文本格式導出指標，collectors 為額外的抓取時收集器"""
+    registry = CollectorRegistry()
+    registry.register(metrics_source())
+    for collector in collectors:
+        registry.register(collector)
+    return generate_latest(registry)
+
+
+def start_metrics_server(port: int) -> None:
+    """在獨立線程中提供指標 HTTP 端口（Celery worker 主進程，匯總各子進程的指標）"""
+    registry = CollectorRegistry()
+    registry.register(metrics_source())
+    start_http_server(port, registry=registry)
+
+
+class MetricsMiddleware:
+    """
+    記錄每個請求的處理時間，按路由模板（而不是實際路徑）分組，避免標籤基數隨文件名 / 任務 ID 增長
+
+    純 ASGI 中間件：不包裝響應體，SSE / 文件流照常逐塊發送。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[Dict[Callable, str]] = None
+
+    def _route(self, scope) -> str:
+        if self._routes is None:
+            # 路由註冊在導入時完成，第一次請求時建立 端點 -> 路由模板 的映射
+            self._routes = {
+                route.endpoint: route.path
+                for route in scope["app"].routes
+                if getattr(route, "endpoint", None) is not None
+            }
+        return self._routes.get(scope.get("endpoint"), "<unmatched>")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_DURATION.labels(scope["method"], self._route(scope), str(status)).observe(
+                time.perf_counter() - start
+            )
+
+
+def record_task_published(headers: Dict[str, Any]) -> None:
+    headers.setdefault(PUBLISHED_AT_HEADER, time.time())
+
+
+def record_task_started(task_id: str, task, request) -> None:
+    _task_started[task_id] = time.monotonic()
+    published_at = request.get(PUBLISHED_AT_HEADER)
+    if not published_at:
+        return
+    # 延遲執行的任務（重試退避、ETA）從到期時間起算
+    ready_at = float(published_at)
+    eta = request.get("eta")
+    if eta:
+        try:
+            ready_at = max(ready_at, _timestamp(eta))
+        except ValueError:
+            pass
+    TASK_WAIT.labels(task.name, task_queue(request)).observe(max(0.0, time.time() - ready_at))
+
+
+def record_task_finished(task_id: str, task, request, state: Optional[str], retval: Any) -> None:
+    started = _task_started.pop(task_id, None)
+    if started is None:
+        return
+    # 任務以返回值中的 status 表示業務結果（error / transcoding / requeued ...）
+    if isinstance(retval, dict) and retval.get("status"):
+        outcome = str(retval["status"])
+    else:
+        outcome = (state or "unknown").lower()
+    TASK_DURATION.labels(task.name, task_queue(request), outcome).observe(time.monotonic() - started)
+
+
+def task_queue(request) -> str:
+    delivery_info = request.get("delivery_info") or {}
+    return delivery_info.get("routing_key") or "unknown"
+
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+class ScrapeCollector:
+    """
+    抓取時讀取的共享狀態
+
+    - ytdl_celery_queue_depth      broker 中各隊列（含各優先級子隊列）的待處理消息數
+    - ytdl_storage_bytes            下載目錄的容量、已用、已預留與已索引字節數
+    - ytdl_cache_hit_ratio          各緩存自指標導出進程啟動以來的命中率
+    """
+
+    def __init__(
+        self,
+        queue_depths: Callable[[], Dict[str, int]],
+        storage_stats: Callable[[], Dict[str, Any]],
+    ):
+        self.queue_depths = queue_depths
+        self.storage_stats = storage_stats
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        depth = GaugeMetricFamily("ytdl_celery_queue_depth", "broker 中待處理的消息數", labels=["queue"])
+        try:
+            for queue, count in self.queue_depths().items():
+                depth.add_metric([queue], count)
+        except Exception as e:
+            logger.warning("讀取隊列深度失敗: %s", e)
+        yield depth
+
+        storage = GaugeMetricFamily("ytdl_storage_bytes", "下載目錄存儲用量", labels=["kind"])
+        try:
+            stats = self.storage_stats()
+            for kind in ("capacity", "used", "reserved", "indexed", "high_watermark", "low_watermark"):
+                storage.add_metric([kind], stats.get(kind) or 0)
+        except Exception as e:
+            logger.warning("讀取存儲用量失敗: %s", e)
+        yield storage
+
+        ratio = GaugeMetricFamily("ytdl_cache_hit_ratio", "緩存命中率", labels=["cache"])
+        for cache, value in cache_hit_ratios().items():
+            ratio.add_metric([cache], value)
+        yield ratio
+
+
+def cache_hit_ratios() -> Dict[str, float]:
+    """由 ytdl_cache_requests_total 匯總各緩存的命中率"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for metric in metrics_source().collect():
+        if metric.name != "ytdl_cache_requests":
+            continue
+        for sample in metric.samples:
+            if sample.name.endswith("_total"):
+                counts = totals.setdefault(sample.labels["cache"], {})
+                counts[sample.labels["result"]] = counts.get(sample.labels["result"], 0) + sample.value
+    return {
+        cache: 1 - counts.get("miss", 0) / sum(counts.values())
+        for cache, counts in totals.items()
+        if sum(counts.values())
+    }
+
+
+def redis_queue_depths(client, queues: Iterable[str], priorities: Iterable[int], sep: str) -> Dict[str, int]:
+    """
+    Redis broker 中每個隊列的消息數
+
+    kombu 的優先級把隊列拆為多個列表：優先級 0 為隊列名本身，其餘為 隊列名 + sep + 優先級。
+    """
+    queues = list(queues)
+    priorities = list(priorities)
+    pipe = client.pipeline(transaction=False)
+    for queue in queues:
+        for priority in priorities:
+            pipe.llen(f"{queue}{sep}{priority}" if priority else queue)
+    counts = iter(pipe.execute())
+    return {queue: sum(next(counts) for _ in priorities) for queue in queues}
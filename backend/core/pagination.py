@@ -0,0 +1,29 @@
+"""
+keyset 分頁游標
+
+游標對客戶端是不透明字串，內容為 (created_at 分數, task_id) 的 base64 編碼。
+"""
+
+import base64
+import json
+from typing import Optional
+
+from core.task_store import PageKey
+
+
+def encode_cursor(key: Optional[PageKey]) -> Optional[str]:
+    """將分頁位置編碼為游標，None 表示沒有下一頁"""
+    if key is None:
+        return None
+    raw = json.dumps([key[0], key[1]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> PageKey:
+    """解碼游標，格式錯誤時拋出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, task_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(score), str(task_id)
+    except Exception as e:
+        raise ValueError(f"無效的游標: {cursor}") from e
@@ -0,0 +1,141 @@
+"""
+節流的任務進度上報
+
+下載線程只調用 report() 記錄最新狀態（不做 IO），由後台線程合併後寫出：
+- 兩次寫入至少間隔 min_interval 秒
+- 進度變化小於 min_delta 時不寫，但會保留到下次寫入或 close()
+- 狀態（status）變化立即寫出
+- close() 總是寫出最後的狀態
+
+寫出目標由 sink 回調決定（Celery update_state、任務存儲、進度事件等），
+sink 拋出的異常只記錄日誌，不會影響下載。
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressReporter:
+    """進度上報器，可作為上下文管理器使用"""
+
+    def __init__(
+        self,
+        sink: Callable[[Dict[str, Any]], None],
+        min_interval: Optional[float] = None,
+        min_delta: Optional[float] = None,
+        heartbeat: Optional[Callable[[], None]] = None,
+        heartbeat_interval: float = 20.0,
+        name: str = "progress-reporter",
+    ):
+        self.sink = sink
+        self.min_interval = settings.PROGRESS_MIN_INTERVAL if min_interval is None else min_interval
+        self.min_delta = settings.PROGRESS_MIN_DELTA if min_delta is None else min_delta
+        self.heartbeat = heartbeat
+        self.heartbeat_interval = heartbeat_interval
+
+        # 累積的最新狀態；_dirty 表示有尚未寫出的變化
+        self._latest: Dict[str, Any] = {}
+        self._dirty = False
+        self._last_written: Dict[str, Any] = {}
+        self._last_write_at = float("-inf")
+        self._last_heartbeat = time.monotonic()
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "ProgressReporter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def report(self, progress: Optional[float] = None, **fields: Any) -> None:
+        """記錄最新狀態，立即返回"""
+        with self._cond:
+            if progress is not None:
+                self._latest["progress"] = progress
+            self._latest.update(fields)
+            self._dirty = True
+            self._cond.notify()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """寫出最後的狀態並停止後台線程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _wait_for_write(self, now: float) -> Optional[float]:
+        """距離可寫出待寫狀態還需等待的秒數；None 表示暫不需要寫出"""
+        pending = self._latest
+        if not self._dirty or pending == self._last_written:
+            return None
+        last = self._last_written
+        if pending.get("status") != last.get("status"):
+            return 0.0
+        others_changed = any(pending.get(k) != last.get(k) for k in pending if k != "progress")
+        delta = abs((pending.get("progress") or 0) - (last.get("progress") or 0))
+        if not others_changed and delta < self.min_delta:
+            return None
+        return max(0.0, self._last_write_at + self.min_interval - now)
+
+    def _wait_for_heartbeat(self, now: float) -> Optional[float]:
+        if self.heartbeat is None:
+            return None
+        return max(0.0, self._last_heartbeat + self.heartbeat_interval - now)
+
+    def _run(self) -> None:
+        while True:
+            state = None
+            beat = False
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._closed:
+                        if self._dirty and self._latest != self._last_written:
+                            state = dict(self._latest)
+                        self._dirty = False
+                        break
+                    write_wait = self._wait_for_write(now)
+                    beat_wait = self._wait_for_heartbeat(now)
+                    if write_wait == 0.0:
+                        state = dict(self._latest)
+                        self._dirty = False
+                        break
+                    if beat_wait == 0.0:
+                        beat = True
+                        break
+                    waits = [w for w in (write_wait, beat_wait) if w is not None]
+                    self._cond.wait(min(waits) if waits else None)
+                closed = self._closed
+
+            if state is not None:
+                self._write(state)
+            if beat:
+                self._beat()
+            if closed:
+                return
+
+    def _write(self, state: Dict[str, Any]) -> None:
+        try:
+            self.sink(state)
+        except Exception as e:
+            logger.warning("寫出任務進度失敗: %s", e)
+        with self._cond:
+            self._last_written = state
+            self._last_write_at = time.monotonic()
+
+    def _beat(self) -> None:
+        try:
+            self.heartbeat()
+        except Exception as e:
+            logger.warning("任務心跳失敗: %s", e)
+        with self._cond:
+            self._last_heartbeat = time.monotonic()
@@ -0,0 +1,24 @@
+"""
+進程內共享的 Redis 客戶端
+
+任務存儲、結果緩存等共享狀態組件共用同一個連接池。
+"""
+
+import threading
+
+from core.config import settings
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_redis_client():
+    """返回按配置創建的 Redis 客戶端（連接池由 redis-py 內部管理）"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import redis
+
+                _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
@@ -0,0 +1,184 @@
+"""
+下載結果緩存
+
+以 (影片 ID, 格式, 畫質) 為鍵記錄已經下載到 downloads/ 的文件及其元數據，
+相同請求再次到達時直接返回已完成的任務。
+
+條目的生命週期與文件綁定：
+- 條目在 RESULT_CACHE_TTL 秒後過期（與文件保留時間一致）
+- 讀取時發現文件已被刪除則立即淘汰該條目，計為未命中
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import settings
+from core.metrics import CACHE_REQUESTS
+from core.redis_client import get_redis_client
+
+
+class ResultCache:
+    """結果緩存介面，子類只需實現底層讀寫"""
+
+    def __init__(self, download_dir: str, ttl: int):
+        self.download_dir = download_dir
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查詢緩存，命中時返回條目"""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        entries = self._load_many(keys) if keys else []
+        results: List[Optional[Dict[str, Any]]] = []
+        stale = []
+        for key, entry in zip(keys, entries):
+            if entry is not None and not self._file_exists(entry):
+                stale.append(key)
+                entry = None
+            results.append(entry)
+        if stale:
+            self._delete_many(stale)
+        hits = sum(1 for e in results if e is not None)
+        self._count(hits, len(results) - hits)
+        CACHE_REQUESTS.labels("result", "hit").inc(hits)
+        CACHE_REQUESTS.labels("result", "miss").inc(len(results) - hits)
+        return results
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        """寫入條目，entry 至少需要包含 filename"""
+        self._store(key, entry)
+
+    def evict(self, key: str) -> None:
+        self._delete_many([key])
+
+    def stats(self) -> Dict[str, Any]:
+        hits, misses = self._counters()
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+        }
+
+    def _file_exists(self, entry: Dict[str, Any]) -> bool:
+        return os.path.isfile(os.path.join(self.download_dir, entry["filename"]))
+
+    def _load_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def _store(self, key: str, entry: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def _delete_many(self, keys: List[str]) -> None:
+        raise NotImplementedError
+
+    def _count(self, hits: int, misses: int) -> None:
+        raise NotImplementedError
+
+    def _counters(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+
+class InMemoryResultCache(ResultCache):
+    """進程內結果緩存"""
+
+    def __init__(self, download_dir: str, ttl: int):
+        super().__init__(download_dir, ttl)
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def _load_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        now = time.time()
+        results = []
+        with self._lock:
+            for key in keys:
+                item = self._entries.get(key)
+                if item is not None and item[0] <= now:
+                    del self._entries[key]
+                    item = None
+                results.append(dict(item[1]) if item is not None else None)
+        return results
+
+    def _store(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, dict(entry))
+
+    def _delete_many(self, keys: List[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def _count(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self._hits += hits
+            self._misses += misses
+
+    def _counters(self) -> Tuple[int, int]:
+        return self._hits, self._misses
+
+
+class RedisResultCache(ResultCache):
+    """
+    Redis 結果緩存
+
+    - {prefix}:result:{key}         條目 JSON，帶 TTL
+    - {prefix}:result_cache:hits    命中計數
+    - {prefix}:result_cache:misses  未命中計數
+    """
+
+    def __init__(self, client, download_dir: str, ttl: int, prefix: str = "ytdl"):
+        super().__init__(download_dir, ttl)
+        self.redis = client
+        self.prefix = prefix
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.prefix}:result:{key}"
+
+    def _load_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        raw = self.redis.mget([self._entry_key(k) for k in keys])
+        return [json.loads(v) if v is not None else None for v in raw]
+
+    def _store(self, key: str, entry: Dict[str, Any]) -> None:
+        self.redis.set(self._entry_key(key), json.dumps(entry, ensure_ascii=False), ex=self.ttl)
+
+    def _delete_many(self, keys: List[str]) -> None:
+        self.redis.delete(*[self._entry_key(k) for k in keys])
+
+    def _count(self, hits: int, misses: int) -> None:
+        pipe = self.redis.pipeline(transaction=False)
+        if hits:
+            pipe.incrby(f"{self.prefix}:result_cache:hits", hits)
+        if misses:
+            pipe.incrby(f"{self.prefix}:result_cache:misses", misses)
+        pipe.execute()
+
+    def _counters(self) -> Tuple[int, int]:
+        hits, misses = self.redis.mget(
+            f"{self.prefix}:result_cache:hits", f"{self.prefix}:result_cache:misses"
+        )
+        return int(hits or 0), int(misses or 0)
+
+
+_result_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    """返回進程內共享的結果緩存實例，後端與任務存儲一致"""
+    global _result_cache
+    if _result_cache is None:
+        if settings.TASK_STORE_BACKEND == "redis":
+            _result_cache = RedisResultCache(
+                get_redis_client(),
+                settings.DOWNLOAD_DIR,
+                settings.RESULT_CACHE_TTL,
+                prefix=settings.TASK_STORE_PREFIX,
+            )
+        else:
+            _result_cache = InMemoryResultCache(settings.DOWNLOAD_DIR, settings.RESULT_CACHE_TTL)
+    return _result_cache
@@ -0,0 +1,72 @@
+"""
+Celery 隊列路由
+
+下載任務在提交時按工作量分到不同隊列，每個隊列由獨立的 worker 池消費，
+長時間的高畫質下載不會阻塞短任務：
+
+- audio        音頻格式（只下載音軌，體量小）
+- video-short  預估工作量不超過 VIDEO_SHORT_MAX_SECONDS 的影片
+- video-long   其餘影片
+- transcode    轉碼（ffmpeg 後處理），CPU 密集，worker 併發數按核心數設置
+- metadata     元數據提取（yt-dlp extract_info），提取後再按時長路由下載；
+               播放列表展開與批次匯總也在此隊列
+
+預估工作量為 時長 × 畫質係數（以 720p 為 1，按像素數近似碼率）；
+時長未知時按畫質判斷，超過 1080p 視為長任務。
+
+優先級：API 的 priority 為 0-9，數值越大越優先；
+Redis broker 的優先級則是數值越小越優先，投遞時轉換。
+"""
+
+from typing import Any, Dict, Optional
+
+from core.config import settings
+from core.video import AUDIO_FORMATS, parse_quality
+
+AUDIO_QUEUE = "audio"
+VIDEO_SHORT_QUEUE = "video-short"
+VIDEO_LONG_QUEUE = "video-long"
+METADATA_QUEUE = "metadata"
+TRANSCODE_QUEUE = "transcode"
+DEFAULT_QUEUE = "celery"
+
+WORKLOAD_QUEUES = (AUDIO_QUEUE, VIDEO_SHORT_QUEUE, VIDEO_LONG_QUEUE, METADATA_QUEUE, TRANSCODE_QUEUE)
+
+DOWNLOAD_TASK_NAME = "download_youtube_video"
+METADATA_TASK_NAME = "fetch_video_metadata"
+PLAYLIST_TASK_NAME = "expand_playlist"
+PLAYLIST_BATCH_TASK_NAME = "playlist_batch_done"
+TRANSCODE_TASK_NAME = "transcode_media"
+
+MAX_PRIORITY = 9
+DEFAULT_PRIORITY = 5
+
+
+def classify_download(format: str, quality: Optional[str], duration: Optional[float] = None) -> str:
+    """返回下載任務應進入的隊列"""
+    if (format or "").lower() in AUDIO_FORMATS:
+        return AUDIO_QUEUE
+    height = parse_quality(quality) or 720
+    if duration is None:
+        return VIDEO_LONG_QUEUE if height > 1080 else VIDEO_SHORT_QUEUE
+    weight = max(1.0, (height / 720) ** 2)
+    return VIDEO_SHORT_QUEUE if duration * weight <= settings.VIDEO_SHORT_MAX_SECONDS else VIDEO_LONG_QUEUE
+
+
+def broker_priority(priority: Optional[int]) -> int:
+    """API 優先級（越大越優先）轉換為 Redis broker 優先級（越小越優先）"""
+    if priority is None:
+        priority = DEFAULT_PRIORITY
+    return MAX_PRIORITY - max(0, min(MAX_PRIORITY, priority))
+
+
+def route_task(name: str, args: Any, kwargs: Dict[str, Any], options: Dict[str, Any], task=None, **kw):
+    """celery_app 的 task_routes 路由函數；投遞時顯式指定的 queue 優先"""
+    if name == DOWNLOAD_TASK_NAME:
+        kwargs = kwargs or {}
+        return {"queue": classify_download(kwargs.get("format"), kwargs.get("quality"), kwargs.get("duration"))}
+    if name in (METADATA_TASK_NAME, PLAYLIST_TASK_NAME, PLAYLIST_BATCH_TASK_NAME):
+        return {"queue": METADATA_QUEUE}
+    if name == TRANSCODE_TASK_NAME:
+        return {"queue": TRANSCODE_QUEUE}
+    return None
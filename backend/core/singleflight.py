@@ -0,0 +1,184 @@
+"""
+進行中下載的去重（single-flight）
+
+同一 (影片 ID, 格式, 畫質) 在排隊或下載期間只允許一個下載任務，
+後續的 create_task 直接附加到該任務上，共享其進度與最終結果。
+
+以帶過期時間的租約實現：
+- 創建任務時以 SINGLEFLIGHT_QUEUED_TTL 取得租約（覆蓋排隊等待時間）
+- worker 開始下載後以 SINGLEFLIGHT_HEARTBEAT_TTL 定期續約，完成或失敗時釋放
+- worker 崩潰後租約在心跳週期內過期，新請求會重新發起下載
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core.config import settings
+from core.redis_client import get_redis_client
+
+
+class InFlightRegistry:
+    """進行中任務租約介面，租約值為持有者的下載任務 ID"""
+
+    def acquire_many(self, claims: List[Tuple[str, str]], ttl: int) -> List[str]:
+        """
+        嘗試為每個 (key, owner) 取得租約
+
+        返回每個鍵當前的持有者；等於傳入的 owner 表示取得成功。
+        """
+        raise NotImplementedError
+
+    def acquire(self, key: str, owner: str, ttl: int) -> str:
+        return self.acquire_many([(key, owner)], ttl)[0]
+
+    def replace(self, key: str, expected: Optional[str], owner: str, ttl: int) -> bool:
+        """持有者仍為 expected（None 表示無持有者）時改由 owner 持有"""
+        raise NotImplementedError
+
+    def renew(self, key: str, owner: str, ttl: int) -> bool:
+        """續約，租約已不屬於 owner 時返回 False"""
+        raise NotImplementedError
+
+    def release(self, key: str, owner: str) -> bool:
+        raise NotImplementedError
+
+    def owner(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+
+class InMemoryInFlightRegistry(InFlightRegistry):
+    """進程內租約表"""
+
+    def __init__(self):
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _current(self, key: str) -> Optional[str]:
+        lease = self._leases.get(key)
+        if lease is None:
+            return None
+        if lease[1] <= time.monotonic():
+            del self._leases[key]
+            return None
+        return lease[0]
+
+    def acquire_many(self, claims: List[Tuple[str, str]], ttl: int) -> List[str]:
+        owners = []
+        with self._lock:
+            for key, owner in claims:
+                current = self._current(key)
+                if current is None:
+                    self._leases[key] = (owner, time.monotonic() + ttl)
+                    current = owner
+                owners.append(current)
+        return owners
+
+    def replace(self, key: str, expected: Optional[str], owner: str, ttl: int) -> bool:
+        with self._lock:
+            if self._current(key) != (expected or None):
+                return False
+            self._leases[key] = (owner, time.monotonic() + ttl)
+            return True
+
+    def renew(self, key: str, owner: str, ttl: int) -> bool:
+        with self._lock:
+            if self._current(key) != owner:
+                return False
+            self._leases[key] = (owner, time.monotonic() + ttl)
+            return True
+
+    def release(self, key: str, owner: str) -> bool:
+        with self._lock:
+            if self._current(key) != owner:
+                return False
+            del self._leases[key]
+            return True
+
+    def owner(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._current(key)
+
+
+class RedisInFlightRegistry(InFlightRegistry):
+    """
+    Redis 租約表，鍵為 {prefix}:inflight:{key}
+
+    跨 API 進程與 worker 共享；比較後修改的操作以 Lua 腳本保證原子性。
+    """
+
+    RENEW_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('expire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    REPLACE_SCRIPT = """
+    local current = redis.call('get', KEYS[1])
+    if (current == false and ARGV[1] == '') or current == ARGV[1] then
+        redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, client, prefix: str = "ytdl"):
+        self.redis = client
+        self.prefix = prefix
+        self._renew = client.register_script(self.RENEW_SCRIPT)
+        self._release = client.register_script(self.RELEASE_SCRIPT)
+        self._replace = client.register_script(self.REPLACE_SCRIPT)
+
+    def _lease_key(self, key: str) -> str:
+        return f"{self.prefix}:inflight:{key}"
+
+    def acquire_many(self, claims: List[Tuple[str, str]], ttl: int) -> List[str]:
+        if not claims:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        for key, owner in claims:
+            pipe.set(self._lease_key(key), owner, nx=True, ex=ttl)
+        acquired = pipe.execute()
+
+        lost = [i for i, ok in enumerate(acquired) if not ok]
+        owners = [owner for _, owner in claims]
+        if lost:
+            current = self.redis.mget([self._lease_key(claims[i][0]) for i in lost])
+            for i, value in zip(lost, current):
+                # 租約恰好在兩次往返之間過期時視為無人持有，由調用方決定是否接管
+                owners[i] = value if value is not None else ""
+        return owners
+
+    def replace(self, key: str, expected: Optional[str], owner: str, ttl: int) -> bool:
+        return bool(self._replace(keys=[self._lease_key(key)], args=[expected or "", owner, ttl]))
+
+    def renew(self, key: str, owner: str, ttl: int) -> bool:
+        return bool(self._renew(keys=[self._lease_key(key)], args=[owner, ttl]))
+
+    def release(self, key: str, owner: str) -> bool:
+        return bool(self._release(keys=[self._lease_key(key)], args=[owner]))
+
+    def owner(self, key: str) -> Optional[str]:
+        return self.redis.get(self._lease_key(key))
+
+
+_registry: Optional[InFlightRegistry] = None
+
+
+def get_inflight_registry() -> InFlightRegistry:
+    """返回進程內共享的租約表實例，後端與任務存儲一致"""
+    global _registry
+    if _registry is None:
+        if settings.TASK_STORE_BACKEND == "redis":
+            _registry = RedisInFlightRegistry(get_redis_client(), prefix=settings.TASK_STORE_PREFIX)
+        else:
+            _registry = InMemoryInFlightRegistry()
+    return _registry
@@ -0,0 +1,376 @@
+"""
+下載目錄配額管理
+
+以文件索引（core/file_index.py）中的大小總和與 LRU 順序管理 downloads/ 的空間，不需要遍歷目錄：
+- 配額為 STORAGE_QUOTA_BYTES；為 0 時以下載目錄所在文件系統的容量與已用空間計算
+- 已用 + 預留超過高水位（STORAGE_HIGH_WATERMARK）時，按最近訪問時間從舊到新
+  淘汰未固定的文件，直到降到低水位（STORAGE_LOW_WATERMARK），並刪除對應的結果緩存；
+  超出的部分大於已索引文件的總大小時（磁盤被下載目錄以外的數據佔滿），淘汰也無濟於事，不刪除文件
+- 下載開始前按估計大小預留空間；預留不足時先同步淘汰，仍不足則拒絕（任務稍後重試）
+- 後台線程每 STORAGE_CHECK_INTERVAL 秒檢查一次水位，淘汰在 Redis 後端下以鎖保證同時只有一個進程執行
+
+預留按持有者（下載任務 ID）記錄並帶過期時間，worker 崩潰後不會永久佔用配額。
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.checkpoint import is_partial_file
+from core.config import settings
+from core.file_index import FileIndex, get_file_index
+from core.redis_client import get_redis_client
+from core.result_cache import ResultCache, get_result_cache
+from core.video import AUDIO_FORMATS, parse_quality
+
+logger = logging.getLogger(__name__)
+
+# 每次從 LRU 順序中取出的候選文件數
+EVICTION_BATCH = 50
+
+
+class InsufficientStorage(Exception):
+    """淘汰後仍無法預留所需空間"""
+
+
+def estimate_download_size(info: Optional[Dict[str, Any]], format: str, quality: Optional[str]) -> int:
+    """
+    按元數據估計下載大小（字節）
+
+    取畫質限制內最大的視頻流加最大的音頻流，沒有大小時以碼率 × 時長估算；
+    無法估計時返回 STORAGE_DEFAULT_RESERVATION。
+    """
+    if not info:
+        return settings.STORAGE_DEFAULT_RESERVATION
+    height = parse_quality(quality)
+    duration = info.get("duration") or 0
+
+    def size(f: Dict[str, Any]) -> float:
+        if f.get("filesize") or f.get("filesize_approx"):
+            return f.get("filesize") or f.get("filesize_approx")
+        return (f.get("tbr") or 0) * 1000 / 8 * duration
+
+    formats = info.get("formats") or []
+    audio = [size(f) for f in formats if f.get("vcodec") == "none"]
+    video = [
+        size(f) for f in formats
+        if f.get("vcodec") != "none" and (height is None or (f.get("height") or 0) <= height)
+    ]
+    total = max(audio, default=0)
+    if (format or "").lower() not in AUDIO_FORMATS:
+        total += max(video, default=0)
+    # 留出合併與容器開銷的餘量
+    return int(total * 1.1) if total else settings.STORAGE_DEFAULT_RESERVATION
+
+
+class StorageManager:
+    """配額管理介面，子類實現預留記錄與淘汰鎖"""
+
+    def __init__(
+        self,
+        index: FileIndex,
+        cache: Optional[ResultCache],
+        quota: int,
+        high_watermark: float,
+        low_watermark: float,
+        reservation_ttl: int,
+    ):
+        self.index = index
+        self.cache = cache
+        self.download_dir = index.download_dir
+        self.quota = quota
+        self.high_watermark = high_watermark
+        self.low_watermark = min(low_watermark, high_watermark)
+        self.reservation_ttl = reservation_ttl
+        self._counters = {"evicted_files": 0, "evicted_bytes": 0, "rejected": 0}
+        self._counter_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def usage(self) -> Tuple[int, int]:
+        """返回 (已用字節, 容量)"""
+        if self.quota:
+            return self.index.total_bytes(), self.quota
+        disk = shutil.disk_usage(self.download_dir)
+        return disk.used, disk.total
+
+    def stats(self) -> Dict[str, Any]:
+        used, capacity = self.usage()
+        reserved = self.reserved_bytes()
+        with self._counter_lock:
+            counters = dict(self._counters)
+        return dict(
+            counters,
+            capacity=capacity,
+            used=used,
+            reserved=reserved,
+            indexed=self.index.total_bytes(),
+            high_watermark=int(capacity * self.high_watermark),
+            low_watermark=int(capacity * self.low_watermark),
+        )
+
+    def reserve(self, owner: str, nbytes: int) -> None:
+        """
+        為 owner 預留 nbytes
+
+        預留後超過高水位時先淘汰到低水位；超過容量則拋出 InsufficientStorage。
+        檢查與記錄不是原子的，多個 worker 同時預留時可能略超過高水位，由後台淘汰收斂。
+        """
+        used, capacity = self.usage()
+        reserved = self.reserved_bytes(exclude=owner)
+        if reserved + nbytes > capacity:
+            # 清空下載目錄也放不下，不做無謂的淘汰
+            self._reject(nbytes, used, reserved, capacity)
+        if used + reserved + nbytes > capacity * self.high_watermark:
+            self.enforce(extra=nbytes)
+            used, capacity = self.usage()
+            reserved = self.reserved_bytes(exclude=owner)
+        if used + reserved + nbytes > capacity:
+            self._reject(nbytes, used, reserved, capacity)
+        self._store_reservation(owner, nbytes, time.time() + self.reservation_ttl)
+
+    def _reject(self, nbytes: int, used: int, reserved: int, capacity: int) -> None:
+        with self._counter_lock:
+            self._counters["rejected"] += 1
+        raise InsufficientStorage(
+            f"存儲空間不足：需要 {nbytes} 字節，已用 {used}，已預留 {reserved}，容量 {capacity}"
+        )
+
+    def release(self, owner: str) -> None:
+        self._delete_reservation(owner)
+
+    def reserved_bytes(self, exclude: Optional[str] = None) -> int:
+        now = time.time()
+        return sum(
+            nbytes for owner, (nbytes, expires) in self._load_reservations().items()
+            if expires > now and owner != exclude
+        )
+
+    def touch(self, filename: str, entry: Optional[Dict[str, Any]] = None) -> None:
+        """記錄文件被訪問；距上次記錄不足 STORAGE_TOUCH_INTERVAL 秒時跳過寫入"""
+        now = time.time()
+        if entry is not None and now - (entry.get("atime") or 0) < settings.STORAGE_TOUCH_INTERVAL:
+            return
+        self.index.touch(filename, now)
+
+    def enforce(self, extra: int = 0) -> Dict[str, int]:
+        """已用 + 預留 + extra 超過高水位時淘汰到低水位，返回本次淘汰的文件數與字節數"""
+        used, capacity = self.usage()
+        if used + self.reserved_bytes() + extra <= capacity * self.high_watermark:
+            return {"files": 0, "bytes": 0}
+        if not self._acquire_eviction_lock():
+            return {"files": 0, "bytes": 0}
+        try:
+            return self._evict_to(capacity * self.low_watermark - extra)
+        finally:
+            self._release_eviction_lock()
+
+    def _evict_to(self, target: float) -> Dict[str, int]:
+        files = freed = 0
+        while True:
+            used, _ = self.usage()
+            excess = used + self.reserved_bytes() - target
+            if excess <= 0:
+                break
+            indexed = self.index.total_bytes()
+            if excess > indexed:
+                # 刪除全部下載文件也降不到低水位，不為此清空下載目錄
+                if self.quota:
+                    logger.warning("預留空間超過低水位，淘汰無法釋放足夠空間（超出 %d 字節，已索引 %d 字節）",
+                                   excess, indexed)
+                else:
+                    logger.warning("磁盤空間被下載目錄以外的數據佔用，淘汰下載文件無法降到低水位"
+                                   "（超出 %d 字節，已索引 %d 字節）", excess, indexed)
+                break
+            candidates = self.index.least_recent(EVICTION_BATCH)
+            if not candidates:
+                logger.warning("已無可淘汰的文件，下載目錄仍超過低水位")
+                break
+            released = 0
+            for filename, entry in candidates:
+                released += self._evict_file(filename, entry)
+                files += 1
+                # 逐個按釋放的字節數判斷，每批之後重新讀取已用空間
+                if released >= excess:
+                    break
+            freed += released
+        with self._counter_lock:
+            self._counters["evicted_files"] += files
+            self._counters["evicted_bytes"] += freed
+        if files:
+            logger.info("淘汰 %d 個文件，釋放 %d 字節", files, freed)
+        return {"files": files, "bytes": freed}
+
+    def _evict_file(self, filename: str, entry: Dict[str, Any]) -> int:
+        try:
+            os.remove(os.path.join(self.download_dir, filename))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("刪除文件失敗 %s: %s", filename, e)
+        self.index.delete(filename)
+        if self.cache is not None and entry.get("cache_key"):
+            self.cache.evict(entry["cache_key"])
+        return entry.get("size") or 0
+
+    def reconcile(self) -> int:
+        """
+        登記尚未索引的已完成文件（升級前已存在的下載等），返回登記數
+
+        只在啟動時遍歷一次目錄，請求路徑不遍歷。
+        """
+        registered = 0
+        try:
+            with os.scandir(self.download_dir) as entries:
+                for item in entries:
+                    if item.name.startswith(".") or is_partial_file(item.name) or not item.is_file():
+                        continue
+                    if self.index.register(item.name, item.stat()):
+                        registered += 1
+        except FileNotFoundError:
+            return 0
+        if registered:
+            logger.info("登記了 %d 個未索引的下載文件", registered)
+        return registered
+
+    def start(self, interval: float) -> None:
+        """啟動後台水位檢查線程（先登記未索引的文件）"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="storage-manager", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self, interval: float) -> None:
+        try:
+            self.reconcile()
+        except Exception as e:
+            logger.warning("登記下載文件失敗: %s", e)
+        while not self._stop.is_set():
+            try:
+                self.enforce()
+            except Exception as e:
+                logger.warning("存儲水位檢查失敗: %s", e)
+            self._stop.wait(interval)
+
+    def _load_reservations(self) -> Dict[str, Tuple[int, float]]:
+        raise NotImplementedError
+
+    def _store_reservation(self, owner: str, nbytes: int, expires: float) -> None:
+        raise NotImplementedError
+
+    def _delete_reservation(self, owner: str) -> None:
+        raise NotImplementedError
+
+    def _acquire_eviction_lock(self) -> bool:
+        raise NotImplementedError
+
+    def _release_eviction_lock(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryStorageManager(StorageManager):
+    """進程內預留記錄"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reservations: Dict[str, Tuple[int, float]] = {}
+        self._reservation_lock = threading.Lock()
+        self._eviction_lock = threading.Lock()
+
+    def _load_reservations(self) -> Dict[str, Tuple[int, float]]:
+        with self._reservation_lock:
+            return dict(self._reservations)
+
+    def _store_reservation(self, owner: str, nbytes: int, expires: float) -> None:
+        with self._reservation_lock:
+            self._reservations[owner] = (nbytes, expires)
+
+    def _delete_reservation(self, owner: str) -> None:
+        with self._reservation_lock:
+            self._reservations.pop(owner, None)
+
+    def _acquire_eviction_lock(self) -> bool:
+        return self._eviction_lock.acquire(blocking=False)
+
+    def _release_eviction_lock(self) -> None:
+        self._eviction_lock.release()
+
+
+class RedisStorageManager(StorageManager):
+    """
+    Redis 預留記錄
+
+    - {prefix}:storage:reservations   hash，持有者 -> "字節數:過期時間"
+    - {prefix}:storage:evict-lock     淘汰鎖，帶過期時間防止持有進程崩潰後死鎖
+    """
+
+    LOCK_TTL = 300
+
+    def __init__(self, client, *args, prefix: str = "ytdl", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.redis = client
+        self.prefix = prefix
+        self._lock_token = f"{os.getpid()}-{id(self)}"
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}:storage:{name}"
+
+    def _load_reservations(self) -> Dict[str, Tuple[int, float]]:
+        reservations: Dict[str, Tuple[int, float]] = {}
+        expired: List[str] = []
+        now = time.time()
+        for owner, value in self.redis.hgetall(self._key("reservations")).items():
+            nbytes, _, expires = value.partition(":")
+            if float(expires or 0) <= now:
+                expired.append(owner)
+                continue
+            reservations[owner] = (int(nbytes), float(expires))
+        if expired:
+            self.redis.hdel(self._key("reservations"), *expired)
+        return reservations
+
+    def _store_reservation(self, owner: str, nbytes: int, expires: float) -> None:
+        self.redis.hset(self._key("reservations"), owner, f"{nbytes}:{expires}")
+
+    def _delete_reservation(self, owner: str) -> None:
+        self.redis.hdel(self._key("reservations"), owner)
+
+    def _acquire_eviction_lock(self) -> bool:
+        return bool(self.redis.set(self._key("evict-lock"), self._lock_token, nx=True, ex=self.LOCK_TTL))
+
+    def _release_eviction_lock(self) -> None:
+        if self.redis.get(self._key("evict-lock")) == self._lock_token:
+            self.redis.delete(self._key("evict-lock"))
+
+
+_storage_manager: Optional[StorageManager] = None
+
+
+def get_storage_manager() -> StorageManager:
+    """返回進程內共享的配額管理器，後端與任務存儲一致"""
+    global _storage_manager
+    if _storage_manager is None:
+        options = dict(
+            quota=settings.STORAGE_QUOTA_BYTES,
+            high_watermark=settings.STORAGE_HIGH_WATERMARK,
+            low_watermark=settings.STORAGE_LOW_WATERMARK,
+            reservation_ttl=settings.STORAGE_RESERVATION_TTL,
+        )
+        if settings.TASK_STORE_BACKEND == "redis":
+            _storage_manager = RedisStorageManager(
+                get_redis_client(), get_file_index(), get_result_cache(),
+                prefix=settings.TASK_STORE_PREFIX, **options
+            )
+        else:
+            _storage_manager = InMemoryStorageManager(get_file_index(), get_result_cache(), **options)
+    return _storage_manager
@@ -0,0 +1,190 @@
+"""
+下載請求提交
+
+API（單個 / 批量創建）與播放列表展開任務共用的提交流程：
+查元數據緩存與結果緩存、進行中去重、寫入任務存儲並投遞 Celery 任務。
+"""
+
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from core.config import settings
+from core.dispatch import dispatch_downloads
+from core.metadata_cache import MetadataCache
+from core.result_cache import ResultCache
+from core.routing import DEFAULT_PRIORITY, MAX_PRIORITY
+from core.singleflight import InFlightRegistry
+from core.task_store import TaskStore
+from core.video import extract_video_id, result_key
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadRequest(BaseModel):
+    url: str
+    format: Optional[str] = "mp4"
+    quality: Optional[str] = "720p"
+    # 0-9，數值越大越優先，對應 broker 的消息優先級
+    priority: int = Field(DEFAULT_PRIORITY, ge=0, le=MAX_PRIORITY)
+
+
+class DownloadTask(BaseModel):
+    id: str
+    url: str
+    format: str
+    quality: str
+    status: str
+    created_at: str
+    progress: Optional[int] = 0
+    download_url: Optional[str] = None
+    priority: int = DEFAULT_PRIORITY
+    # 當前階段（downloading / transcoding）與各階段耗時（秒）
+    stage: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None
+
+
+# 仍可附加的任務狀態
+INFLIGHT_STATUSES = ("queued", "processing")
+
+
+def new_task(request: DownloadRequest, **overrides: Any) -> DownloadTask:
+    """根據請求構建任務記錄，默認為排隊狀態"""
+    fields = dict(
+        id=str(uuid.uuid4())[:8],
+        url=request.url,
+        format=request.format,
+        quality=request.quality,
+        priority=request.priority,
+        status="queued",
+        created_at=datetime.now().isoformat()
+    )
+    fields.update(overrides)
+    return DownloadTask(**fields)
+
+
+def request_result_key(request: DownloadRequest) -> Optional[str]:
+    """請求對應的結果緩存鍵，非 YouTube 影片 URL 返回 None"""
+    video_id = extract_video_id(request.url)
+    if video_id is None:
+        return None
+    return result_key(video_id, request.format, request.quality)
+
+
+def completed_from_cache(request: DownloadRequest, entry: Dict[str, Any]) -> DownloadTask:
+    """以緩存中的下載結果直接構建已完成的任務"""
+    return new_task(request, status="completed", progress=100, download_url=entry["download_url"])
+
+
+def fail_dispatch(records: List[Dict[str, Any]], store: TaskStore, registry: InFlightRegistry) -> None:
+    """投遞失敗時標記任務失敗並釋放其去重租約"""
+    for record in records:
+        store.update(record["id"], status="failed")
+        if record.get("lease_key"):
+            registry.release(record["lease_key"], record["id"])
+
+
+def submit_downloads(
+    requests: List[DownloadRequest],
+    store: TaskStore,
+    cache: ResultCache,
+    registry: InFlightRegistry,
+    metadata: MetadataCache,
+    durations: Optional[List[Optional[float]]] = None,
+    dispatch: Callable[[List[Dict[str, Any]]], None] = dispatch_downloads,
+) -> List[Tuple[Optional[DownloadTask], Optional[str]]]:
+    """
+    為一批請求分配任務，返回每個請求的 (任務, 錯誤)
+
+    1. 元數據緩存記錄影片不可用：不創建任務，返回 (None, 原因)
+    2. 結果緩存命中：直接返回已完成的任務
+    3. 相同內容已有排隊或下載中的任務：附加到該任務，共享進度與結果
+    4. 其餘創建新任務，一次寫入存儲並一次投遞
+
+    durations 為已知的影片時長（例如播放列表的平鋪條目），用於路由並跳過 metadata 隊列；
+    dispatch 接收新建的任務記錄並投遞，默認以一個 group 投遞。
+    """
+    # 只查緩存不提取，避免在提交路徑上調用 yt-dlp
+    entries = metadata.peek_many([r.url for r in requests])
+    unavailable = {
+        i: entry["error"]
+        for i, entry in enumerate(entries)
+        if entry is not None and "error" in entry
+    }
+    if unavailable:
+        available = [i for i in range(len(requests)) if i not in unavailable]
+        submitted = iter(submit_downloads(
+            [requests[i] for i in available], store, cache, registry, metadata,
+            durations=[durations[i] for i in available] if durations else None,
+            dispatch=dispatch,
+        ))
+        return [
+            (None, f"影片不可用: {unavailable[i]}") if i in unavailable else next(submitted)
+            for i in range(len(requests))
+        ]
+
+    keys = [request_result_key(r) for r in requests]
+    cache_keys = [key for key in keys if key]
+    cached = dict(zip(cache_keys, cache.get_many(cache_keys)))
+
+    tasks: List[DownloadTask] = []
+    records: List[Dict[str, Any]] = []
+    pending: List[int] = []
+    claims: List[int] = []
+    for i, (request, key) in enumerate(zip(requests, keys)):
+        entry = cached.get(key) if key else None
+        if entry is not None:
+            tasks.append(completed_from_cache(request, entry))
+            records.append(tasks[i].model_dump())
+            continue
+        tasks.append(new_task(request))
+        (claims if key else pending).append(i)
+
+    ttl = settings.SINGLEFLIGHT_QUEUED_TTL
+    owners = registry.acquire_many([(keys[i], tasks[i].id) for i in claims], ttl)
+    leaders: Dict[str, DownloadTask] = {}
+    for i, owner in zip(claims, owners):
+        if owner == tasks[i].id:
+            leaders[owner] = tasks[i]
+            pending.append(i)
+            continue
+        if owner in leaders:
+            tasks[i] = leaders[owner]
+            continue
+        existing = store.get(owner) if owner else None
+        if existing is not None and existing.get("status") in INFLIGHT_STATUSES:
+            tasks[i] = DownloadTask(**existing)
+            continue
+        # 租約持有者已結束或被刪除：接管租約；併發接管失敗時仍照常下載
+        if registry.replace(keys[i], owner, tasks[i].id, ttl):
+            leaders[tasks[i].id] = tasks[i]
+        pending.append(i)
+
+    new_records = []
+    for i in pending:
+        record = tasks[i].model_dump()
+        if tasks[i].id in leaders:
+            record["lease_key"] = keys[i]
+        # 已緩存元數據時記錄時長，用於隊列路由；沒有該欄位的任務先經 metadata 隊列提取
+        if entries[i] is not None:
+            record["duration"] = entries[i]["info"].get("duration")
+        elif durations and durations[i] is not None:
+            record["duration"] = durations[i]
+        new_records.append(record)
+
+    store.create_many(records + new_records)
+    errors: Dict[str, str] = {}
+    try:
+        dispatch(new_records)
+    except Exception as e:
+        logger.error("投遞下載任務失敗: %s", e)
+        fail_dispatch(new_records, store, registry)
+        for record in new_records:
+            errors[record["id"]] = "任務佇列暫時不可用"
+        for i in pending:
+            tasks[i].status = "failed"
+
+    return [(task, errors.get(task.id)) for task in tasks]
@@ -0,0 +1,213 @@
+"""
+任務歷史寫入（write-behind）
+
+任務存儲的每次寫入都會記錄到進程內的待寫緩衝區，同一任務的多次更新合併為一行，
+後台線程每 TASK_HISTORY_FLUSH_INTERVAL 秒（或累積 TASK_HISTORY_BATCH_SIZE 個任務時）
+以一次 SELECT + 批量 INSERT / UPDATE + 一次提交寫入 download_tasks 表。
+進度事件因此不會各自產生一次提交，一個下載任務通常只寫入兩三次。
+
+API 進程寫入任務的創建，worker 寫入之後的狀態變化，兩者的刷新順序不確定：
+- worker 先刷新時以狀態變化插入該行，API 隨後只補齊靜態欄位（url、created_at 等），
+  不會把 status / progress 倒退回排隊狀態
+- 兩個進程同時插入同一行時主鍵衝突，回滾後重新按已存在處理
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from core.config import settings
+from core.events import TERMINAL_STATUSES
+from core.video import extract_video_id
+from db.base import SessionLocal
+from models import DownloadTaskRecord
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = frozenset(column.name for column in DownloadTaskRecord.__table__.columns)
+
+# 隨任務進展變化的欄位：創建記錄中的這些欄位不覆蓋已存在的行
+TRANSITION_FIELDS = frozenset({"status", "stage", "progress", "download_url", "size", "error", "timings",
+                               "updated_at", "completed_at"})
+
+# (欄位, 來自創建記錄的欄位)
+PendingEntry = Tuple[Dict[str, Any], Set[str]]
+
+
+def history_fields(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """把任務存儲的欄位轉換為 download_tasks 的列，忽略表中沒有的欄位"""
+    row = {key: value for key, value in fields.items() if key in COLUMNS and key != "id"}
+    if isinstance(row.get("created_at"), str):
+        row["created_at"] = datetime.fromisoformat(row["created_at"])
+    if row.get("url"):
+        row["video_id"] = extract_video_id(row["url"])
+    if not row:
+        return row
+    row["updated_at"] = datetime.now()
+    if row.get("status") in TERMINAL_STATUSES:
+        row["completed_at"] = row["updated_at"]
+    return row
+
+
+class TaskHistoryWriter:
+    """按任務合併狀態變化並在後台批量寫入數據庫"""
+
+    def __init__(self, session_factory, flush_interval: float, batch_size: int, max_pending: int):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, PendingEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._counters = {"rows": 0, "flushes": 0, "failures": 0, "dropped": 0}
+
+    def record(self, task_id: str, fields: Dict[str, Any], initial: bool = False) -> None:
+        """記錄一次任務寫入；initial 表示任務的創建記錄"""
+        row = history_fields(fields)
+        if not row:
+            return
+        self._ensure_started()
+        with self._lock:
+            self._merge(task_id, row, set(row) if initial else set())
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+
+    def record_many(self, tasks: Iterable[Dict[str, Any]]) -> None:
+        for task in tasks:
+            self.record(task["id"], task, initial=True)
+
+    def _merge(self, task_id: str, row: Dict[str, Any], initial: Set[str]) -> None:
+        fields, previous_initial = self._pending.pop(task_id, ({}, set()))
+        fields.update(row)
+        self._pending[task_id] = (fields, (previous_initial - set(row)) | initial)
+        # 數據庫長時間不可用時丟棄最舊的記錄，避免緩衝區無限增長
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self._counters["dropped"] += 1
+
+    def flush(self) -> int:
+        """寫入所有待寫記錄，返回寫入的任務數；失敗的批次放回緩衝區等待下次刷新"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, OrderedDict()
+            written = 0
+            items = list(pending.items())
+            for start in range(0, len(items), self.batch_size):
+                batch = OrderedDict(items[start:start + self.batch_size])
+                try:
+                    self._write(batch)
+                    written += len(batch)
+                except SQLAlchemyError as e:
+                    logger.warning("寫入任務歷史失敗（%d 個任務稍後重試）: %s", len(items) - start, e)
+                    self._counters["failures"] += 1
+                    self._requeue(OrderedDict(items[start:]))
+                    break
+            if written:
+                self._counters["rows"] += written
+                self._counters["flushes"] += 1
+            return written
+
+    def _requeue(self, failed: "OrderedDict[str, PendingEntry]") -> None:
+        with self._lock:
+            newer, self._pending = self._pending, OrderedDict()
+            for task_id, (fields, initial) in failed.items():
+                self._merge(task_id, fields, initial)
+            for task_id, (fields, initial) in newer.items():
+                self._merge(task_id, fields, initial)
+
+    def _write(self, batch: "OrderedDict[str, PendingEntry]") -> None:
+        # 併發插入同一行時主鍵衝突，第二次嘗試會把該行當作已存在
+        for attempt in range(2):
+            session = self.session_factory()
+            try:
+                existing = {
+                    task_id for (task_id,) in
+                    session.query(DownloadTaskRecord.id).filter(DownloadTaskRecord.id.in_(list(batch)))
+                }
+                inserts: List[Dict[str, Any]] = []
+                updates: List[Dict[str, Any]] = []
+                for task_id, (fields, initial) in batch.items():
+                    if task_id in existing:
+                        row = {k: v for k, v in fields.items() if k not in initial or k not in TRANSITION_FIELDS}
+                        if row:
+                            updates.append(dict(row, id=task_id))
+                        continue
+                    row = dict(fields, id=task_id)
+                    row.setdefault("kind", "download")
+                    row.setdefault("status", "queued")
+                    row.setdefault("created_at", row["updated_at"])
+                    inserts.append(row)
+                session.bulk_insert_mappings(DownloadTaskRecord, inserts)
+                session.bulk_update_mappings(DownloadTaskRecord, updates)
+                session.commit()
+                return
+            except IntegrityError:
+                session.rollback()
+                if attempt:
+                    raise
+            finally:
+                session.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, pending=len(self._pending))
+
+    def _ensure_started(self) -> None:
+        # prefork worker 中父進程的線程不會隨 fork 複製，在子進程第一次寫入時重新啟動
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pending.clear()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="task-history", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """停止後台線程並寫入剩餘記錄"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=10)
+        self._thread = None
+        self._pid = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("任務歷史刷新失敗: %s", e)
+
+
+_task_history: Optional[TaskHistoryWriter] = None
+
+
+def get_task_history() -> TaskHistoryWriter:
+    """返回進程內共享的任務歷史寫入器"""
+    global _task_history
+    if _task_history is None:
+        _task_history = TaskHistoryWriter(
+            SessionLocal,
+            flush_interval=settings.TASK_HISTORY_FLUSH_INTERVAL,
+            batch_size=settings.TASK_HISTORY_BATCH_SIZE,
+            max_pending=settings.TASK_HISTORY_MAX_PENDING,
+        )
+    return _task_history
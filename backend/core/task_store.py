@@ -0,0 +1,497 @@
+"""
+下載任務存儲層
+
+API 進程與 Celery worker 透過同一個 TaskStore 介面讀寫任務記錄：
+- InMemoryTaskStore: 進程內存儲，適合單 worker 開發環境與測試
+- RedisTaskStore: 每個任務一個 hash，並以 sorted set 建立
+  created_at / status / format / status+format 二級索引，多個 uvicorn worker 共享同一份數據
+
+所有索引都以 (created_at 分數, task_id) 排序，list_page 據此做 keyset 分頁；
+同時按狀態與格式過濾時直接讀取組合索引，每頁的開銷不隨被過濾掉的任務數增長。
+"""
+
+import bisect
+import json
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from redis.exceptions import WatchError
+
+from core.config import settings
+from core.redis_client import get_redis_client
+
+# keyset 分頁位置: (created_at 分數, task_id)
+PageKey = Tuple[float, str]
+
+
+def created_score(task: Dict[str, Any]) -> float:
+    """將任務的 created_at 轉換為排序分數（Unix 時間戳）"""
+    return datetime.fromisoformat(task["created_at"]).timestamp()
+
+
+class TaskStore:
+    """任務存儲介面"""
+
+    def create(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def create_many(self, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量寫入任務，實現應盡量在一次存儲往返內完成"""
+        return [self.create(task) for task in tasks]
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def get_many(self, task_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """按順序返回多個任務，不存在的位置為 None"""
+        return [self.get(task_id) for task_id in task_ids]
+
+    def update(self, task_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        """更新任務欄位，任務不存在時返回 None"""
+        raise NotImplementedError
+
+    def increment(self, task_id: str, **deltas: int) -> Optional[Dict[str, Any]]:
+        """原子地累加整數欄位（多個 worker 併發匯總計數），返回更新後的任務"""
+        raise NotImplementedError
+
+    def delete(self, task_id: str) -> bool:
+        raise NotImplementedError
+
+    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按 created_at 升序返回任務"""
+        raise NotImplementedError
+
+    def list_page(
+        self,
+        limit: int,
+        after: Optional[PageKey] = None,
+        status: Optional[str] = None,
+        format: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[PageKey]]:
+        """
+        返回 after 之後的至多 limit 個任務，以及下一頁的起始位置
+
+        沒有更多數據時下一頁位置為 None。
+        """
+        raise NotImplementedError
+
+    def count(self, status: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+
+class InMemoryTaskStore(TaskStore):
+    """進程內任務存儲"""
+
+    def __init__(self):
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        # 索引名 -> 有序的 (created_at 分數, task_id) 列表
+        self._indexes: Dict[str, List[PageKey]] = {"created": []}
+        self._lock = threading.Lock()
+
+    def create(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._create_locked(task)
+        return task
+
+    def create_many(self, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            for task in tasks:
+                self._create_locked(task)
+        return tasks
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        task = self._tasks.get(task_id)
+        return dict(task) if task is not None else None
+
+    def update(self, task_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            new_status = fields.get("status")
+            if new_status is not None and new_status != task.get("status"):
+                key = (created_score(task), task_id)
+                format = task.get("format")
+                for name in (f"status:{task.get('status')}", f"status:{task.get('status')}:format:{format}"):
+                    self._index_discard(name, key)
+                for name in (f"status:{new_status}", f"status:{new_status}:format:{format}"):
+                    bisect.insort(self._indexes.setdefault(name, []), key)
+            task.update(fields)
+            return dict(task)
+
+    def increment(self, task_id: str, **deltas: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            for field, delta in deltas.items():
+                task[field] = (task.get(field) or 0) + delta
+            return dict(task)
+
+    def delete(self, task_id: str) -> bool:
+        with self._lock:
+            if task_id not in self._tasks:
+                return False
+            self._remove_locked(task_id)
+            return True
+
+    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            index = self._indexes.get(f"status:{status}" if status else "created", [])
+            return [dict(self._tasks[task_id]) for _, task_id in index]
+
+    def list_page(
+        self,
+        limit: int,
+        after: Optional[PageKey] = None,
+        status: Optional[str] = None,
+        format: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[PageKey]]:
+        with self._lock:
+            if status and format:
+                index = self._indexes.get(f"status:{status}:format:{format}", [])
+            elif status:
+                index = self._indexes.get(f"status:{status}", [])
+            elif format:
+                index = self._indexes.get(f"format:{format}", [])
+            else:
+                index = self._indexes["created"]
+
+            start = bisect.bisect_right(index, after) if after is not None else 0
+            items: List[Dict[str, Any]] = []
+            last_key: Optional[PageKey] = None
+            for pos in range(start, len(index)):
+                task = self._tasks[index[pos][1]]
+                if len(items) == limit:
+                    return items, last_key
+                items.append(dict(task))
+                last_key = index[pos]
+            return items, None
+
+    def count(self, status: Optional[str] = None) -> int:
+        if status is None:
+            return len(self._tasks)
+        return len(self._indexes.get(f"status:{status}", []))
+
+    @staticmethod
+    def _index_names(task: Dict[str, Any]) -> List[str]:
+        status, format = task.get("status"), task.get("format")
+        return ["created", f"status:{status}", f"format:{format}", f"status:{status}:format:{format}"]
+
+    def _index_discard(self, name: str, key: PageKey) -> None:
+        index = self._indexes.get(name)
+        if not index:
+            return
+        pos = bisect.bisect_left(index, key)
+        if pos < len(index) and index[pos] == key:
+            del index[pos]
+
+    def _create_locked(self, task: Dict[str, Any]) -> None:
+        if task["id"] in self._tasks:
+            self._remove_locked(task["id"])
+        self._tasks[task["id"]] = dict(task)
+        key = (created_score(task), task["id"])
+        for name in self._index_names(task):
+            bisect.insort(self._indexes.setdefault(name, []), key)
+
+    def _remove_locked(self, task_id: str) -> None:
+        task = self._tasks.pop(task_id)
+        key = (created_score(task), task_id)
+        for name in self._index_names(task):
+            self._index_discard(name, key)
+
+
+class RedisTaskStore(TaskStore):
+    """
+    Redis 任務存儲
+
+    鍵佈局（prefix 默認為 ytdl）:
+    - {prefix}:task:{id}               任務 hash，欄位值以 JSON 編碼
+    - {prefix}:tasks:created           zset，score 為 created_at
+    - {prefix}:tasks:status:{status}   zset，score 為 created_at
+    - {prefix}:tasks:format:{format}   zset，score 為 created_at
+    - {prefix}:tasks:status:{status}:format:{format}  zset，score 為 created_at（組合過濾）
+    """
+
+    # list_page 每次從索引讀取的成員數下限
+    PAGE_SCAN_BATCH = 100
+
+    def __init__(self, client, prefix: str = "ytdl"):
+        self.redis = client
+        self.prefix = prefix
+
+    def _task_key(self, task_id: str) -> str:
+        return f"{self.prefix}:task:{task_id}"
+
+    def _created_key(self) -> str:
+        return f"{self.prefix}:tasks:created"
+
+    def _status_key(self, status: str) -> str:
+        return f"{self.prefix}:tasks:status:{status}"
+
+    def _format_key(self, format: str) -> str:
+        return f"{self.prefix}:tasks:format:{format}"
+
+    def _status_format_key(self, status: str, format: str) -> str:
+        return f"{self.prefix}:tasks:status:{status}:format:{format}"
+
+    @staticmethod
+    def _encode(fields: Dict[str, Any]) -> Dict[str, str]:
+        return {k: json.dumps(v, ensure_ascii=False) for k, v in fields.items()}
+
+    @staticmethod
+    def _decode(raw: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        if not raw:
+            return None
+        return {k: json.loads(v) for k, v in raw.items()}
+
+    def create(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        pipe = self.redis.pipeline()
+        self._queue_create(pipe, task)
+        pipe.execute()
+        return task
+
+    def create_many(self, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not tasks:
+            return tasks
+        pipe = self.redis.pipeline()
+        for task in tasks:
+            self._queue_create(pipe, task)
+        pipe.execute()
+        return tasks
+
+    def _queue_create(self, pipe, task: Dict[str, Any]) -> None:
+        score = created_score(task)
+        pipe.delete(self._task_key(task["id"]))
+        pipe.hset(self._task_key(task["id"]), mapping=self._encode(task))
+        pipe.zadd(self._created_key(), {task["id"]: score})
+        pipe.zadd(self._status_key(task["status"]), {task["id"]: score})
+        pipe.zadd(self._format_key(task["format"]), {task["id"]: score})
+        pipe.zadd(self._status_format_key(task["status"], task["format"]), {task["id"]: score})
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return self._decode(self.redis.hgetall(self._task_key(task_id)))
+
+    def _transaction(self, task_id: str, queue: Callable[[Any, Dict[str, Any]], None]) -> Optional[List[Any]]:
+        """
+        WATCH 任務 hash 後讀取 status / format / created_at，由 queue 在 MULTI 中排隊寫入
+
+        讀取與寫入之間任務被其他客戶端修改或刪除時整體重試，索引與 hash 始終一致。
+        任務不存在時不寫入任何數據並返回 None，否則返回事務中各命令的結果。
+        """
+        key = self._task_key(task_id)
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.hmget(key, "status", "format", "created_at")
+                    if raw[2] is None:
+                        pipe.unwatch()
+                        return None
+                    current = dict(zip(("status", "format", "created_at"),
+                                       (json.loads(v) if v is not None else None for v in raw)))
+                    pipe.multi()
+                    queue(pipe, current)
+                    return pipe.execute()
+                except WatchError:
+                    continue
+
+    def update(self, task_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        key = self._task_key(task_id)
+
+        def queue(pipe, current: Dict[str, Any]) -> None:
+            if fields:
+                pipe.hset(key, mapping=self._encode(fields))
+            new_status = fields.get("status")
+            if new_status is not None and new_status != current["status"]:
+                score = created_score(current)
+                if current["status"] is not None:
+                    pipe.zrem(self._status_key(current["status"]), task_id)
+                    pipe.zrem(self._status_format_key(current["status"], current["format"]), task_id)
+                pipe.zadd(self._status_key(new_status), {task_id: score})
+                pipe.zadd(self._status_format_key(new_status, current["format"]), {task_id: score})
+            pipe.hgetall(key)
+
+        results = self._transaction(task_id, queue)
+        return self._decode(results[-1]) if results is not None else None
+
+    def get_many(self, task_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        return self._load_many(task_ids, keep_missing=True)
+
+    def increment(self, task_id: str, **deltas: int) -> Optional[Dict[str, Any]]:
+        # 整數的 JSON 編碼與 HINCRBY 使用的十進制字符串相同
+        key = self._task_key(task_id)
+
+        def queue(pipe, current: Dict[str, Any]) -> None:
+            for field, delta in deltas.items():
+                pipe.hincrby(key, field, delta)
+            pipe.hgetall(key)
+
+        results = self._transaction(task_id, queue)
+        return self._decode(results[-1]) if results is not None else None
+
+    def delete(self, task_id: str) -> bool:
+        def queue(pipe, current: Dict[str, Any]) -> None:
+            pipe.delete(self._task_key(task_id))
+            pipe.zrem(self._created_key(), task_id)
+            if current["status"] is not None:
+                pipe.zrem(self._status_key(current["status"]), task_id)
+                pipe.zrem(self._status_format_key(current["status"], current["format"]), task_id)
+            if current["format"] is not None:
+                pipe.zrem(self._format_key(current["format"]), task_id)
+
+        return self._transaction(task_id, queue) is not None
+
+    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        index_key = self._status_key(status) if status else self._created_key()
+        return self._load_many(self.redis.zrange(index_key, 0, -1))
+
+    def list_page(
+        self,
+        limit: int,
+        after: Optional[PageKey] = None,
+        status: Optional[str] = None,
+        format: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[PageKey]]:
+        if status and format:
+            index_key = self._status_format_key(status, format)
+        elif status:
+            index_key = self._status_key(status)
+        elif format:
+            index_key = self._format_key(format)
+        else:
+            index_key = self._created_key()
+
+        # 同分數成員按 task_id 字典序排列，與 (score, id) 的 keyset 順序一致
+        min_score = after[0] if after is not None else "-inf"
+        batch = max(limit + 1, self.PAGE_SCAN_BATCH)
+        offset = 0
+        items: List[Dict[str, Any]] = []
+        last_key: Optional[PageKey] = None
+
+        while True:
+            members = self.redis.zrangebyscore(
+                index_key, min_score, "+inf", start=offset, num=batch, withscores=True
+            )
+            offset += len(members)
+            keys = [
+                (score, task_id)
+                for task_id, score in members
+                if after is None or (score, task_id) > after
+            ]
+            for key, task in zip(keys, self._load_many([task_id for _, task_id in keys], keep_missing=True)):
+                if task is None:
+                    continue
+                if len(items) == limit:
+                    return items, last_key
+                items.append(task)
+                last_key = key
+            if len(members) < batch:
+                return items, None
+
+    def count(self, status: Optional[str] = None) -> int:
+        index_key = self._status_key(status) if status else self._created_key()
+        return self.redis.zcard(index_key)
+
+    def _load_many(self, task_ids: List[str], keep_missing: bool = False) -> List[Optional[Dict[str, Any]]]:
+        """一次往返批量讀取多個任務 hash"""
+        if not task_ids:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hgetall(self._task_key(task_id))
+        tasks = [self._decode(raw) for raw in pipe.execute()]
+        if keep_missing:
+            return tasks
+        return [task for task in tasks if task is not None]
+
+
+class HistoryRecordingTaskStore(TaskStore):
+    """
+    包裝任務存儲，把創建與更新同時記錄到任務歷史；讀取直接委託給被包裝的存儲
+
+    歷史寫入器（core.task_history，依賴 SQLAlchemy 與模型）在第一次寫入時才通過 history_factory 創建，
+    只讀取任務的進程不導入數據庫層。
+    """
+
+    def __init__(self, store: TaskStore, history_factory: Callable[[], Any]):
+        self.store = store
+        self._history_factory = history_factory
+        self._history = None
+
+    @property
+    def history(self):
+        if self._history is None:
+            self._history = self._history_factory()
+        return self._history
+
+    def create(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        result = self.store.create(task)
+        self.history.record(task["id"], task, initial=True)
+        return result
+
+    def create_many(self, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        result = self.store.create_many(tasks)
+        self.history.record_many(tasks)
+        return result
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(task_id)
+
+    def get_many(self, task_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        return self.store.get_many(task_ids)
+
+    def update(self, task_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        task = self.store.update(task_id, **fields)
+        if task is not None:
+            self.history.record(task_id, fields)
+        return task
+
+    def increment(self, task_id: str, **deltas: int) -> Optional[Dict[str, Any]]:
+        return self.store.increment(task_id, **deltas)
+
+    def delete(self, task_id: str) -> bool:
+        # 只從任務存儲中刪除，歷史保留
+        return self.store.delete(task_id)
+
+    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.store.list(status)
+
+    def list_page(
+        self,
+        limit: int,
+        after: Optional[PageKey] = None,
+        status: Optional[str] = None,
+        format: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[PageKey]]:
+        return self.store.list_page(limit, after=after, status=status, format=format)
+
+    def count(self, status: Optional[str] = None) -> int:
+        return self.store.count(status)
+
+
+def _load_task_history():
+    from core.task_history import get_task_history
+    return get_task_history()
+
+
+_task_store: Optional[TaskStore] = None
+
+
+def get_task_store() -> TaskStore:
+    """
+    返回進程內共享的任務存儲實例，亦可作為 FastAPI 依賴使用
+
+    TASK_HISTORY_ENABLED 時寫入同時批量記錄到數據庫的任務歷史（見 core/task_history.py）。
+    """
+    global _task_store
+    if _task_store is None:
+        if settings.TASK_STORE_BACKEND == "redis":
+            store: TaskStore = RedisTaskStore(get_redis_client(), prefix=settings.TASK_STORE_PREFIX)
+        else:
+            store = InMemoryTaskStore()
+        if settings.TASK_HISTORY_ENABLED:
+            store = HistoryRecordingTaskStore(store, _load_task_history)
+        _task_store = store
+    return _task_store
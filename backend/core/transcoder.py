@@ -0,0 +1,194 @@
+"""
+轉碼（後處理）階段
+
+下載階段只取得上游原有容器中的媒體流，目標格式不同時由 transcode 隊列的 worker 以 ffmpeg 轉換，
+CPU 密集的工作不佔用下載 worker 的網絡併發槽。
+
+目標容器能直接容納原始編碼時以 stream copy 重新封裝（只改容器，速度接近磁盤讀寫），
+否則只對不兼容的那一路流重新編碼，例如 h264 + aac 轉 avi 時視頻複製、音頻編碼為 mp3。
+"""
+
+import json
+import logging
+import os
+import subprocess
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 目標容器可直接複製的編碼（按 yt-dlp / ffprobe 編碼名的前綴匹配）；空元組表示不含該類流
+CONTAINER_CODECS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "mp4": (("avc1", "h264", "hev1", "hvc1", "hevc", "av01", "av1", "mp4v"), ("mp4a", "aac", "mp3", "opus", "ac-3", "ec-3")),
+    "webm": (("vp8", "vp9", "vp09", "av01", "av1"), ("opus", "vorbis")),
+    "mkv": (("avc1", "h264", "hev1", "hvc1", "hevc", "vp8", "vp9", "vp09", "av01", "av1"), ("mp4a", "aac", "mp3", "opus", "vorbis", "flac", "ac-3")),
+    "avi": (("avc1", "h264", "mp4v", "mpeg4"), ("mp3", "ac-3")),
+    "mp3": ((), ("mp3",)),
+    "m4a": ((), ("mp4a", "aac")),
+    "opus": ((), ("opus",)),
+    "wav": ((), ("pcm_s16le",)),
+}
+
+# 需要重新編碼時使用的編碼器（視頻, 音頻）
+ENCODERS: Dict[str, Tuple[Optional[str], str]] = {
+    "mp4": ("libx264", "aac"),
+    "webm": ("libvpx-vp9", "libopus"),
+    "mkv": ("libx264", "aac"),
+    "avi": ("mpeg4", "libmp3lame"),
+    "mp3": (None, "libmp3lame"),
+    "m4a": (None, "aac"),
+    "opus": (None, "libopus"),
+    "wav": (None, "pcm_s16le"),
+}
+
+# ffmpeg 輸出格式名（臨時文件的副檔名不能用來推斷格式）
+MUXERS = {"mp4": "mp4", "webm": "webm", "mkv": "matroska", "avi": "avi",
+          "mp3": "mp3", "m4a": "ipod", "opus": "opus", "wav": "wav"}
+
+# 轉碼計劃中每一路流的處理方式: "copy"、編碼器名稱，或 None（輸出不含該類流）
+TranscodePlan = Dict[str, Optional[str]]
+
+
+class TranscodeError(Exception):
+    """ffmpeg 不可用或轉換失敗"""
+
+
+def codec_family(codec: Optional[str]) -> Optional[str]:
+    """編碼名的族名，例如 avc1.64001f -> avc1；"none" 表示沒有該類流，返回空字符串"""
+    if not codec:
+        return None
+    codec = codec.lower()
+    return "" if codec == "none" else codec.split(".")[0]
+
+
+def needs_transcode(filename: str, format: str) -> bool:
+    """下載結果的容器與目標格式不同時需要後處理"""
+    return os.path.splitext(filename)[1].lstrip(".").lower() != format.lower()
+
+
+def _stream_action(codec: Optional[str], compatible: Tuple[str, ...], encoder: Optional[str]) -> Optional[str]:
+    if encoder is None or codec == "":
+        return None
+    if codec and codec.startswith(compatible):
+        return "copy"
+    return encoder
+
+
+def plan_transcode(format: str, vcodec: Optional[str], acodec: Optional[str]) -> TranscodePlan:
+    """
+    決定每一路流複製還是重新編碼
+
+    vcodec / acodec 為源文件的編碼，None 表示未知（按不兼容處理，重新編碼）。
+    """
+    format = format.lower()
+    if format not in CONTAINER_CODECS:
+        raise TranscodeError(f"不支持的目標格式: {format}")
+    video_codecs, audio_codecs = CONTAINER_CODECS[format]
+    video_encoder, audio_encoder = ENCODERS[format]
+    return {
+        "video": _stream_action(codec_family(vcodec), video_codecs, video_encoder),
+        "audio": _stream_action(codec_family(acodec), audio_codecs, audio_encoder),
+    }
+
+
+def is_stream_copy(plan: TranscodePlan) -> bool:
+    return all(action in ("copy", None) for action in plan.values())
+
+
+def probe_codecs(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """以 ffprobe 讀取文件的首個視頻與音頻編碼；不含的流為 "none"，無法探測時為 None"""
+    try:
+        output = subprocess.run(
+            [settings.FFPROBE_BINARY, "-v", "error", "-show_entries", "stream=codec_type,codec_name",
+             "-of", "json", path],
+            capture_output=True, check=True, timeout=60,
+        ).stdout
+        streams = json.loads(output).get("streams") or []
+    except (OSError, subprocess.SubprocessError, ValueError) as e:
+        logger.warning("ffprobe 探測失敗 %s: %s", path, e)
+        return None, None
+    codecs = {"video": "none", "audio": "none"}
+    for stream in streams:
+        if codecs.get(stream.get("codec_type")) == "none":
+            codecs[stream["codec_type"]] = stream.get("codec_name")
+    return codecs["video"], codecs["audio"]
+
+
+def ffmpeg_command(source: str, target: str, format: str, plan: TranscodePlan) -> List[str]:
+    """構建 ffmpeg 命令，進度以 key=value 形式輸出到 stdout"""
+    command = [settings.FFMPEG_BINARY, "-hide_banner", "-nostdin", "-nostats", "-loglevel", "error", "-y",
+               "-progress", "pipe:1", "-i", source]
+    if plan["video"] is None:
+        command += ["-vn"]
+    else:
+        command += ["-map", "0:v:0", "-c:v", plan["video"]]
+        if plan["video"] == "libx264":
+            command += ["-preset", settings.TRANSCODE_PRESET, "-crf", str(settings.TRANSCODE_CRF)]
+        elif plan["video"] != "copy":
+            command += ["-q:v", "3"]
+    if plan["audio"] is None:
+        command += ["-an"]
+    else:
+        command += ["-map", "0:a:0?", "-c:a", plan["audio"]]
+        if plan["audio"] == "libmp3lame":
+            command += ["-q:a", "2"]
+    if format in ("mp4", "m4a"):
+        # moov 放在文件開頭，/downloads 的 Range 請求可以邊下邊播
+        command += ["-movflags", "+faststart"]
+    command += ["-threads", str(settings.TRANSCODE_THREADS), "-f", MUXERS[format], target]
+    return command
+
+
+def transcode(
+    source: str,
+    format: str,
+    vcodec: Optional[str] = None,
+    acodec: Optional[str] = None,
+    duration: Optional[float] = None,
+    progress_callback: Optional[Callable[[float], None]] = None,
+) -> Dict[str, object]:
+    """
+    把 source 轉換為同名的 format 文件並刪除源文件
+
+    編碼未知時先以 ffprobe 探測。返回 filepath、plan 與 stream_copy。
+    progress_callback 以百分比調用（需要 duration）。
+    """
+    if vcodec is None or acodec is None:
+        probed = probe_codecs(source)
+        vcodec = vcodec if vcodec is not None else probed[0]
+        acodec = acodec if acodec is not None else probed[1]
+    plan = plan_transcode(format, vcodec, acodec)
+
+    target = os.path.splitext(source)[0] + "." + format.lower()
+    partial = target + ".part"
+    command = ffmpeg_command(source, partial, format.lower(), plan)
+    logger.info("轉換 %s -> %s（%s）", source, target, plan)
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    except OSError as e:
+        raise TranscodeError(f"無法執行 ffmpeg: {e}") from e
+
+    # 異常（包括 Celery 軟時限）時終止 ffmpeg 並刪除未完成的輸出；
+    # 時長上限由 Celery 的 task_time_limit 保證
+    try:
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if key == "out_time_us" and progress_callback and duration and value.isdigit():
+                progress_callback(min(100.0, int(value) / 1e6 * 100 / duration))
+        _, stderr = process.communicate()
+    except BaseException:
+        process.kill()
+        process.wait()
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    if process.returncode != 0:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise TranscodeError(f"ffmpeg 退出碼 {process.returncode}: {stderr.strip()[-500:]}")
+
+    os.replace(partial, target)
+    if os.path.abspath(source) != os.path.abspath(target):
+        os.remove(source)
+    return {"filepath": target, "plan": plan, "stream_copy": is_stream_copy(plan)}
@@ -0,0 +1,70 @@
+"""
+YouTube 影片 URL 工具
+
+將各種形式的 URL 規範化為 11 位影片 ID，並據此生成下載結果的內容鍵與文件名，
+使相同影片 + 格式 + 畫質的請求對應同一份下載結果；
+另含 API、路由與下載引擎共用的格式與畫質定義。
+"""
+
+import re
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+YOUTUBE_HOSTS = {
+    "youtube.com",
+    "www.youtube.com",
+    "m.youtube.com",
+    "music.youtube.com",
+    "youtube-nocookie.com",
+    "www.youtube-nocookie.com",
+}
+
+# /shorts/<id>、/embed/<id>、/live/<id>、/v/<id>
+PATH_ID_PREFIXES = ("shorts", "embed", "live", "v")
+
+# 只下載音軌的目標格式
+AUDIO_FORMATS = ("mp3", "m4a", "opus", "wav")
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """從 URL（或裸影片 ID）中提取影片 ID，無法識別時返回 None"""
+    url = url.strip()
+    if VIDEO_ID_RE.match(url):
+        return url
+
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    host = (parsed.hostname or "").lower()
+    parts = [p for p in parsed.path.split("/") if p]
+
+    candidate = None
+    if host in ("youtu.be", "www.youtu.be"):
+        candidate = parts[0] if parts else None
+    elif host in YOUTUBE_HOSTS:
+        if parsed.path == "/watch":
+            candidate = parse_qs(parsed.query).get("v", [None])[0]
+        elif len(parts) >= 2 and parts[0] in PATH_ID_PREFIXES:
+            candidate = parts[1]
+
+    if candidate and VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def result_key(video_id: str, format: str, quality: str) -> str:
+    """下載結果的內容鍵"""
+    return f"{video_id}:{format.lower()}:{quality.lower()}"
+
+
+def result_stem(video_id: str, format: str, quality: str) -> str:
+    """下載結果的文件名（不含副檔名），不同格式的結果互不覆蓋"""
+    return f"{video_id}_{format.lower()}_{quality.lower()}"
+
+
+def parse_quality(quality: Optional[str]) -> Optional[int]:
+    """將 "720p" 之類的畫質轉換為最大高度"""
+    if not quality:
+        return None
+    value = quality.lower().rstrip("p")
+    return int(value) if value.isdigit() else None
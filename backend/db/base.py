@@ -1,18 +1,90 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import os
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from core.config import settings
 
 # 從環境變量獲取數據庫URL
-SQLALCHEMY_DATABASE_URL = os.getenv(
-    "DATABASE_URL", 
-    "sqlite:///./db.sqlite3"
-)
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+
+# 同步驅動 -> 異步驅動
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+def pool_options() -> dict:
+    return dict(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+def create_db_engine(url: str):
+    """
+    按數據庫類型創建引擎
+
+    - SQLite：WAL 模式讓讀取不阻塞寫入（API 查詢歷史時 worker 仍可批量寫入），
+      synchronous=NORMAL 在 WAL 下只在檢查點時 fsync；busy_timeout 等待其他進程的寫鎖
+    - PostgreSQL 等：固定大小的連接池，取出前檢測失效連接；
+      psycopg2 的 executemany 以多值 INSERT / 批量 UPDATE 發送，批量寫入只需少數幾次往返
+    """
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+        event.listen(engine, "connect", configure_sqlite)
+        return engine
+
+    options = pool_options()
+    if url.startswith("postgresql"):
+        options["executemany_mode"] = "values_plus_batch"
+    return create_engine(url, **options)
+
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
-)
+def async_database_url(url: str) -> str:
+    """把同步驅動的 URL 換成對應的異步驅動（aiosqlite / asyncpg）"""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def create_async_db_engine(url: str) -> AsyncEngine:
+    """
+    創建異步引擎，連接池與 PRAGMA 配置與同步引擎一致
+
+    asyncpg 連接按 DB_STATEMENT_CACHE_SIZE 緩存預備語句。
+    aiosqlite 每個連接帶一個後台線程，SQLAlchemy 對 SQLite 文件默認不復用連接，
+    這裡同樣使用連接池，避免每個請求都新建連接與線程並重新執行 PRAGMA。
+    """
+    url = async_database_url(url)
+    if url.startswith("sqlite"):
+        options = {} if ":memory:" in url else dict(pool_options(), poolclass=AsyncAdaptedQueuePool)
+        engine = create_async_engine(url, connect_args={"timeout": 30}, **options)
+        event.listen(engine.sync_engine, "connect", configure_sqlite)
+        return engine
+
+    options = pool_options()
+    if url.startswith("postgresql+asyncpg"):
+        options["connect_args"] = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    return create_async_engine(url, **options)
+
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -24,3 +96,31 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# 異步引擎在首次使用時創建：只有 API 進程需要異步驅動，worker 只使用同步引擎
+_async_engine: Optional[AsyncEngine] = None
+_async_sessionmaker: Optional[sessionmaker] = None
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        _async_engine = create_async_db_engine(SQLALCHEMY_DATABASE_URL)
+        _async_sessionmaker = sessionmaker(_async_engine, class_=AsyncSession, expire_on_commit=False)
+    return _async_engine
+
+def async_session() -> AsyncSession:
+    get_async_engine()
+    return _async_sessionmaker()
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """異步會話依賴：async def 端點中的查詢不阻塞事件循環"""
+    async with async_session() as session:
+        yield session
+
+async def dispose_async_engine() -> None:
+    """關閉異步連接池（應用關閉時調用）"""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_sessionmaker = None
@@ -1,60 +1,251 @@
+"""
+日誌配置
+
+LOG_MODE=sync 時直接寫入控制台與輪轉文件（寫入與輪轉都在調用線程中進行）。
+LOG_MODE=async 時調用線程只把記錄放入有界隊列（QueueHandler），由 QueueListener 線程格式化並寫出，
+請求與下載線程不會阻塞在磁盤 fsync 或文件輪轉上；隊列已滿時丟棄記錄並計數，不阻塞調用方。
+
+LOG_FORMAT=json 時每條記錄為一行 JSON，附帶當前的 request_id（API 請求）與 task_id（Celery 任務），
+以及通過 extra 傳入的欄位。
+
+高頻消息（下載進度等）以 extra={"rate_limit_key": ...} 標記：同一個鍵每 LOG_RATE_LIMIT_INTERVAL 秒
+最多輸出一條，期間被抑制的條數記在下一條輸出的 suppressed 欄位；WARNING 及以上的記錄不受限制。
+"""
+
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import queue
 import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from core.config import settings
+
+LOG_DIR = Path(settings.LOG_DIR)
+
+# 當前 API 請求 / Celery 任務的 ID，由 RequestIdMiddleware 與 Celery 的 task_prerun 信號設置
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+task_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("task_id", default=None)
+
+# LogRecord 自帶的屬性，其餘屬性來自 extra
+RESERVED_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+# 文本格式（LOG_FORMAT=text）：控制台只輸出級別與消息，文件帶時間與日誌器名稱
+SIMPLE_FORMAT = "%(levelname)s: %(message)s"
+DETAILED_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class ContextFilter(logging.Filter):
+    """在調用線程中為記錄附加 request_id / task_id（QueueListener 線程中讀不到調用方的上下文）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        if not hasattr(record, "task_id"):
+            record.task_id = task_id_var.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """同一個 rate_limit_key 每 interval 秒最多放行一條記錄"""
+
+    def __init__(self, interval: float, max_keys: int = 10000):
+        super().__init__()
+        self.interval = interval
+        self.max_keys = max_keys
+        # 鍵 -> (上次放行的時間, 此後被抑制的條數)
+        self._state: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "rate_limit_key", None)
+        if key is None or record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._state.get(key, (float("-inf"), 0))
+            if now - last < self.interval:
+                self._state[key] = (last, suppressed + 1)
+                return False
+            if len(self._state) >= self.max_keys and key not in self._state:
+                # 已結束任務的鍵不會再出現，超出上限時整體清空
+                self._state.clear()
+            self._state[key] = (now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每條記錄輸出為一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS and key != "rate_limit_key" and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """隊列已滿時丟棄記錄（計入 dropped），不阻塞調用線程"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 在調用線程中合併消息參數（參數可能在之後被修改），異常堆棧另存為 exc_text 由格式化器輸出
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def build_handlers(log_file: str, log_format: str) -> List[logging.Handler]:
+    """控制台與輪轉文件處理器"""
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    if log_format == "json":
+        console_formatter = file_formatter = JsonFormatter()
+    else:
+        console_formatter = logging.Formatter(SIMPLE_FORMAT)
+        file_formatter = logging.Formatter(DETAILED_FORMAT, DATE_FORMAT)
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.INFO)
+    console.setFormatter(console_formatter)
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_DIR / log_file, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(file_formatter)
+    return [console, file_handler]
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def setup_logging(
+    log_file: str = "app.log",
+    mode: Optional[str] = None,
+    log_format: Optional[str] = None,
+    level: Optional[str] = None,
+) -> None:
+    """
+    配置根日誌器；uvicorn / celery 的日誌器改為傳遞到根日誌器，共用同一條輸出管道
+
+    API 進程寫入 app.log，Celery worker 寫入 celery.log。prefork 子進程不繼承父進程的
+    QueueListener 線程，需在子進程啟動後再次調用（見 celery_app.py 的 worker_process_init）。
+    """
+    global _listener, _queue_handler
+    mode = (mode or settings.LOG_MODE).lower()
+    log_format = (log_format or settings.LOG_FORMAT).lower()
+
+    stop_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(level or settings.LOG_LEVEL)
+
+    handlers = build_handlers(log_file, log_format)
+    if mode == "async":
+        _queue_handler = NonBlockingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        front = [_queue_handler]
+    else:
+        front = handlers
+    for handler in front:
+        # 過濾器在調用線程中執行：被限流的記錄不進入隊列；同步模式下每個處理器各自限流
+        handler.addFilter(ContextFilter())
+        handler.addFilter(RateLimitFilter(settings.LOG_RATE_LIMIT_INTERVAL))
+        root.addHandler(handler)
+
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access", "celery"):
+        named = logging.getLogger(name)
+        named.handlers.clear()
+        named.propagate = True
+
+
+def stop_logging() -> None:
+    """停止 QueueListener 並寫出隊列中剩餘的記錄"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        # fork 出的子進程中監聽線程並不存在，無需等待
+        if _listener._thread is not None and _listener._thread.is_alive():
+            _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    _queue_handler = None
+
+
+def dropped_records() -> int:
+    """異步模式下因隊列已滿而丟棄的記錄數"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+atexit.register(stop_logging)
+
+
+class RequestIdMiddleware:
+    """
+    為每個請求設置 request_id（沿用客戶端的 X-Request-ID，否則生成），並在響應頭中返回
+
+    純 ASGI 中間件，上下文變量在整個請求（包括流式響應）期間有效。
+    """
+
+    header = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(self.header, request_id.encode("latin-1"))]
+            await send(message)
 
-LOG_DIR = Path("logs")
-LOG_DIR.mkdir(exist_ok=True)
-
-logging_config = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "detailed": {
-            "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            "datefmt": "%Y-%m-%d %H:%M:%S",
-        },
-        "simple": {
-            "format": "%(levelname)s: %(message)s",
-        },
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "level": "INFO",
-            "formatter": "simple",
-            "stream": sys.stdout,
-        },
-        "file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "level": "DEBUG",
-            "formatter": "detailed",
-            "filename": LOG_DIR / "app.log",
-            "maxBytes": 10485760,  # 10MB
-            "backupCount": 5,
-        },
-        "celery_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "level": "DEBUG",
-            "formatter": "detailed",
-            "filename": LOG_DIR / "celery.log",
-            "maxBytes": 10485760,
-            "backupCount": 5,
-        },
-    },
-    "loggers": {
-        "": {  # Root logger
-            "level": "DEBUG",
-            "handlers": ["console", "file"],
-        },
-        "celery": {
-            "level": "INFO",
-            "handlers": ["console", "celery_file"],
-            "propagate": False,
-        },
-        "uvicorn": {
-            "level": "INFO",
-            "handlers": ["console"],
-            "propagate": False,
-        },
-    },
-}
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
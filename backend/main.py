@@ -1,7 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from prometheus_client import CONTENT_TYPE_LATEST
 import os
+import sys
+
+from core.config import settings
+from core.metrics import MetricsMiddleware, ScrapeCollector, render_metrics
+from logging_config import RequestIdMiddleware, setup_logging
+
+# 在創建應用前配置日誌（uvicorn 的日誌器也改為經由同一條管道輸出）
+setup_logging("app.log")
 
 app = FastAPI(
     title="YouTube Downloader API",
@@ -20,6 +29,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按路由記錄請求延遲（/metrics）
+app.add_middleware(MetricsMiddleware)
+
+# 請求 ID 寫入該請求期間的日誌記錄，並通過 X-Request-ID 響應頭返回
+app.add_middleware(RequestIdMiddleware)
+
 # 導入路由
 from api.endpoints import download as download_endpoints
 app.include_router(
@@ -29,10 +44,50 @@ app.include_router(
 )
 
 # 創建下載目錄（如果不存在）
-os.makedirs("downloads", exist_ok=True)
+os.makedirs(settings.DOWNLOAD_DIR, exist_ok=True)
+
+# 下載文件分發（Range、條件請求、可選 X-Accel-Redirect）
+from api.endpoints import files as file_endpoints
+app.include_router(
+    file_endpoints.router,
+    prefix="/downloads",
+    tags=["files"]
+)
+
+# 下載目錄配額：啟動時登記未索引的文件，之後在後台按水位淘汰
+from core.storage import get_storage_manager
+
+@app.on_event("startup")
+def start_storage_manager():
+    get_storage_manager().start(settings.STORAGE_CHECK_INTERVAL)
 
-# 靜態文件服務（用於提供下載的文件）
-app.mount("/downloads", StaticFiles(directory="downloads"), name="downloads")
+@app.on_event("shutdown")
+def stop_storage_manager():
+    get_storage_manager().stop()
+
+# 任務歷史由後台線程批量寫入，退出前寫入剩餘記錄；
+# 寫入器在第一次寫入任務時才導入，沒有導入過說明沒有待寫記錄，不為退出導入數據庫層
+@app.on_event("shutdown")
+def flush_task_history():
+    if settings.TASK_HISTORY_ENABLED and "core.task_history" in sys.modules:
+        from core.task_history import get_task_history
+        get_task_history().stop()
+
+# 就緒檢查的依賴探測在後台定期執行，/health/ready 只返回緩存結果
+from core.health import get_health_prober
+
+@app.on_event("startup")
+def start_health_prober():
+    get_health_prober().start(settings.HEALTH_PROBE_INTERVAL)
+
+@app.on_event("shutdown")
+def stop_health_prober():
+    get_health_prober().stop()
+
+@app.on_event("shutdown")
+async def close_database_pool():
+    from db.base import dispose_async_engine
+    await dispose_async_engine()
 
 @app.get("/")
 async def root():
@@ -41,6 +96,9 @@ async def root():
         "docs": "/docs",
         "endpoints": {
             "health": "/health",
+            "liveness": "/health/live",
+            "readiness": "/health/ready",
+            "metrics": "/metrics",
             "download_api": "/api/download",
             "download_docs": "/docs#/download"
         }
@@ -50,6 +108,22 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "youtube-downloader-api"}
 
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    snapshot = get_health_prober().snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["status"] == "ready" else 503)
+
+# 指標中的隊列深度與存儲用量在抓取時讀取 Redis，使用同步函數
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    from core.dispatch import queue_depths
+    collector = ScrapeCollector(queue_depths, get_storage_manager().stats)
+    return Response(render_metrics(collector), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/info")
 async def api_info():
     return {
@@ -60,10 +134,24 @@ async def api_info():
         "endpoints": [
             {"path": "/", "method": "GET", "description": "API 根路徑"},
             {"path": "/health", "method": "GET", "description": "健康檢查"},
-            {"path": "/api/download/tasks", "method": "GET", "description": "獲取所有下載任務"},
+            {"path": "/health/live", "method": "GET", "description": "存活檢查（不訪問依賴）"},
+            {"path": "/health/ready", "method": "GET", "description": "就緒檢查（後台探測的緩存結果）"},
+            {"path": "/api/download/tasks", "method": "GET", "description": "分頁獲取下載任務"},
             {"path": "/api/download/tasks", "method": "POST", "description": "創建下載任務"},
+            {"path": "/api/download/tasks/batch", "method": "POST", "description": "批量創建下載任務"},
             {"path": "/api/download/tasks/{task_id}", "method": "GET", "description": "獲取任務詳情"},
+            {"path": "/api/download/history", "method": "GET", "description": "分頁查詢數據庫中的任務歷史"},
             {"path": "/api/download/tasks/{task_id}", "method": "DELETE", "description": "刪除任務"},
-            {"path": "/api/download/formats", "method": "GET", "description": "獲取支持的格式"}
+            {"path": "/api/download/tasks/{task_id}/events", "method": "GET", "description": "任務進度 SSE 推送"},
+            {"path": "/api/download/ws/tasks", "method": "WEBSOCKET", "description": "多任務進度 WebSocket 推送"},
+            {"path": "/api/download/playlists", "method": "POST", "description": "下載播放列表或頻道"},
+            {"path": "/api/download/playlists/{playlist_id}", "method": "GET", "description": "獲取播放列表匯總進度"},
+            {"path": "/api/download/formats", "method": "GET", "description": "獲取支持的格式"},
+            {"path": "/api/download/info", "method": "GET", "description": "獲取影片元數據與可用格式"},
+            {"path": "/api/download/bandwidth", "method": "GET", "description": "獲取下載帶寬限額與統計"},
+            {"path": "/api/download/bandwidth", "method": "PUT", "description": "調整下載帶寬限額"},
+            {"path": "/api/download/storage", "method": "GET", "description": "獲取下載目錄配額與淘汰統計"},
+            {"path": "/api/download/storage/files/{filename}", "method": "PUT", "description": "固定或取消固定下載文件"},
+            {"path": "/downloads/{filename}", "method": "GET", "description": "下載文件（支持 Range 斷點續傳）"}
         ]
     }
@@ -0,0 +1,3 @@
+from models.download_task import DownloadTaskRecord
+
+__all__ = ["DownloadTaskRecord"]
@@ -0,0 +1,39 @@
+"""
+下載任務歷史
+
+任務存儲（Redis）只保存進行中與近期的任務，完成後可能被刪除；
+每個任務的最終狀態由 core/task_history.py 批量寫入此表，供長期查詢。
+"""
+
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Index, Integer, String, Text
+
+from db.base import Base
+
+
+class DownloadTaskRecord(Base):
+    __tablename__ = "download_tasks"
+
+    id = Column(String(64), primary_key=True)
+    # download / playlist
+    kind = Column(String(16), nullable=False, default="download")
+    url = Column(Text)
+    video_id = Column(String(32), index=True)
+    format = Column(String(16))
+    quality = Column(String(16))
+    priority = Column(Integer)
+    status = Column(String(16), nullable=False)
+    stage = Column(String(16))
+    progress = Column(Integer)
+    title = Column(Text)
+    size = Column(BigInteger)
+    download_url = Column(Text)
+    error = Column(Text)
+    timings = Column(JSON)
+    created_at = Column(DateTime, nullable=False, index=True)
+    updated_at = Column(DateTime)
+    completed_at = Column(DateTime)
+
+    # 歷史查詢按狀態過濾、按創建時間倒序分頁，複合索引同時覆蓋只按狀態的過濾
+    __table_args__ = (
+        Index("ix_download_tasks_status_created_at", "status", "created_at"),
+    )
@@ -1,33 +1,36 @@
 from celery_app import celery_app
 import time
-import random
 from datetime import datetime
 
+from core.downloader import get_downloader
+from core.progress import ProgressReporter
+
 @celery_app.task(bind=True)
 def download_video_task(self, url, format='mp4', quality='720p'):
     """下載視頻的 Celery 任務"""
     task_id = self.request.id
     
-    # 模擬下載過程
-    total_steps = 10
-    for i in range(1, total_steps + 1):
-        time.sleep(1)  # 模擬工作
-        progress = int((i / total_steps) * 100)
-        
-        # 更新任務狀態
+    def write_progress(state):
         self.update_state(
+            task_id=task_id,
             state='PROGRESS',
             meta={
-                'current': i,
-                'total': total_steps,
-                'progress': progress,
-                'status': f'正在下載... {progress}%'
+                'current': state['progress'],
+                'total': 100,
+                'progress': state['progress'],
+                'status': f"正在下載... {state['progress']}%"
             }
         )
-        
-        # 隨機模擬失敗（測試用）
-        if random.random() < 0.1:  # 10% 失敗率
-            raise Exception('下載過程中發生錯誤')
+    
+    # 更新任務狀態（節流後在後台線程寫入 result backend）
+    with ProgressReporter(write_progress) as reporter:
+        result = get_downloader().download_video(
+            url,
+            format=format,
+            quality=quality,
+            filename=task_id,
+            progress_callback=lambda p: reporter.report(int(p['progress'])),
+        )
     
     # 任務完成
     return {
@@ -36,7 +39,7 @@ def download_video_task(self, url, format='mp4', quality='720p'):
         'format': format,
         'quality': quality,
         'status': 'completed',
-        'download_url': f'/downloads/{task_id}.{format}',
+        'download_url': f"/downloads/{result['filename']}",
         'completed_at': datetime.now().isoformat()
     }
 
@@ -1,4 +1,13 @@
 # Tasks package
-from .youtube import download_youtube_video, test_task
+from .playlist import expand_playlist, playlist_batch_done
+from .transcode import transcode_media
+from .youtube import download_youtube_video, fetch_video_metadata, test_task
 
-__all__ = ["download_youtube_video", "test_task"]
+__all__ = [
+    "download_youtube_video",
+    "expand_playlist",
+    "fetch_video_metadata",
+    "playlist_batch_done",
+    "test_task",
+    "transcode_media",
+]
@@ -0,0 +1,159 @@
+"""
+播放列表 / 頻道下載任務
+
+expand_playlist 平鋪提取列表，按 PLAYLIST_BATCH_SIZE 分批提交子下載任務，
+每批以一個 chord 投遞；playlist_batch_done 作為 chord 回調（子任務失敗時作為錯誤回調）
+把該批的結果累加到父任務，最後一批匯總後父任務結束，記錄總數、失敗數與吞吐量。
+
+父任務記錄中的匯總欄位：
+- total / completed / failed   已發現的條目數與已結束的子任務數
+- bytes                        已完成子任務的文件大小總和
+- batches / batches_done       已投遞與已匯總的批次數
+- expanded                     列表是否已展開完畢
+"""
+
+import itertools
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from celery import shared_task
+
+from core.config import settings
+from core.dispatch import dispatch_playlist_batch
+from core.downloader import get_downloader
+from core.events import TERMINAL_STATUSES
+from core.metadata_cache import get_metadata_cache
+from core.result_cache import get_result_cache
+from core.routing import DEFAULT_PRIORITY
+from core.singleflight import get_inflight_registry
+from core.submission import DownloadRequest, fail_dispatch, submit_downloads
+from core.task_store import get_task_store
+from core.video import extract_video_id, result_key
+from tasks.youtube import report_task
+
+logger = logging.getLogger(__name__)
+
+
+def submit_playlist_batch(playlist_id: str, entries: List[Dict[str, Any]], format: str, quality: str,
+                          priority: Optional[int]) -> List[str]:
+    """提交一批條目並以 chord 投遞，返回本批子任務 ID；不可用的影片直接計入失敗"""
+    store = get_task_store()
+    registry = get_inflight_registry()
+    requests = [
+        DownloadRequest(url=entry["url"], format=format, quality=quality,
+                        priority=DEFAULT_PRIORITY if priority is None else priority)
+        for entry in entries
+    ]
+    records: List[Dict[str, Any]] = []
+    submitted = submit_downloads(
+        requests, store, get_result_cache(), registry, get_metadata_cache(),
+        durations=[entry.get("duration") for entry in entries],
+        dispatch=records.extend,
+    )
+    task_ids = [task.id for task, _ in submitted if task is not None]
+    unavailable = len(submitted) - len(task_ids)
+    if unavailable:
+        store.increment(playlist_id, failed=unavailable)
+    try:
+        dispatch_playlist_batch(playlist_id, records, task_ids)
+    except Exception:
+        fail_dispatch(records, store, registry)
+        raise
+    return task_ids
+
+
+def finish_playlist(playlist: Optional[Dict[str, Any]]) -> None:
+    """所有批次都已匯總時結束父任務，否則更新進度"""
+    if playlist is None or playlist.get("status") in TERMINAL_STATUSES:
+        return
+    total = playlist.get("total") or 0
+    done = (playlist.get("completed") or 0) + (playlist.get("failed") or 0)
+    if not (playlist.get("expanded") and playlist.get("batches_done", 0) >= playlist.get("batches", 0)):
+        report_task(playlist["id"], progress=min(99, done * 100 // total) if total else 0)
+        return
+
+    elapsed = (datetime.now() - datetime.fromisoformat(playlist["created_at"])).total_seconds()
+    failed = playlist.get("failed") or 0
+    report_task(
+        playlist["id"],
+        status="failed" if total and failed == total else "completed",
+        progress=100,
+        elapsed=round(elapsed, 3),
+        throughput=round((playlist.get("bytes") or 0) / elapsed, 1) if elapsed > 0 else None,
+    )
+    logger.info("播放列表 %s 完成：%d 個條目，%d 個失敗，用時 %.1f 秒", playlist["id"], total, failed, elapsed)
+
+
+@shared_task(name="expand_playlist")
+def expand_playlist(playlist_id: str, url: str, format: str = "mp4", quality: str = "720p", priority=None):
+    """
+    展開播放列表並分批投遞子任務（metadata 隊列）
+
+    條目按頁惰性取得，每湊滿一批即投遞，不等完整列表；
+    展開中途失敗時保留已投遞的批次，只把父任務記錄為部分展開。
+    """
+    store = get_task_store()
+    report_task(playlist_id, status="processing")
+    children: List[str] = []
+    batches = 0
+    try:
+        playlist = get_downloader().extract_playlist(url, settings.PLAYLIST_MAX_ENTRIES)
+        store.update(playlist_id, title=playlist["title"])
+        entries = iter(playlist["entries"])
+        while True:
+            batch = list(itertools.islice(entries, settings.PLAYLIST_BATCH_SIZE))
+            if not batch:
+                break
+            children += submit_playlist_batch(playlist_id, batch, format, quality, priority)
+            batches += 1
+            store.increment(playlist_id, total=len(batch), batches=1)
+            store.update(playlist_id, children=children)
+    except Exception as e:
+        logger.error("展開播放列表失敗 %s: %s", url, e)
+        if not batches:
+            report_task(playlist_id, status="failed", error=str(e))
+            return {"status": "error", "task_id": playlist_id, "error": str(e)}
+        store.update(playlist_id, error=str(e))
+
+    finish_playlist(store.update(playlist_id, expanded=True))
+    return {"status": "expanded", "task_id": playlist_id, "entries": len(children), "batches": batches}
+
+
+@shared_task(bind=True, name="playlist_batch_done")
+def playlist_batch_done(self, results, playlist_id: str, task_ids: List[str]):
+    """
+    chord 回調：匯總一批子任務的結果到父任務
+
+    也是 chord 的錯誤回調：有子任務以異常結束時 chord 不執行回調，Celery 改為投遞錯誤回調，
+    此時 results 為失敗的回調任務 ID。兩種情況都不使用 results。
+
+    子任務可能重試、到達軟時限後重新排隊，或附加到其他請求的進行中任務，
+    chord 的返回值不代表最終狀態，因此從任務存儲讀取，仍在進行中時稍後再查。
+    """
+    store = get_task_store()
+    tasks = store.get_many(task_ids)
+    pending = [task for task in tasks if task is not None and task.get("status") not in TERMINAL_STATUSES]
+    max_polls = settings.PLAYLIST_WAIT_TIMEOUT // max(settings.PLAYLIST_POLL_INTERVAL, 1)
+    if pending and self.request.retries < max_polls:
+        raise self.retry(countdown=settings.PLAYLIST_POLL_INTERVAL, max_retries=max_polls)
+
+    completed = [task for task in tasks if task is not None and task.get("status") == "completed"]
+    # 緩存命中的子任務記錄沒有 size，從結果緩存補齊
+    size = sum(task.get("size") or 0 for task in completed)
+    keys = [
+        result_key(video_id, task["format"], task["quality"])
+        for task in completed
+        if task.get("size") is None and (video_id := extract_video_id(task["url"]))
+    ]
+    size += sum(entry.get("size") or 0 for entry in get_result_cache().get_many(keys) if entry)
+
+    # 等待超時仍未結束、或已被刪除的子任務計為失敗
+    finish_playlist(store.increment(
+        playlist_id,
+        completed=len(completed),
+        failed=len(task_ids) - len(completed),
+        bytes=size,
+        batches_done=1,
+    ))
+    return {"task_id": playlist_id, "completed": len(completed), "failed": len(task_ids) - len(completed)}
@@ -0,0 +1,89 @@
+import os
+import time
+
+from celery import shared_task
+
+from core.config import settings
+from core.progress import ProgressReporter
+from core.singleflight import get_inflight_registry
+from core.storage import InsufficientStorage, get_storage_manager
+from core.transcoder import transcode
+from core.video import extract_video_id, result_key
+from tasks.youtube import DownloadTaskRequest, complete_download, report_task
+
+@shared_task(bind=True, name="transcode_media", acks_late=True, reject_on_worker_lost=True,
+             Request=DownloadTaskRequest)
+def transcode_media(self, task_id: str, url: str, format: str, quality: str, source: str,
+                    vcodec=None, acodec=None, title=None, duration=None, timings=None, handed_off_at=None):
+    """
+    轉碼任務（transcode 隊列）
+
+    把下載階段的文件轉換為目標格式，編碼兼容時只做 stream copy。
+    timings 累加各階段耗時：download、transcode_wait（在 transcode 隊列中的等待）、transcode。
+    輸出文件按源文件大小預留空間，不足時稍後重試。
+    """
+    registry = get_inflight_registry()
+    storage = get_storage_manager()
+    video_id = extract_video_id(url)
+    lease_key = result_key(video_id, format, quality) if video_id else None
+    timings = dict(timings or {})
+    if handed_off_at:
+        timings["transcode_wait"] = round(max(0.0, time.time() - handed_off_at), 3)
+    
+    report_task(task_id, status="processing", stage="transcoding", progress=0)
+    started = time.monotonic()
+    retrying = False
+    reservation = f"{task_id}-transcode"
+    
+    def renew_lease():
+        registry.renew(lease_key, task_id, settings.SINGLEFLIGHT_HEARTBEAT_TTL)
+    
+    try:
+        storage.reserve(reservation, os.path.getsize(os.path.join(settings.DOWNLOAD_DIR, source)))
+        
+        with ProgressReporter(
+            lambda state: report_task(task_id, **state),
+            heartbeat=renew_lease if lease_key else None,
+            heartbeat_interval=settings.SINGLEFLIGHT_HEARTBEAT_TTL / 3,
+        ) as reporter:
+            if lease_key:
+                renew_lease()
+            output = transcode(
+                os.path.join(settings.DOWNLOAD_DIR, source),
+                format,
+                vcodec=vcodec,
+                acodec=acodec,
+                duration=duration,
+                progress_callback=lambda p: reporter.report(int(p)),
+            )
+        timings["transcode"] = round(time.monotonic() - started, 3)
+        
+        filepath = output["filepath"]
+        result = complete_download(task_id, url, format, quality, os.path.basename(filepath),
+                                   os.path.getsize(filepath), {"title": title, "duration": duration}, timings)
+        return dict(result, stream_copy=output["stream_copy"], plan=output["plan"])
+    except InsufficientStorage as e:
+        if self.request.retries < settings.DOWNLOAD_MAX_RETRIES:
+            retrying = True
+            if lease_key:
+                registry.renew(lease_key, task_id, settings.SINGLEFLIGHT_QUEUED_TTL)
+            report_task(task_id, status="queued", stage="transcoding")
+            raise self.retry(
+                exc=e,
+                countdown=settings.DOWNLOAD_RETRY_BACKOFF * 2 ** self.request.retries,
+                max_retries=settings.DOWNLOAD_MAX_RETRIES,
+            )
+        report_task(task_id, status="failed", stage=None, timings=timings)
+        return {"status": "error", "task_id": task_id, "error": str(e), "timings": timings}
+    except Exception as e:
+        report_task(task_id, status="failed", stage=None, timings=timings)
+        return {
+            "status": "error",
+            "task_id": task_id,
+            "error": str(e),
+            "timings": timings,
+        }
+    finally:
+        storage.release(reservation)
+        if lease_key and not retrying:
+            registry.release(lease_key, task_id)
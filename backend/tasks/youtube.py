@@ -1,38 +1,312 @@
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.worker.request import Request
+import logging
 import time
+from datetime import datetime
 
-@shared_task(bind=True, name="download_youtube_video")
-def download_youtube_video(self, task_id: str, url: str, format: str = "mp4"):
-    """下載 YouTube 影片任務"""
+from core.checkpoint import DownloadCheckpoint
+from core.config import settings
+from core.dispatch import dispatch_download, dispatch_transcode
+from core.downloader import DownloadError, VideoUnavailable, get_downloader
+from core.events import get_event_bus
+from core.file_index import get_file_index
+from core.metadata_cache import get_metadata_cache
+from core.progress import ProgressReporter
+from core.result_cache import get_result_cache
+from core.singleflight import get_inflight_registry
+from core.storage import InsufficientStorage, estimate_download_size, get_storage_manager
+from core.task_store import get_task_store
+from core.transcoder import needs_transcode
+from core.video import extract_video_id, result_key, result_stem
+
+logger = logging.getLogger(__name__)
+
+def report_task(task_id: str, **fields):
+    """寫入任務存儲並向訂閱者發佈狀態變化"""
+    get_task_store().update(task_id, **fields)
+    get_event_bus().publish(task_id, fields)
+
+def fail_timed_out_task(reservation: str, kwargs) -> None:
+    """
+    任務被硬時限終止後的收尾：標記失敗，釋放空間預留與去重租約
+
+    斷點文件保留，相同請求重新提交時從斷點續傳。
+    """
+    task_id = kwargs.get("task_id")
+    if not task_id:
+        return
+    try:
+        report_task(task_id, status="failed")
+        get_storage_manager().release(reservation)
+        video_id = extract_video_id(kwargs.get("url") or "")
+        if video_id:
+            lease_key = result_key(video_id, kwargs.get("format"), kwargs.get("quality"))
+            get_inflight_registry().release(lease_key, task_id)
+    except Exception as e:
+        logger.error("標記超時任務失敗時出錯 %s: %s", task_id, e)
+
+class DownloadTaskRequest(Request):
+    """
+    下載與轉碼任務的 worker 端請求
+
+    到達 task_time_limit 時子進程被強制終止，任務中的 finally 不會執行；
+    Celery 把結果記為失敗並確認消息（acks_on_failure_or_timeout 默認為真），消息不會重新投遞。
+    因此在 worker 主進程中把任務記錄標記為失敗，否則它會一直停在 processing。
+    """
+    
+    def on_timeout(self, soft, timeout):
+        super().on_timeout(soft, timeout)
+        if not soft:
+            # Celery 任務 ID 即空間預留的持有者（下載為任務 ID，轉碼為 "{任務 ID}-transcode"）
+            fail_timed_out_task(self.id, self.kwargs)
+
+def complete_download(task_id: str, url: str, format: str, quality: str, filename: str, size: int,
+                      info, timings):
+    """最後一個階段完成：建立文件索引、寫入結果緩存並標記任務完成"""
+    video_id = extract_video_id(url)
+    download_url = f"/downloads/{filename}"
+    cache_key = result_key(video_id, format, quality) if video_id else None
+    
+    # 預先計算摘要，/downloads 以其作為強 ETag 支持斷點續傳；淘汰文件時按 cache_key 一併刪除結果緩存
+    get_file_index().index(filename, cache_key=cache_key)
+    
+    if video_id:
+        get_result_cache().put(cache_key, {
+            "video_id": video_id,
+            "format": format,
+            "quality": quality,
+            "filename": filename,
+            "download_url": download_url,
+            "size": size,
+            "title": info.get("title"),
+            "duration": info.get("duration"),
+            "completed_at": datetime.now().isoformat()
+        })
+    
+    report_task(task_id, status="completed", progress=100, download_url=download_url, size=size,
+                stage=None, timings=timings)
+    
+    return {
+        "status": "success",
+        "task_id": task_id,
+        "url": url,
+        "format": format,
+        "quality": quality,
+        "filename": filename,
+        "download_url": download_url,
+        "timings": timings,
+    }
+
+def download_with_metadata(url: str, **kwargs):
+    """
+    以緩存的元數據下載，省去重複的 extract_info
+
+    緩存中的媒體 URL 仍可能失效（例如簽名綁定了提取時的主機 IP），
+    此時淘汰該條目並以重新提取的元數據再試一次。
+    """
+    downloader = get_downloader()
+    metadata = get_metadata_cache()
+    extracted = []
+    
+    def extract(u):
+        extracted.append(u)
+        return downloader.extract_info(u)
+    
+    info = metadata.get_info(url, extract)
+    try:
+        return downloader.download_video(url, info=info, **kwargs)
+    except DownloadError:
+        if extracted:
+            raise
+        metadata.invalidate(url)
+        return downloader.download_video(url, info=metadata.get_info(url, extract), **kwargs)
+
+@shared_task(name="fetch_video_metadata")
+def fetch_video_metadata(task_id: str, url: str, format: str = "mp4", quality: str = "720p", priority=None):
+    """
+    提取影片元數據（metadata 隊列），再按時長把下載任務投遞到對應隊列
+
+    元數據寫入共享緩存，下載 worker 不再重複提取；
+    影片不可用時直接標記任務失敗，不佔用下載 worker。
+    """
     try:
-        print(f"[Celery] 開始下載: {url}")
+        info = get_metadata_cache().get_info(url, get_downloader().extract_info)
+        duration = info.get("duration")
+    except VideoUnavailable as e:
+        task = get_task_store().get(task_id)
+        report_task(task_id, status="failed")
+        if task and task.get("lease_key"):
+            get_inflight_registry().release(task["lease_key"], task_id)
+        return {"status": "error", "task_id": task_id, "error": str(e)}
+    except DownloadError:
+        # 暫時性失敗：照常投遞，由下載任務自行提取並處理錯誤
+        duration = None
+    
+    dispatch_download({
+        "id": task_id,
+        "url": url,
+        "format": format,
+        "quality": quality,
+        "priority": priority,
+        "duration": duration,
+    })
+    return {"status": "dispatched", "task_id": task_id, "duration": duration}
+
+# acks_late + reject_on_worker_lost：worker 子進程意外退出（OOM、被殺）時消息重新投遞，重新執行時從斷點續傳。
+# 到達 task_time_limit 時消息被確認而不會重新投遞，由 DownloadTaskRequest 標記任務失敗並釋放租約；
+# 正常情況下軟時限先到，任務自行寫出斷點並重新排隊
+@shared_task(bind=True, name="download_youtube_video", acks_late=True, reject_on_worker_lost=True,
+             Request=DownloadTaskRequest)
+def download_youtube_video(self, task_id: str, url: str, format: str = "mp4", quality: str = "720p",
+                           duration=None, continuation: int = 0):
+    """
+    下載 YouTube 影片任務
+
+    duration 為提交時已知的影片時長，只用於隊列路由（見 core/routing.py）。
+    下載可中斷續傳：
+    - 到達軟時限時寫出斷點並以 continuation + 1 重新排隊，而不是標記失敗
+    - 暫時性下載錯誤按 DOWNLOAD_RETRY_BACKOFF 指數退避重試，最多 DOWNLOAD_MAX_RETRIES 次
+    - 重試與重新排隊期間保留去重租約，其他相同請求繼續附加到該任務
+    下載結果的容器與目標格式不同時交給 transcode 隊列轉碼，租約隨之移交。
+    開始前按元數據估計的大小預留下載目錄空間，淘汰後仍不足時按暫時性錯誤重試。
+    """
+    store = get_task_store()
+    registry = get_inflight_registry()
+    storage = get_storage_manager()
+    video_id = extract_video_id(url)
+    lease_key = result_key(video_id, format, quality) if video_id else None
+    
+    # 開始下載後改用短租約並由心跳續約；續約失敗（排隊過久已被接管）則不再持有租約
+    report_task(task_id, status="processing", stage="downloading")
+    if lease_key:
+        heartbeat = settings.SINGLEFLIGHT_HEARTBEAT_TTL
+        if not (registry.renew(lease_key, task_id, heartbeat)
+                or registry.replace(lease_key, None, task_id, heartbeat)):
+            lease_key = None
+            store.update(task_id, lease_key=None)
+    
+    # 進度由 ProgressReporter 在後台線程節流寫出，update_state 需要顯式傳入 Celery 任務 ID
+    celery_task_id = self.request.id
+    
+    def write_progress(state):
+        self.update_state(
+            task_id=celery_task_id,
+            state="PROGRESS",
+            meta={
+                "current": state["progress"],
+                "total": 100,
+                "status": f"下載中... {state['progress']}%"
+            }
+        )
+        report_task(task_id, **state)
+        # 進度日誌按任務限流（LOG_RATE_LIMIT_INTERVAL）
+        logger.info("下載進度 %s%%", state["progress"], extra={"rate_limit_key": f"progress:{task_id}"})
+    
+    def renew_lease():
+        registry.renew(lease_key, task_id, settings.SINGLEFLIGHT_HEARTBEAT_TTL)
+    
+    def keep_lease_queued():
+        if lease_key:
+            registry.renew(lease_key, task_id, settings.SINGLEFLIGHT_QUEUED_TTL)
+    
+    # 同一影片 + 格式 + 畫質固定對應同一個文件名，供結果緩存復用，也使重試能找到上次的斷點
+    stem = result_stem(video_id, format, quality) if video_id else f"video_{task_id[:8]}"
+    checkpoint = DownloadCheckpoint.load(settings.DOWNLOAD_DIR, stem, settings.CHECKPOINT_INTERVAL)
+    attempt = checkpoint.begin_attempt(task_id=task_id, url=url, format=format, quality=quality)
+    keep_lease = False
+    
+    started = time.monotonic()
+    
+    try:
+        cached = get_metadata_cache().peek(url) or {}
+        storage.reserve(task_id, estimate_download_size(cached.get("info"), format, quality))
+        
+        if checkpoint.downloaded_bytes:
+            logger.info("從斷點續傳（第 %d 次執行，已下載 %d 字節）: %s", attempt, checkpoint.downloaded_bytes, url)
+        else:
+            logger.info("開始下載: %s", url)
         
-        # 模擬下載過程
-        for i in range(1, 11):
-            time.sleep(1)
-            self.update_state(
-                state="PROGRESS",
-                meta={
-                    "current": i * 10,
-                    "total": 100,
-                    "status": f"下載中... {i * 10}%"
-                }
+        with ProgressReporter(
+            write_progress,
+            heartbeat=renew_lease if lease_key else None,
+            heartbeat_interval=settings.SINGLEFLIGHT_HEARTBEAT_TTL / 3,
+        ) as reporter:
+            result = download_with_metadata(
+                url,
+                format=format,
+                quality=quality,
+                filename=stem,
+                progress_callback=lambda p: reporter.report(int(p["progress"])),
+                checkpoint=checkpoint,
             )
-            print(f"[Celery] 進度: {i * 10}%")
         
-        return {
-            "status": "success",
-            "task_id": task_id,
-            "url": url,
-            "format": format,
-            "filename": f"video_{task_id[:8]}.{format}"
-        }
+        timings = {"download": round(time.monotonic() - started, 3)}
+        
+        if needs_transcode(result["filename"], format):
+            keep_lease_queued()
+            report_task(task_id, stage="transcoding", timings=timings)
+            dispatch_transcode(
+                store.get(task_id) or {"id": task_id, "url": url, "format": format, "quality": quality},
+                source=result["filename"],
+                vcodec=result["vcodec"],
+                acodec=result["acodec"],
+                title=result["info"].get("title"),
+                duration=result["info"].get("duration"),
+                timings=timings,
+                handed_off_at=time.time(),
+            )
+            keep_lease = True
+            return {"status": "transcoding", "task_id": task_id, "filename": result["filename"], "timings": timings}
+        
+        return complete_download(task_id, url, format, quality, result["filename"], result["size"],
+                                 result["info"], timings)
+    except SoftTimeLimitExceeded:
+        if continuation >= settings.DOWNLOAD_MAX_CONTINUATIONS:
+            report_task(task_id, status="failed")
+            return {"status": "error", "task_id": task_id, "error": "下載超出最長執行時間"}
+        # 斷點已由下載引擎寫出；以相同任務 ID 重新排隊，路由與優先級不變
+        keep_lease = True
+        keep_lease_queued()
+        report_task(task_id, status="queued")
+        self.apply_async(
+            kwargs={
+                "task_id": task_id,
+                "url": url,
+                "format": format,
+                "quality": quality,
+                "duration": duration,
+                "continuation": continuation + 1,
+            },
+            task_id=celery_task_id,
+            priority=(self.request.delivery_info or {}).get("priority"),
+        )
+        return {"status": "requeued", "task_id": task_id, "continuation": continuation + 1}
+    except (DownloadError, InsufficientStorage) as e:
+        if isinstance(e, VideoUnavailable) or self.request.retries >= settings.DOWNLOAD_MAX_RETRIES:
+            report_task(task_id, status="failed")
+            return {"status": "error", "task_id": task_id, "error": str(e)}
+        keep_lease = True
+        keep_lease_queued()
+        report_task(task_id, status="queued")
+        raise self.retry(
+            exc=e,
+            countdown=settings.DOWNLOAD_RETRY_BACKOFF * 2 ** self.request.retries,
+            max_retries=settings.DOWNLOAD_MAX_RETRIES,
+        )
     except Exception as e:
+        report_task(task_id, status="failed")
         return {
             "status": "error",
             "task_id": task_id,
             "error": str(e)
         }
+    finally:
+        # 文件已完成（已計入索引）或下載中止，預留不再需要
+        storage.release(task_id)
+        # 結果已寫入緩存後才釋放租約，之後的相同請求會直接命中緩存；重試、續排或移交轉碼時保留租約
+        if lease_key and not keep_lease:
+            registry.release(lease_key, task_id)
 
 @shared_task
 def test_task():
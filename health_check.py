@@ -2,23 +2,43 @@
 """
 YouTube Downloader Web 健康檢查模塊
 用於各服務的基礎功能檢測
+
+各項檢查在線程池中併發執行：每項檢查有自己的時限（check_timeout），整體另有時限（total_timeout），
+超時的檢查記為 UNHEALTHY，不等待其結束。數據庫連接、Redis 連接池、HTTP 會話與 Celery 應用
+在同一個 HealthChecker 的多次檢查之間復用；檢查超時後丟棄它佔用的數據庫連接與 broker 連接。
 """
 
 import sys
 import os
 import json
+import math
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
-from typing import Dict
+from typing import Callable, Dict, Optional
 
 class HealthChecker:
-    def __init__(self, log_dir: str = "tests/logs", environment: str = "docker"):
+    def __init__(self, log_dir: str = "tests/logs", environment: str = "docker",
+                 check_timeout: float = 5.0, total_timeout: float = 15.0):
         """
         environment: "docker" 或 "host"
         - "docker": 在 Docker 容器中使用，使用容器名稱作為主機名
         - "host": 在宿主機中使用，使用 localhost 作為主機名
+        check_timeout: 單項檢查的時限（秒），同時用作各客戶端的連接 / 讀取超時
+        total_timeout: 一次 run_all_checks 的總時限（秒）
         """
         self.log_dir = log_dir
+        self.check_timeout = check_timeout
+        self.total_timeout = total_timeout
+        self._log_lock = threading.Lock()
+        self._client_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._db_conn = None
+        self._redis = None
+        self._http = None
+        self._celery_app = None
+        self._celery_conn = None
         os.makedirs(log_dir, exist_ok=True)
         self.log_file = os.path.join(log_dir, f"health_check_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
         self.results = {
@@ -57,29 +77,125 @@ class HealthChecker:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_message = f"[{timestamp}] [{level}] {message}"
         
-        print(log_message)
-        with open(self.log_file, 'a') as f:
-            f.write(log_message + "\n")
-            
-        # 同時寫入主日誌
-        main_log = os.path.join(self.log_dir, "health_check.log")
-        with open(main_log, 'a') as f:
-            f.write(log_message + "\n")
+        # 各項檢查在不同線程中記錄日誌，逐行寫入避免交錯
+        with self._log_lock:
+            print(log_message)
+            with open(self.log_file, 'a') as f:
+                f.write(log_message + "\n")
+                
+            # 同時寫入主日誌
+            main_log = os.path.join(self.log_dir, "health_check.log")
+            with open(main_log, 'a') as f:
+                f.write(log_message + "\n")
+    
+    def _get_db_connection(self):
+        """復用數據庫連接，連接已關閉時重新建立"""
+        with self._client_lock:
+            if self._db_conn is None or self._db_conn.closed:
+                import psycopg2
+                self._db_conn = psycopg2.connect(
+                    host=os.getenv('DB_HOST', self.default_db_host),
+                    port=os.getenv('DB_PORT', '5432'),
+                    database=os.getenv('DB_NAME', 'youtube_downloader'),
+                    user=os.getenv('DB_USER', 'postgres'),
+                    password=os.getenv('DB_PASSWORD', 'postgres'),
+                    connect_timeout=max(1, math.ceil(self.check_timeout)),
+                    options=f"-c statement_timeout={int(self.check_timeout * 1000)}"
+                )
+                self._db_conn.autocommit = True
+            return self._db_conn
+    
+    def _reset_db_connection(self, conn=None):
+        """關閉復用的數據庫連接；指定 conn 時只在它仍是當前連接時才丟棄當前連接"""
+        with self._client_lock:
+            if conn is not None and conn is not self._db_conn:
+                # 超時後已被替換的舊連接，不影響之後建立的新連接
+                targets = [conn]
+            else:
+                targets = [self._db_conn]
+                self._db_conn = None
+            for target in targets:
+                if target is not None:
+                    try:
+                        target.close()
+                    except Exception:
+                        pass
+    
+    def _reset_celery_connection(self):
+        """丟棄復用的 broker 連接，下次檢查重新建立"""
+        with self._client_lock:
+            if self._celery_conn is not None:
+                try:
+                    self._celery_conn.release()
+                except Exception:
+                    pass
+                self._celery_conn = None
+    
+    def _get_redis(self):
+        """Redis 客戶端自帶連接池，多次檢查之間復用"""
+        with self._client_lock:
+            if self._redis is None:
+                import redis
+                self._redis = redis.Redis(
+                    host=os.getenv('REDIS_HOST', self.default_redis_host),
+                    port=int(os.getenv('REDIS_PORT', '6379')),
+                    db=int(os.getenv('REDIS_DB', '0')),
+                    socket_timeout=self.check_timeout,
+                    socket_connect_timeout=self.check_timeout
+                )
+            return self._redis
+    
+    def _get_http(self):
+        """HTTP 會話復用 keep-alive 連接（API、Flower、前端）"""
+        with self._client_lock:
+            if self._http is None:
+                import requests
+                self._http = requests.Session()
+            return self._http
+    
+    def _get_celery_connection(self):
+        """復用 broker 連接發送控制命令；連接失敗時只嘗試一次，不使用 kombu 的無限重連"""
+        with self._client_lock:
+            if self._celery_app is None:
+                sys.path.insert(0, '/app')
+                from celery_app import celery_app
+                self._celery_app = celery_app
+            if self._celery_conn is None:
+                self._celery_conn = self._celery_app.connection_for_write(connect_timeout=self.check_timeout)
+            conn = self._celery_conn
+        try:
+            conn.ensure_connection(max_retries=1)
+        except Exception:
+            with self._client_lock:
+                if self._celery_conn is conn:
+                    self._celery_conn = None
+            conn.release()
+            raise
+        return self._celery_app, conn
+    
+    def close(self):
+        """關閉線程池與復用的連接"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._reset_db_connection()
+        with self._client_lock:
+            if self._redis is not None:
+                self._redis.close()
+                self._redis = None
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+        self._reset_celery_connection()
     
     def check_database(self) -> Dict:
         """檢查數據庫連接"""
         self.log("檢查數據庫連接...")
         start_time = time.time()
         
+        conn = None
         try:
-            import psycopg2
-            conn = psycopg2.connect(
-                host=os.getenv('DB_HOST', self.default_db_host),
-                port=os.getenv('DB_PORT', '5432'),
-                database=os.getenv('DB_NAME', 'youtube_downloader'),
-                user=os.getenv('DB_USER', 'postgres'),
-                password=os.getenv('DB_PASSWORD', 'postgres')
-            )
+            conn = self._get_db_connection()
             
             cursor = conn.cursor()
             cursor.execute("SELECT version(), NOW()")
@@ -89,7 +205,6 @@ class HealthChecker:
             test_result = cursor.fetchone()[0]
             
             cursor.close()
-            conn.close()
             
             elapsed = time.time() - start_time
             
@@ -102,6 +217,8 @@ class HealthChecker:
             self.log(f"數據庫檢查通過: {result['version']}")
             
         except Exception as e:
+            # 連接可能已失效，下次檢查重新建立
+            self._reset_db_connection(conn)
             elapsed = time.time() - start_time
             result = {
                 "status": "UNHEALTHY",
@@ -119,12 +236,7 @@ class HealthChecker:
         start_time = time.time()
         
         try:
-            import redis
-            r = redis.Redis(
-                host=os.getenv('REDIS_HOST', self.default_redis_host),
-                port=int(os.getenv('REDIS_PORT', '6379')),
-                db=int(os.getenv('REDIS_DB', '0'))
-            )
+            r = self._get_redis()
             
             ping_result = r.ping()
             
@@ -166,13 +278,13 @@ class HealthChecker:
         start_time = time.time()
         
         try:
-            import requests
+            http = self._get_http()
             base_url = os.getenv('API_URL', self.default_api_url)
             
-            health_response = requests.get(f"{base_url}/health", timeout=5)
+            health_response = http.get(f"{base_url}/health", timeout=self.check_timeout)
             health_data = health_response.json() if health_response.status_code == 200 else {}
             
-            api_response = requests.get(f"{base_url}/api/download/test", timeout=5)
+            api_response = http.get(f"{base_url}/api/download/test", timeout=self.check_timeout)
             api_data = api_response.json() if api_response.status_code == 200 else {}
             
             elapsed = time.time() - start_time
@@ -210,14 +322,10 @@ class HealthChecker:
         start_time = time.time()
         
         try:
-            import sys
-            sys.path.insert(0, '/app')
-            
-            from celery_app import celery_app
+            celery_app, connection = self._get_celery_connection()
             
-            from celery import current_app
-            
-            inspect = current_app.control.inspect()
+            # 廣播後最多等待的回覆時間，留出時限的一部分給連接 broker
+            inspect = celery_app.control.inspect(timeout=max(0.5, self.check_timeout / 2), connection=connection)
             stats = inspect.stats() or {}
             
             elapsed = time.time() - start_time
@@ -250,19 +358,20 @@ class HealthChecker:
         return result
     
     def check_flower(self, max_retries: int = 3, retry_delay: int = 5) -> Dict:
-        """檢查 Flower 監控，帶重試機制"""
+        """檢查 Flower 監控，帶重試機制；重試與等待都不超過單項檢查的時限"""
         self.log("檢查 Flower 監控...")
         
         last_exception = None
+        deadline = time.time() + self.check_timeout
         
         for attempt in range(max_retries):
             start_time = time.time()
             
             try:
-                import requests
+                http = self._get_http()
                 flower_url = os.getenv('FLOWER_URL', self.default_flower_url)
                 
-                response = requests.get(flower_url, timeout=10)
+                response = http.get(flower_url, timeout=max(0.1, deadline - start_time))
                 elapsed = time.time() - start_time
                 
                 result = {
@@ -284,6 +393,8 @@ class HealthChecker:
                 self.log(f"Flower 檢查嘗試 {attempt + 1}/{max_retries} 失敗: {e}", "WARNING")
             
             if attempt < max_retries - 1:
+                if time.time() + retry_delay >= deadline:
+                    break
                 time.sleep(retry_delay)
         
         result = {
@@ -301,10 +412,10 @@ class HealthChecker:
         start_time = time.time()
         
         try:
-            import requests
+            http = self._get_http()
             frontend_url = os.getenv('FRONTEND_URL', self.default_frontend_url)
             
-            response = requests.get(frontend_url, timeout=10)
+            response = http.get(frontend_url, timeout=self.check_timeout)
             elapsed = time.time() - start_time
             
             is_html = 'text/html' in response.headers.get('Content-Type', '')
@@ -335,8 +446,17 @@ class HealthChecker:
         
         return result
     
+    def _timed_check(self, check_func: Callable[[], Dict]) -> Dict:
+        start_time = time.perf_counter()
+        try:
+            result = check_func()
+        except Exception as e:
+            result = {"status": "UNHEALTHY", "error": str(e), "details": "檢查執行失敗"}
+        result["latency_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+        return result
+    
     def run_all_checks(self) -> Dict:
-        """運行所有健康檢查"""
+        """併發運行所有健康檢查，在總時限內返回"""
         self.log("開始全面健康檢查...")
         
         checks = {
@@ -348,21 +468,57 @@ class HealthChecker:
             "frontend": self.check_frontend
         }
         
-        all_healthy = True
+        # 上一次運行中超時的檢查可能仍佔用線程，線程數留出餘量
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(checks) * 2, thread_name_prefix="health-check")
         
-        for service_name, check_func in checks.items():
-            self.log(f"\n檢查 {service_name}...")
-            result = check_func()
+        self.results = {
+            "timestamp": datetime.now().isoformat(),
+            "services": {},
+            "overall": "UNKNOWN"
+        }
+        
+        start_time = time.perf_counter()
+        total_deadline = start_time + self.total_timeout
+        futures = {
+            service_name: self._executor.submit(self._timed_check, check_func)
+            for service_name, check_func in checks.items()
+        }
+        
+        for service_name, future in futures.items():
+            # 各項檢查同時開始，單項時限從整體開始時間起算
+            deadline = min(start_time + self.check_timeout, total_deadline)
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            except FutureTimeoutError:
+                future.cancel()
+                elapsed = time.perf_counter() - start_time
+                result = {
+                    "status": "UNHEALTHY",
+                    "response_time": f"{elapsed:.3f}s",
+                    "latency_ms": round(elapsed * 1000, 1),
+                    "timed_out": True,
+                    "error": "檢查超時",
+                    "details": f"{service_name} 在 {deadline - start_time:.1f}s 內未返回"
+                }
+                self.log(f"{service_name} 檢查超時", "ERROR")
+                # 超時的檢查仍在線程中運行並佔用共享連接，丟棄連接使其儘快失敗，下次檢查重新建立
+                if service_name == "database":
+                    self._reset_db_connection()
+                elif service_name == "celery":
+                    self._reset_celery_connection()
             self.results["services"][service_name] = result
-            
-            if result["status"] != "HEALTHY":
-                all_healthy = False
+        
+        total_time = time.perf_counter() - start_time
+        all_healthy = all(s["status"] == "HEALTHY" for s in self.results["services"].values())
         
         self.results["overall"] = "HEALTHY" if all_healthy else "UNHEALTHY"
         self.results["summary"] = {
             "total_services": len(checks),
             "healthy_services": sum(1 for s in self.results["services"].values() if s["status"] == "HEALTHY"),
-            "unhealthy_services": sum(1 for s in self.results["services"].values() if s["status"] != "HEALTHY")
+            "unhealthy_services": sum(1 for s in self.results["services"].values() if s["status"] != "HEALTHY"),
+            "total_time": f"{total_time:.3f}s",
+            "total_latency_ms": round(total_time * 1000, 1)
         }
         
         result_file = os.path.join(self.log_dir, f"health_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
@@ -372,6 +528,7 @@ class HealthChecker:
         self.log(f"\n健康檢查完成！結果已保存到: {result_file}")
         self.log(f"總體狀態: {self.results['overall']}")
         self.log(f"健康服務: {self.results['summary']['healthy_services']}/{self.results['summary']['total_services']}")
+        self.log(f"總耗時: {self.results['summary']['total_time']}")
         
         return self.results
     
@@ -383,11 +540,13 @@ class HealthChecker:
         print(f"檢查時間: {self.results['timestamp']}")
         print(f"總體狀態: {self.results['overall']}")
         print(f"健康服務: {self.results['summary']['healthy_services']}/{self.results['summary']['total_services']}")
+        print(f"總耗時: {self.results['summary']['total_time']}")
         print("-"*60)
         
         for service_name, result in self.results["services"].items():
             status_icon = "✅" if result["status"] == "HEALTHY" else "❌"
-            print(f"{status_icon} {service_name.upper():12} {result['status']:10} {result.get('response_time', 'N/A'):8} {result.get('details', '')}")
+            latency = f"{result['latency_ms']:.0f}ms" if "latency_ms" in result else "N/A"
+            print(f"{status_icon} {service_name.upper():12} {result['status']:10} {latency:>8} {result.get('details', '')}")
         
         print("="*60)
         
@@ -408,8 +567,13 @@ if __name__ == "__main__":
     in_docker = os.path.exists('/.dockerenv')
     environment = "docker" if in_docker else "host"
     
-    checker = HealthChecker(environment=environment)
+    checker = HealthChecker(
+        environment=environment,
+        check_timeout=float(os.getenv('HEALTH_CHECK_TIMEOUT', '5')),
+        total_timeout=float(os.getenv('HEALTH_CHECK_TOTAL_TIMEOUT', '15'))
+    )
     checker.run_all_checks()
     checker.print_summary()
+    checker.close()
     
     sys.exit(0 if checker.results["overall"] == "HEALTHY" else 1)
\ No newline at end of file
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+下載 API 負載測試（完全離線）
+
+在進程內啟動 FastAPI 應用，Celery 使用內存 broker（memory://，沒有 worker 消費，任務停留在排隊狀態），
+任務存儲使用內存後端，不需要 Redis、數據庫或網絡。
+
+按順序以指定併發數壓測各端點：
+    create   POST   /api/download/tasks         （每個請求一個不同的影片）
+    get      GET    /api/download/tasks/{id}
+    list     GET    /api/download/tasks?limit=50
+    formats  GET    /api/download/formats
+    delete   DELETE /api/download/tasks/{id}
+報告每個端點的 p50 / p95 / p99 延遲與每秒請求數，並把結果（含當前提交）寫入 JSON；
+傳入 --baseline 時與之前保存的結果逐項比較。
+
+用法: python tests/benchmarks/bench_api_load.py [--requests 2000] [--concurrency 1,16,64]
+                                              [--output result.json] [--baseline previous.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+WORK_DIR = tempfile.mkdtemp(prefix="bench-api-load-")
+os.environ.update({
+    "CELERY_BROKER_URL": "memory://",
+    "CELERY_RESULT_BACKEND": "cache+memory://",
+    "TASK_STORE_BACKEND": "memory",
+    "TASK_HISTORY_ENABLED": "false",
+    "DATABASE_URL": f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}",
+    "DOWNLOAD_DIR": os.path.join(WORK_DIR, "downloads"),
+    "LOG_DIR": os.path.join(WORK_DIR, "logs"),
+    "LOG_LEVEL": "WARNING",
+})
+
+import httpx  # noqa: E402
+
+from main import app  # noqa: E402
+
+# memory:// 沒有主機名，kombu 每建立一個連接都會警告一次
+logging.getLogger("kombu").setLevel(logging.ERROR)
+
+ENDPOINTS = ["create", "get", "list", "formats", "delete"]
+FORMATS = ["mp4", "mp3", "webm"]
+QUALITIES = ["360p", "720p", "1080p"]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "max_ms": round(max(latencies), 3),
+    }
+
+
+async def run_endpoint(client: httpx.AsyncClient, endpoint: str, total: int, concurrency: int,
+                       task_ids: List[str], run: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(total))
+
+    def build(i: int):
+        if endpoint == "create":
+            return "POST", "/api/download/tasks", {
+                "url": f"https://www.youtube.com/watch?v=b{run:02d}{i:08d}",
+                "format": FORMATS[i % len(FORMATS)],
+                "quality": QUALITIES[i % len(QUALITIES)],
+            }
+        if endpoint == "get":
+            return "GET", f"/api/download/tasks/{random.choice(task_ids)}", None
+        if endpoint == "list":
+            return "GET", "/api/download/tasks?limit=50", None
+        if endpoint == "formats":
+            return "GET", "/api/download/formats", None
+        return "DELETE", f"/api/download/tasks/{task_ids[i]}", None
+
+    async def client_loop() -> None:
+        nonlocal errors
+        for i in remaining:
+            method, path, body = build(i)
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+            elif endpoint == "create":
+                task_ids.append(response.json()["id"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_all(requests: int, concurrency_levels: List[int]) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # 預熱：路由、依賴與 Celery 連接的首次初始化不計入結果
+        await client.get("/api/download/formats")
+        for run, concurrency in enumerate(concurrency_levels):
+            task_ids: List[str] = []
+            for endpoint in ENDPOINTS:
+                # 每個任務只能刪除一次，delete 的請求數以 create 成功的任務數為上限
+                total = min(requests, len(task_ids)) if endpoint == "delete" else requests
+                stats = await run_endpoint(client, endpoint, total, concurrency, task_ids, run)
+                results.setdefault(endpoint, {})[str(concurrency)] = stats
+                print(
+                    f"{endpoint:>8} {concurrency:>5} {stats['rps']:>9.0f} {stats['p50_ms']:>8.2f} "
+                    f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['errors']:>7}"
+                )
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline_path: str) -> None:
+    """與基線結果比較 p99 延遲與吞吐量的變化（百分比）"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n與 {baseline_path}（{baseline.get('commit')}）比較:")
+    print(f"{'endpoint':>8} {'conc':>5} {'rps':>9} {'p99':>9}")
+    for endpoint, levels in results.items():
+        for concurrency, stats in levels.items():
+            previous = baseline.get("results", {}).get(endpoint, {}).get(concurrency)
+            if not previous:
+                continue
+            rps = (stats["rps"] / previous["rps"] - 1) * 100 if previous["rps"] else 0.0
+            p99 = (stats["p99_ms"] / previous["p99_ms"] - 1) * 100 if previous["p99_ms"] else 0.0
+            print(f"{endpoint:>8} {concurrency:>5} {rps:>+8.1f}% {p99:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="每個端點在每個併發級別下的請求數")
+    parser.add_argument("--concurrency", default="1,16,64")
+    parser.add_argument("--output", help="結果 JSON 路徑（默認 tests/benchmarks/results/api_load-<提交>.json）")
+    parser.add_argument("--baseline", help="用於比較的結果 JSON")
+    args = parser.parse_args()
+
+    concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+    commit = git_commit()
+
+    print(f"{'endpoint':>8} {'conc':>5} {'req/s':>9} {'p50(ms)':>8} {'p95(ms)':>8} {'p99(ms)':>8} {'errors':>7}")
+    results = asyncio.run(run_all(args.requests, concurrency_levels))
+
+    output = args.output or os.path.join(ROOT, "tests", "benchmarks", "results", f"api_load-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "benchmark": "api_load",
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "concurrency": concurrency_levels,
+            "results": results,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\n結果已保存到 {output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+API 與 worker 進程的冷啟動導入耗時
+
+每個場景在新的解釋器中以 python -X importtime 執行 --runs 次，報告頂層導入累計耗時的中位數，
+並列出最慢的模塊：
+    api              import main（uvicorn 加載應用）
+    worker           import celery_app, tasks（worker 主進程加載應用與任務模塊）
+    worker-preload   worker_init 中在 fork 前預載 yt-dlp 提取器與數據庫模型
+    child-first-use  未預載時子進程第一次提取前導入 yt-dlp 的耗時（預載後子進程不再承擔）
+
+用法: python tests/benchmarks/bench_cold_start.py [--runs 5] [--top 10]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from tests.support.importtime import format_report, import_profile  # noqa: E402
+
+WORK_DIR = tempfile.mkdtemp(prefix="bench-cold-start-")
+ENV = {
+    "CELERY_BROKER_URL": "memory://",
+    "CELERY_RESULT_BACKEND": "cache+memory://",
+    "TASK_STORE_BACKEND": "memory",
+    "DATABASE_URL": f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}",
+    "DOWNLOAD_DIR": os.path.join(WORK_DIR, "downloads"),
+    "LOG_DIR": os.path.join(WORK_DIR, "logs"),
+}
+
+# 場景 -> (執行的語句, 計入耗時的頂層模塊)
+SCENARIOS = {
+    "api": ("import main", ["main"]),
+    "worker": ("import celery_app, tasks", ["celery_app", "tasks"]),
+    "worker-preload": (
+        "import celery_app, tasks; celery_app.preload_worker_modules()",
+        ["yt_dlp", "core.task_history"],
+    ),
+    "child-first-use": ("import celery_app, tasks; import yt_dlp", ["yt_dlp"]),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="每個場景列出的最慢模塊數")
+    args = parser.parse_args()
+
+    reports = {}
+    print(f"{'scenario':>16} {'median(ms)':>11} {'min(ms)':>9} {'modules':>8}")
+    for name, (statement, roots) in SCENARIOS.items():
+        samples = []
+        for _ in range(args.runs):
+            profile = import_profile(statement, ENV)
+            samples.append(sum(profile[root].cumulative_us for root in roots if root in profile) / 1000)
+        reports[name] = profile
+        print(f"{name:>16} {statistics.median(samples):>11.1f} {min(samples):>9.1f} {len(profile):>8}")
+
+    for name in ("api", "worker"):
+        print(f"\n{name} 最慢的模塊（累計）:")
+        print(format_report(reports[name], args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+/downloads 文件分發吞吐量基準測試
+
+在本地端口分別啟動舊的 StaticFiles 掛載與新的分發路由（uvicorn），
+比較整文件下載吞吐量、單區間請求延遲，以及新路由的多區間與條件請求。
+
+用法: python tests/benchmarks/bench_file_delivery.py [--size-mb 256] [--repeat 5]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+DOWNLOAD_DIR = tempfile.mkdtemp(prefix="bench-downloads-")
+os.environ["DOWNLOAD_DIR"] = DOWNLOAD_DIR
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.staticfiles import StaticFiles  # noqa: E402
+
+from main import app  # noqa: E402
+
+FILENAME = "bench.mp4"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(asgi_app) -> str:
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+def full_download(client: httpx.Client, url: str, headers=None) -> int:
+    size = 0
+    with client.stream("GET", url, headers=headers) as response:
+        for chunk in response.iter_raw(1024 * 1024):
+            size += len(chunk)
+    return size
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    with open(os.path.join(DOWNLOAD_DIR, FILENAME), "wb") as f:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size_mb):
+            f.write(block)
+
+    static_app = FastAPI()
+    static_app.mount("/downloads", StaticFiles(directory=DOWNLOAD_DIR), name="downloads")
+    targets = {"StaticFiles": serve(static_app), "分發路由": serve(app)}
+
+    print(f"文件大小: {args.size_mb} MiB，重複 {args.repeat} 次取中位數")
+    print(f"{'實現':<12}{'整文件 MB/s':>14}{'單區間 ms':>12}{'多區間 ms':>12}{'304 ms':>10}")
+    with httpx.Client(timeout=60) as client:
+        for name, base in targets.items():
+            url = f"{base}/downloads/{FILENAME}"
+            # 預熱，同時讓新路由在後台完成摘要計算
+            assert full_download(client, url) == size
+            time.sleep(0.5)
+
+            full = timed(lambda: full_download(client, url), args.repeat)
+            single = timed(lambda: client.get(url, headers={"Range": "bytes=1048576-2097151"}), args.repeat)
+            multi = timed(
+                lambda: client.get(url, headers={"Range": "bytes=0-65535,10485760-10551295,-65536"}),
+                args.repeat,
+            )
+            etag = client.head(url).headers.get("etag")
+            conditional = timed(lambda: client.get(url, headers={"If-None-Match": etag or ""}), args.repeat)
+            multi_status = client.get(url, headers={"Range": "bytes=0-1,10-11"}).status_code
+            print(
+                f"{name:<12}{size / full / 1e6:>14.1f}{single * 1000:>12.2f}"
+                f"{multi * 1000:>12.2f}{conditional * 1000:>10.2f}"
+                f"   (多區間狀態碼 {multi_status}, ETag {etag})"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+任務歷史查詢的事件循環延遲基準測試
+
+在臨時 SQLite 數據庫中寫入大量歷史記錄，以多個併發客戶端查詢
+GET /api/download/history（異步會話），同時以探針協程測量事件循環的調度延遲；
+對照組是在 async def 中直接使用同步會話的同一查詢（每次查詢都阻塞事件循環）。
+
+異步路徑下事件循環延遲應保持在毫秒級，與併發數無關。
+
+用法: python tests/benchmarks/bench_history_async.py [--rows 200000] [--concurrency 32] [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+DATABASE_DIR = tempfile.mkdtemp(prefix="bench-history-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DATABASE_DIR, 'history.db')}"
+os.environ["TASK_HISTORY_ENABLED"] = "false"
+
+import httpx  # noqa: E402
+from fastapi import Depends  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from db.base import Base, SessionLocal, dispose_async_engine, engine, get_db  # noqa: E402
+from main import app  # noqa: E402
+from models import DownloadTaskRecord  # noqa: E402
+
+STATUSES = ["completed", "completed", "completed", "failed", "queued"]
+PROBE_INTERVAL = 0.005
+
+
+@app.get("/bench/history-blocking")
+async def list_history_blocking(status: str = None, video_id: str = None, limit: int = 50,
+                                db: Session = Depends(get_db)):
+    """對照組：async def 中的同步查詢，執行期間事件循環無法調度其他協程"""
+    query = db.query(DownloadTaskRecord)
+    if status:
+        query = query.filter(DownloadTaskRecord.status == status)
+    if video_id:
+        query = query.filter(DownloadTaskRecord.video_id == video_id)
+    rows = query.order_by(DownloadTaskRecord.created_at.desc(), DownloadTaskRecord.id.desc()).limit(limit).all()
+    return {"items": [row.id for row in rows]}
+
+
+def populate(rows: int, videos: int) -> None:
+    Base.metadata.create_all(engine)
+    base = datetime(2025, 1, 1)
+    with SessionLocal() as session:
+        for start in range(0, rows, 10000):
+            session.bulk_insert_mappings(DownloadTaskRecord, [
+                {
+                    "id": f"{i:08x}",
+                    "kind": "download",
+                    "url": f"https://www.youtube.com/watch?v=v{i % videos:010d}",
+                    "video_id": f"v{i % videos:010d}",
+                    "format": "mp4",
+                    "quality": "720p",
+                    "status": STATUSES[i % len(STATUSES)],
+                    "progress": 100,
+                    "created_at": base + timedelta(seconds=i),
+                }
+                for i in range(start, min(start + 10000, rows))
+            ])
+            session.commit()
+
+
+def percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def probe(lags, stop: asyncio.Event) -> None:
+    """每 PROBE_INTERVAL 秒喚醒一次，記錄實際喚醒比預期晚了多少（毫秒）"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append((loop.time() - expected) * 1000)
+
+
+async def run(path: str, concurrency: int, total: int, videos: int):
+    latencies = []
+    lags = []
+    stop = asyncio.Event()
+    remaining = iter(range(total))
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        for _ in remaining:
+            if random.random() < 0.5:
+                params = {"status": random.choice(["failed", "queued"]), "limit": 50}
+            else:
+                params = {"video_id": f"v{random.randrange(videos):010d}", "limit": 50}
+            start = time.perf_counter()
+            response = await client.get(path, params=params)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        prober = asyncio.create_task(probe(lags, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+    return latencies, lags, elapsed
+
+
+async def compare(args) -> None:
+    print(f"{'path':>28} {'req/s':>8} {'p50(ms)':>8} {'p99(ms)':>8} {'lag p50':>8} {'lag p99':>8} {'lag max':>8}")
+    for path in ("/bench/history-blocking", "/api/download/history"):
+        latencies, lags, elapsed = await run(path, args.concurrency, args.requests, args.videos)
+        print(
+            f"{path:>28} {len(latencies) / elapsed:>8.0f} "
+            f"{statistics.median(latencies):>8.2f} {percentile(latencies, 0.99):>8.2f} "
+            f"{statistics.median(lags):>8.2f} {percentile(lags, 0.99):>8.2f} {max(lags):>8.2f}"
+        )
+    # aiosqlite 的連接線程在連接池關閉後才退出
+    await dispose_async_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--videos", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"寫入 {args.rows} 條歷史記錄到 {DATABASE_DIR} ...")
+    populate(args.rows, args.videos)
+
+    asyncio.run(compare(args))
+
+
+if __name__ == "__main__":
+    main()
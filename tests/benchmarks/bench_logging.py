@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+日誌調用開銷基準測試
+
+比較三種配置下每次 logger.info() 在調用線程中的耗時：
+- sync-text   原來的方式：RotatingFileHandler 在調用線程中格式化、寫入並輪轉
+- sync-json   同步寫出 JSON 記錄
+- async-json  QueueHandler 入隊，由 QueueListener 線程格式化與寫出（LOG_MODE=async）
+
+每種配置先以普通消息測量，再以帶 rate_limit_key 的進度消息測量（大部分被限流，不進入隊列）。
+--fsync 在每次寫出後調用 os.fsync，模擬慢磁盤；文件大小上限設得較小以觸發頻繁輪轉。
+
+用法: python tests/benchmarks/bench_logging.py [--calls 20000] [--threads 4] [--fsync]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+os.environ["LOG_DIR"] = tempfile.mkdtemp(prefix="bench-logging-")
+os.environ["LOG_MAX_BYTES"] = str(1024 * 1024)
+
+import logging_config  # noqa: E402
+
+MODES = [("sync-text", "sync", "text"), ("sync-json", "sync", "json"), ("async-json", "async", "json")]
+
+
+class FsyncFilter(logging.Filter):
+    """每條記錄寫出後 fsync（掛在文件處理器上，記錄已寫入流之後的下一條記錄前執行）"""
+
+    def __init__(self, handler: logging.StreamHandler):
+        super().__init__()
+        self.handler = handler
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        stream = self.handler.stream
+        if stream is not None:
+            stream.flush()
+            os.fsync(stream.fileno())
+        return True
+
+
+def configure(mode: str, log_format: str, fsync: bool) -> None:
+    logging_config.setup_logging("bench.log", mode=mode, log_format=log_format, level="INFO")
+    handlers = logging_config._listener.handlers if logging_config._listener else logging.getLogger().handlers
+    for handler in handlers:
+        if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+            # 不測量終端輸出
+            handler.setLevel(logging.CRITICAL)
+        elif fsync and isinstance(handler, logging.FileHandler):
+            handler.addFilter(FsyncFilter(handler))
+
+
+def percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def measure(calls: int, threads: int, progress: bool):
+    """多個線程同時記錄日誌，返回每次調用的耗時（微秒）與總耗時"""
+    logger = logging.getLogger("bench")
+    samples = []
+    lock = threading.Lock()
+
+    def worker(index: int) -> None:
+        local = []
+        for i in range(calls // threads):
+            extra = {"rate_limit_key": f"progress:{index}"} if progress else {"task_id": f"task-{index}"}
+            start = time.perf_counter_ns()
+            logger.info("下載進度 %d%% (%d / %d 字節)", i % 100, i * 65536, calls * 65536, extra=extra)
+            local.append((time.perf_counter_ns() - start) / 1000)
+        with lock:
+            samples.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--fsync", action="store_true")
+    args = parser.parse_args()
+
+    print(f"日誌目錄: {os.environ['LOG_DIR']}")
+    print(f"{'mode':>11} {'message':>9} {'mean(us)':>9} {'p50(us)':>8} {'p99(us)':>8} {'max(us)':>9} {'drain(s)':>9} {'dropped':>8}")
+    for name, mode, log_format in MODES:
+        for progress in (False, True):
+            configure(mode, log_format, args.fsync)
+            samples, elapsed = measure(args.calls, args.threads, progress)
+            dropped = logging_config.dropped_records()
+            # 異步模式下寫出線程清空隊列的時間（調用方不承擔）
+            drain_started = time.perf_counter()
+            logging_config.stop_logging()
+            drain = time.perf_counter() - drain_started
+            print(
+                f"{name:>11} {'progress' if progress else 'plain':>9} {statistics.mean(samples):>9.1f} "
+                f"{statistics.median(samples):>8.1f} {percentile(samples, 0.99):>8.1f} {max(samples):>9.1f} "
+                f"{drain:>9.3f} {dropped:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+GET /api/download/tasks 響應時間隨任務數量變化的基準測試
+
+比較舊的全量列表（store.list() + List[DownloadTask] 校驗）與新的游標分頁，
+分頁的首頁與深頁耗時應與任務總數無關。
+
+用法: python tests/benchmarks/bench_task_list.py [--sizes 100,1000,10000,50000]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from api.endpoints.download import DownloadTask  # noqa: E402
+from core.pagination import encode_cursor  # noqa: E402
+from core.task_store import InMemoryTaskStore, get_task_store  # noqa: E402
+from main import app  # noqa: E402
+
+FORMATS = ["mp4", "mp3", "webm", "avi"]
+STATUSES = ["queued", "processing", "completed", "failed"]
+
+
+def populate(store: InMemoryTaskStore, size: int) -> None:
+    base = datetime(2025, 1, 1)
+    for i in range(size):
+        store.create({
+            "id": f"{i:08x}",
+            "url": f"https://www.youtube.com/watch?v=video{i}",
+            "format": FORMATS[i % len(FORMATS)],
+            "quality": "720p",
+            "status": STATUSES[i % len(STATUSES)],
+            "created_at": (base + timedelta(seconds=i)).isoformat(),
+            "progress": 0,
+            "download_url": None,
+        })
+
+
+def timed(fn, repeat: int) -> float:
+    """返回中位耗時（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000,50000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    adapter = TypeAdapter(List[DownloadTask])
+
+    print(f"{'tasks':>8} {'legacy_full(ms)':>16} {'first_page(ms)':>15} {'deep_page(ms)':>14} {'filtered(ms)':>13}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        store = InMemoryTaskStore()
+        populate(store, size)
+        app.dependency_overrides[get_task_store] = lambda: store
+
+        legacy = timed(lambda: adapter.dump_json(adapter.validate_python(store.list())), max(1, args.repeat // 5))
+        first = timed(lambda: client.get("/api/download/tasks?limit=50"), args.repeat)
+
+        # 取中間位置的游標，模擬翻到深頁
+        _, mid_key = store.list_page(size // 2)
+        deep_cursor = encode_cursor(mid_key)
+        deep = timed(lambda: client.get(f"/api/download/tasks?limit=50&cursor={deep_cursor}"), args.repeat)
+        filtered = timed(
+            lambda: client.get("/api/download/tasks?limit=50&status=completed&fields=id,status,progress"),
+            args.repeat,
+        )
+        print(f"{size:>8} {legacy:>16.2f} {first:>15.2f} {deep:>14.2f} {filtered:>13.2f}")
+
+    app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main()
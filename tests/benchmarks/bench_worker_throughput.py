@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+worker 下載吞吐量基準測試（本地假媒體源站）
+
+在本進程中啟動 tests/support/media_origin.py 的 MediaOrigin（可配置分片延遲、每連接帶寬與錯誤注入），
+對參數矩陣中的每一組配置啟動 --workers 個獨立進程（相當於 Celery prefork 子進程），
+每個進程依次以 download_youtube_video.apply() 執行 --tasks 個完整的下載任務
+（任務存儲、事件、文件索引與存儲預留都照常執行；broker 為 memory://，不需要 Redis 或網絡）。
+
+每組配置報告：
+    MB/s      所有下載字節數 / 第一個任務開始到最後一個任務結束的時間
+    CPU(s)    各 worker 進程執行任務期間的用戶態 + 內核態 CPU 時間之和
+    RSS(MB)   worker 進程的最大常駐內存
+    TTFB(ms)  任務開始到源站發出第一個媒體字節的時間（中位數，含元數據提取與清單請求）
+結果可用 --output 保存為 JSON。
+
+用法: python tests/benchmarks/bench_worker_throughput.py [--media hls,dash,progressive]
+        [--fragment-concurrency 1,4,8] [--buffer-size 1048576] [--http-chunk-size 10485760]
+        [--workers 1,2] [--tasks 2] [--segments 64] [--segment-size 1048576]
+        [--latency 0.02] [--bandwidth 0] [--error-rate 0] [--output result.json]
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, ROOT)
+
+# worker 進程以 spawn 啟動並重新導入本模塊，各組配置的環境變量由父進程在啟動前設置
+for key, value in {
+    "CELERY_BROKER_URL": "memory://",
+    "CELERY_RESULT_BACKEND": "cache+memory://",
+    "TASK_STORE_BACKEND": "memory",
+    "TASK_HISTORY_ENABLED": "false",
+    "LOG_LEVEL": "WARNING",
+    "LOG_MODE": "sync",
+}.items():
+    os.environ.setdefault(key, value)
+
+from tests.support.media_origin import MediaOrigin  # noqa: E402
+
+MEDIA_PATHS = {"hls": "video.m3u8", "dash": "video.mpd", "progressive": "progressive.mp4"}
+
+
+def worker_main(url: str, tasks: int, results) -> None:
+    """worker 進程：依次執行下載任務，返回每個任務的結果與本進程的資源使用"""
+    from core.downloader import get_downloader
+    from tasks.youtube import download_youtube_video
+
+    # 預熱：yt-dlp 的提取器註冊表與下載引擎在第一次使用時初始化，不計入結果
+    get_downloader().extract_info(f"{url}?t=warmup")
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    runs = []
+    for _ in range(tasks):
+        task_id = uuid.uuid4().hex[:8]
+        started_at = time.time()
+        started = time.perf_counter()
+        result = download_youtube_video.apply(kwargs={"task_id": task_id, "url": f"{url}?t={task_id}"}).get()
+        elapsed = time.perf_counter() - started
+        size = 0
+        if result.get("status") == "success":
+            path = os.path.join(os.environ["DOWNLOAD_DIR"], result["filename"])
+            size = os.path.getsize(path)
+            os.remove(path)
+        runs.append({"tag": f"t={task_id}", "status": result.get("status"), "size": size,
+                     "started_at": started_at, "seconds": elapsed})
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    results.put({
+        "runs": runs,
+        "cpu_seconds": (usage.ru_utime + usage.ru_stime) - (before.ru_utime + before.ru_stime),
+        # Linux 上 ru_maxrss 的單位為 KB
+        "max_rss_mb": usage.ru_maxrss / 1024,
+    })
+
+
+def run_cell(origin: MediaOrigin, cell: Dict[str, Any], tasks: int, work_dir: str) -> Dict[str, Any]:
+    download_dir = tempfile.mkdtemp(dir=work_dir)
+    os.environ.update({
+        "DOWNLOAD_DIR": download_dir,
+        "DATABASE_URL": f"sqlite:///{os.path.join(download_dir, 'bench.db')}",
+        "LOG_DIR": os.path.join(download_dir, "logs"),
+        "FRAGMENT_CONCURRENCY": str(cell["fragment_concurrency"]),
+        "DOWNLOAD_BUFFER_SIZE": str(cell["buffer_size"]),
+        "HTTP_CHUNK_SIZE": str(cell["http_chunk_size"]),
+    })
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    url = f"{origin.base_url}/{MEDIA_PATHS[cell['media']]}"
+    workers = [context.Process(target=worker_main, args=(url, tasks, results)) for _ in range(cell["workers"])]
+
+    for worker in workers:
+        worker.start()
+    reports = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    shutil.rmtree(download_dir, ignore_errors=True)
+
+    runs = [run for report in reports for run in report["runs"]]
+    # 從第一個任務開始到最後一個任務結束（不含進程啟動與預熱）
+    elapsed = max(run["started_at"] + run["seconds"] for run in runs) - min(run["started_at"] for run in runs)
+    total_bytes = sum(run["size"] for run in runs)
+    ttfb = [
+        (origin.first_byte[run["tag"]] - run["started_at"]) * 1000
+        for run in runs if run["tag"] in origin.first_byte
+    ]
+    return dict(
+        cell,
+        tasks=len(runs),
+        failed=sum(1 for run in runs if run["status"] != "success"),
+        bytes=total_bytes,
+        seconds=round(elapsed, 3),
+        mb_per_s=round(total_bytes / elapsed / 1024 / 1024, 2),
+        cpu_seconds=round(sum(report["cpu_seconds"] for report in reports), 3),
+        max_rss_mb=round(max(report["max_rss_mb"] for report in reports), 1),
+        ttfb_ms=round(statistics.median(ttfb), 1) if ttfb else None,
+    )
+
+
+def int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--media", default="hls,dash,progressive")
+    parser.add_argument("--fragment-concurrency", type=int_list, default=[1, 4, 8])
+    parser.add_argument("--buffer-size", type=int_list, default=[1024 * 1024])
+    parser.add_argument("--http-chunk-size", type=int_list, default=[10 * 1024 * 1024])
+    parser.add_argument("--workers", type=int_list, default=[1, 2])
+    parser.add_argument("--tasks", type=int, default=2, help="每個 worker 進程依次執行的任務數")
+    parser.add_argument("--segments", type=int, default=64)
+    parser.add_argument("--segment-size", type=int, default=1024 * 1024)
+    parser.add_argument("--latency", type=float, default=0.02, help="每個分片請求的延遲（秒）")
+    parser.add_argument("--bandwidth", type=int, default=0, help="每個連接的速率上限（字節每秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="媒體請求返回 503 的概率")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="結果 JSON 路徑")
+    args = parser.parse_args()
+
+    cells = [
+        {"media": media, "fragment_concurrency": fragments, "buffer_size": buffer_size,
+         "http_chunk_size": chunk_size, "workers": workers}
+        for media, fragments, buffer_size, chunk_size, workers in itertools.product(
+            args.media.split(","), args.fragment_concurrency, args.buffer_size, args.http_chunk_size, args.workers
+        )
+    ]
+    work_dir = tempfile.mkdtemp(prefix="bench-worker-")
+    origin = MediaOrigin(segments=args.segments, segment_size=args.segment_size, latency=args.latency,
+                         bandwidth=args.bandwidth, error_rate=args.error_rate, seed=args.seed)
+
+    print(f"媒體大小 {origin.media_size / 1024 / 1024:.1f} MB，{len(cells)} 組配置")
+    print(f"{'media':>12} {'frags':>5} {'buffer':>8} {'chunk':>9} {'workers':>7} {'MB/s':>8} "
+          f"{'CPU(s)':>7} {'RSS(MB)':>8} {'TTFB(ms)':>9} {'failed':>6}")
+    results = []
+    with origin:
+        for cell in cells:
+            result = run_cell(origin, cell, args.tasks, work_dir)
+            results.append(result)
+            ttfb = f"{result['ttfb_ms']:.1f}" if result["ttfb_ms"] is not None else "-"
+            print(
+                f"{cell['media']:>12} {cell['fragment_concurrency']:>5} {cell['buffer_size']:>8} "
+                f"{cell['http_chunk_size']:>9} {cell['workers']:>7} {result['mb_per_s']:>8.1f} "
+                f"{result['cpu_seconds']:>7.2f} {result['max_rss_mb']:>8.1f} {ttfb:>9} {result['failed']:>6}"
+            )
+        print(f"源站注入錯誤 {origin.errors} 次，共發送 {origin.bytes_sent / 1024 / 1024:.1f} MB")
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "worker_throughput",
+                "origin": {
+                    "segments": args.segments,
+                    "segment_size": args.segment_size,
+                    "latency": args.latency,
+                    "bandwidth": args.bandwidth,
+                    "error_rate": args.error_rate,
+                },
+                "tasks_per_worker": args.tasks,
+                "results": results,
+            }, f, indent=2)
+        print(f"結果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
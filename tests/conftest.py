@@ -0,0 +1,12 @@
+import os
+import sys
+
+# 單元測試不依賴 Redis：共享狀態使用進程內後端，Celery 使用內存 broker（投遞的任務沒有 worker 消費）
+os.environ.setdefault("TASK_STORE_BACKEND", "memory")
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+
+# 後端模塊以 backend/ 為根目錄導入（與 uvicorn / celery 的工作目錄一致）
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,42 @@
+"""
+python -X importtime 報告的採集與解析
+
+在以 backend/ 為工作目錄的新解釋器中執行語句，返回每個被導入模塊的自身耗時與累計耗時（微秒）。
+"""
+
+import os
+import subprocess
+import sys
+from typing import Dict, NamedTuple, Optional
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+
+
+class ImportTiming(NamedTuple):
+    self_us: int
+    cumulative_us: int
+
+
+def import_profile(statement: str, env: Optional[Dict[str, str]] = None) -> Dict[str, ImportTiming]:
+    """執行 statement 並解析 stderr 中的 importtime 報告；同一模塊只在第一次導入時出現"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=BACKEND_DIR, env=dict(os.environ, **(env or {})),
+        capture_output=True, text=True, timeout=120,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{statement!r} 執行失敗:\n{result.stderr[-2000:]}")
+    profile: Dict[str, ImportTiming] = {}
+    for line in result.stderr.splitlines():
+        # import time:      1194 |     224919 | yt_dlp
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        profile[name.strip()] = ImportTiming(int(self_us), int(cumulative_us))
+    return profile
+
+
+def format_report(profile: Dict[str, ImportTiming], top: int = 15) -> str:
+    """按累計耗時列出最慢的 top 個模塊"""
+    rows = sorted(profile.items(), key=lambda item: item[1].cumulative_us, reverse=True)[:top]
+    return "\n".join(f"{timing.cumulative_us / 1000:>9.1f} ms  {name}" for name, timing in rows)
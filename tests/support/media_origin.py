@@ -0,0 +1,229 @@
+"""
+本地假媒體源站
+
+在 127.0.0.1 的隨機端口上提供合成的 HLS / DASH 清單與分片，供下載引擎離線測試：
+- /video.m3u8     HLS 媒體播放列表
+- /video.mpd      DASH 清單（SegmentList）
+- /seg{i}.ts、/init.mp4、/dseg{i}.m4s  分片內容
+- /progressive.mp4  單文件（media_size 字節），支持 Range 請求
+- /feed.xml       RSS 播放列表，條目依次指向以上三種媒體
+
+latency 為每個分片請求的額外延遲（秒），用於觀察分片並發；
+bandwidth 為每個響應的發送速率上限（字節每秒，0 表示不限），
+error_rate 為媒體請求返回 503 的概率（由 seed 決定的偽隨機序列，可重現）。
+
+請求清單時帶上的查詢字符串（例如 ?t=<任務>）會附加到清單中的分片 URL，
+first_byte 按查詢字符串記錄第一次發送媒體數據的時間（time.time()），用於計算首字節時間。
+"""
+
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from xml.sax.saxutils import escape
+
+
+class MediaOrigin:
+    def __init__(
+        self,
+        segments: int = 8,
+        segment_size: int = 64 * 1024,
+        latency: float = 0.0,
+        bandwidth: int = 0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.segments = segments
+        self.segment_size = segment_size
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.requests = []
+        self.ranges = []
+        self.active = 0
+        self.max_active = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.first_byte: Dict[str, float] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def media_size(self) -> int:
+        return self.segments * self.segment_size
+
+    def start(self) -> "MediaOrigin":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MediaOrigin":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def hls_playlist(self, query: str = "") -> bytes:
+        suffix = f"?{query}" if query else ""
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-TARGETDURATION:2",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for i in range(self.segments):
+            lines += ["#EXTINF:2.0,", f"seg{i}.ts{suffix}"]
+        lines.append("#EXT-X-ENDLIST")
+        return ("\n".join(lines) + "\n").encode()
+
+    def dash_manifest(self, query: str = "") -> bytes:
+        suffix = escape(f"?{query}") if query else ""
+        segments = "".join(f'<SegmentURL media="dseg{i}.m4s{suffix}"/>' for i in range(self.segments))
+        return (
+            '<?xml version="1.0"?>'
+            '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" '
+            f'mediaPresentationDuration="PT{self.segments * 2}S" minBufferTime="PT2S" '
+            'profiles="urn:mpeg:dash:profile:isoff-on-demand:2011">'
+            '<Period><AdaptationSet mimeType="video/mp4" contentType="video">'
+            '<Representation id="v720" bandwidth="500000" width="1280" height="720" codecs="avc1.64001f">'
+            f'<SegmentList duration="2" timescale="1">{segments}</SegmentList>'
+            '</Representation></AdaptationSet></Period></MPD>'
+        ).encode()
+
+    def segment(self, name: str) -> bytes:
+        return bytes([sum(name.encode()) % 256]) * self.segment_size
+
+    def progressive(self) -> bytes:
+        return b"".join(bytes([i % 256]) * self.segment_size for i in range(self.segments))
+
+    def progressive_range(self, start: int, end: int) -> bytes:
+        """progressive() 的 [start, end] 區間，不構建整個文件（大文件按區間請求時）"""
+        parts = []
+        position = start
+        while position <= end:
+            index, offset = divmod(position, self.segment_size)
+            length = min(self.segment_size - offset, end - position + 1)
+            parts.append(bytes([index % 256]) * length)
+            position += length
+        return b"".join(parts)
+
+    def feed(self) -> bytes:
+        items = "".join(
+            f"<item><title>{name}</title><link>{self.base_url}/{name}</link>"
+            f"<itunes:duration>{self.segments * 2}</itunes:duration></item>"
+            for name in ("video.m3u8", "video.mpd", "progressive.mp4")
+        )
+        return (
+            '<?xml version="1.0"?>'
+            '<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">'
+            f"<channel><title>Media Origin</title>{items}</channel></rss>"
+        ).encode()
+
+    def _handler(self):
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                # 客戶端中途斷開（例如只讀取元數據或模擬中斷）時不打印異常
+                try:
+                    super().handle()
+                except ConnectionError:
+                    pass
+
+            def do_GET(self):
+                path, _, query = self.path.partition("?")
+                with origin._lock:
+                    origin.requests.append(path)
+                if path == "/video.m3u8":
+                    self._send(origin.hls_playlist(query), "application/vnd.apple.mpegurl")
+                elif path == "/video.mpd":
+                    self._send(origin.dash_manifest(query), "application/dash+xml")
+                elif path == "/feed.xml":
+                    self._send(origin.feed(), "application/rss+xml")
+                elif path == "/progressive.mp4":
+                    if not self._inject_error():
+                        self._send_ranged(query, "video/mp4")
+                elif path.endswith((".ts", ".m4s", ".mp4")):
+                    with origin._lock:
+                        origin.active += 1
+                        origin.max_active = max(origin.max_active, origin.active)
+                    try:
+                        if origin.latency:
+                            threading.Event().wait(origin.latency)
+                        if not self._inject_error():
+                            self._send(origin.segment(path), "video/mp2t", query, media=True)
+                    finally:
+                        with origin._lock:
+                            origin.active -= 1
+                else:
+                    self.send_error(404)
+
+            def _inject_error(self) -> bool:
+                with origin._lock:
+                    failed = origin.error_rate > 0 and origin._random.random() < origin.error_rate
+                    if failed:
+                        origin.errors += 1
+                if failed:
+                    self.send_error(503)
+                return failed
+
+            def _send_ranged(self, query: str, content_type: str):
+                size = origin.media_size
+                range_header = self.headers.get("Range", "")
+                if not range_header.startswith("bytes="):
+                    self._send(origin.progressive_range(0, size - 1), content_type, query, media=True)
+                    return
+                first, _, last = range_header[len("bytes="):].partition("-")
+                start = int(first or 0)
+                end = min(int(last) if last else size - 1, size - 1)
+                with origin._lock:
+                    origin.ranges.append((start, end))
+                chunk = origin.progressive_range(start, end)
+                self.send_response(206)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(chunk)))
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+                self._write(chunk, query, media=True)
+
+            def _send(self, body: bytes, content_type: str, query: str = "", media: bool = False):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self._write(body, query, media)
+
+            def _write(self, body: bytes, query: str, media: bool):
+                if media:
+                    with origin._lock:
+                        origin.first_byte.setdefault(query, time.time())
+                if not origin.bandwidth:
+                    self.wfile.write(body)
+                else:
+                    # 按速率分塊發送，每塊約 20 毫秒的數據量
+                    block = max(4096, origin.bandwidth // 50)
+                    started = time.monotonic()
+                    for offset in range(0, len(body), block):
+                        self.wfile.write(body[offset:offset + block])
+                        delay = started + (offset + block) / origin.bandwidth - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                with origin._lock:
+                    origin.bytes_sent += len(body)
+
+        return Handler
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from core.bandwidth import InMemoryBandwidthScheduler, RedisBandwidthScheduler, upstream_host
+
+URL = "https://r1---sn-abc.googlevideo.com/videoplayback"
+
+@pytest.fixture(params=["memory", "redis"])
+def scheduler(request):
+    args = ({}, 0.1, 60)
+    if request.param == "memory":
+        return InMemoryBandwidthScheduler(*args, worker="w1")
+    return RedisBandwidthScheduler(fakeredis.FakeRedis(decode_responses=True), *args, prefix="test", worker="w1")
+
+def unexpected(*args):
+    raise AssertionError("限額為 0 時不應訪問令牌桶或連接槽")
+
+def test_unlimited_skips_buckets_and_slots(scheduler, monkeypatch):
+    loads = []
+    load_limits = scheduler._load_limits
+    monkeypatch.setattr(scheduler, "_load_limits", lambda: loads.append(1) or load_limits())
+    monkeypatch.setattr(scheduler, "_reserve", unexpected)
+    monkeypatch.setattr(scheduler, "_try_acquire_slots", unexpected)
+
+    for _ in range(100):
+        assert scheduler.throttle(1024 * 1024) == 0
+    with scheduler.connections(URL, 8) as lease:
+        assert lease.count == 0
+    # 限額在刷新間隔內只讀取一次
+    assert len(loads) == 1
+    assert scheduler.stats()["bytes"] == 100 * 1024 * 1024
+
+def test_token_bucket_allows_burst_then_waits(scheduler):
+    # 100 KB/s，桶容量 0.1 秒即 10 KB
+    scheduler.set_limits(global_bps=100 * 1024)
+    assert scheduler.throttle(10 * 1024) == 0
+
+    started = time.monotonic()
+    wait = scheduler.throttle(5 * 1024)
+    assert wait == pytest.approx(0.05, abs=0.02)
+    assert time.monotonic() - started >= wait
+    stats = scheduler.stats()
+    assert stats["throttle_events"] == 1 and stats["limits"]["global_bps"] == 100 * 1024
+
+def test_worker_bucket_applies_with_global_unlimited(scheduler):
+    scheduler.set_limits(worker_bps=100 * 1024)
+    assert scheduler.throttle(10 * 1024) == 0
+    assert scheduler.throttle(2 * 1024) > 0
+
+def test_connection_slots_wait_for_release(scheduler):
+    scheduler.set_limits(host_connections=2)
+    # 超過上限的請求按上限計
+    first = scheduler.connections(URL, 8)
+    assert first.count == 2
+
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(scheduler.connections(URL, 1)))
+    waiter.start()
+    time.sleep(0.2)
+    assert not acquired
+    first.release()
+    waiter.join(timeout=2)
+    assert acquired and acquired[0].count == 1
+    acquired[0].release()
+    assert scheduler.stats()["slot_wait_seconds"] > 0
+
+def test_slots_are_per_upstream_host(scheduler):
+    scheduler.set_limits(host_connections=1)
+    assert upstream_host(URL) == "googlevideo.com"
+    with scheduler.connections(URL, 1) as lease:
+        other = scheduler.connections("https://media.example.com/a.mp4", 1)
+        assert lease.count == 1 and other.count == 1
+        other.release()
@@ -0,0 +1,163 @@
+import json
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.endpoints.download import router
+from core.config import settings
+from core.events import InMemoryEventBus, get_event_bus
+from core.metadata_cache import InMemoryMetadataCache, get_metadata_cache
+from core.result_cache import InMemoryResultCache, get_result_cache
+from core.singleflight import InMemoryInFlightRegistry, get_inflight_registry
+from core.task_store import InMemoryTaskStore, get_task_store
+
+@pytest.fixture
+def store():
+    return InMemoryTaskStore()
+
+@pytest.fixture
+def metadata():
+    return InMemoryMetadataCache(max_entries=100, ttl=60, negative_ttl=60, expiry_margin=0)
+
+@pytest.fixture
+def bus():
+    return InMemoryEventBus()
+
+@pytest.fixture
+def client(tmp_path, store, metadata, bus):
+    app = FastAPI()
+    app.include_router(router, prefix="/api/download")
+    cache = InMemoryResultCache(str(tmp_path), ttl=60)
+    registry = InMemoryInFlightRegistry()
+    app.dependency_overrides[get_task_store] = lambda: store
+    app.dependency_overrides[get_result_cache] = lambda: cache
+    app.dependency_overrides[get_inflight_registry] = lambda: registry
+    app.dependency_overrides[get_metadata_cache] = lambda: metadata
+    app.dependency_overrides[get_event_bus] = lambda: bus
+    return TestClient(app)
+
+def video(i):
+    return f"https://www.youtube.com/watch?v=vid{i:08d}"
+
+def test_batch_json_with_partial_failures(client, store, metadata):
+    metadata.put_unavailable(video(2), "私有影片")
+    body = [
+        {"url": video(1), "format": "mp3"},
+        {"format": "mp4"},
+        {"url": video(2)},
+        {"url": video(3), "priority": 42},
+        {"url": video(1), "format": "mp3"},
+    ]
+    response = client.post("/api/download/tasks/batch", json=body)
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["accepted"], data["rejected"]) == (2, 3)
+    results = data["results"]
+    assert [r["index"] for r in results] == list(range(5))
+    assert results[0]["task"]["status"] == "queued"
+    assert results[1]["error"] and results[3]["error"]
+    assert "影片不可用" in results[2]["error"]
+    # 同一批中的相同請求附加到同一個任務
+    assert results[4]["task"]["id"] == results[0]["task"]["id"]
+    assert store.count() == 1
+
+def test_batch_ndjson_split_across_chunks(client, store):
+    lines = [json.dumps({"url": video(i), "format": "mp3"}) for i in range(5)]
+    payload = ("\n".join(lines[:2]) + "\n\n" + "{not json\n" + "\n".join(lines[2:])).encode()
+
+    def chunks():
+        # 每塊 7 字節，行在任意位置被切斷，最後一行沒有換行符
+        for start in range(0, len(payload), 7):
+            yield payload[start:start + 7]
+
+    response = client.post("/api/download/tasks/batch", content=chunks(),
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["accepted"], data["rejected"]) == (5, 1)
+    assert data["results"][2]["error"] and data["results"][2]["task"] is None
+    assert store.count() == 5
+
+@pytest.mark.parametrize("content_type", ["application/json", "application/x-ndjson"])
+def test_batch_size_limit(client, store, monkeypatch, content_type):
+    monkeypatch.setattr(settings, "TASK_BATCH_MAX_SIZE", 3)
+    items = [{"url": video(i), "format": "mp3"} for i in range(4)]
+    if content_type == "application/json":
+        content = json.dumps(items)
+    else:
+        content = "\n".join(json.dumps(item) for item in items)
+    response = client.post("/api/download/tasks/batch", content=content, headers={"Content-Type": content_type})
+    assert response.status_code == 413
+    assert store.count() == 0
+
+@pytest.mark.parametrize("content", ["{not json", '{"url": "x"}'])
+def test_batch_rejects_malformed_json_body(client, content):
+    response = client.post("/api/download/tasks/batch", content=content,
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+
+def create_queued(store, task_id):
+    store.create({"id": task_id, "url": video(1), "format": "mp4", "quality": "720p", "status": "queued",
+                  "progress": 0, "created_at": "2024-01-01T00:00:00"})
+
+def wait_for_subscribers(bus, present=True):
+    for _ in range(100):
+        if bool(bus._subscribers) == present:
+            return
+        time.sleep(0.01)
+    raise AssertionError("訂閱狀態未變化")
+
+def test_sse_skips_duplicates_and_closes_on_terminal_state(client, store, bus):
+    create_queued(store, "task-a")
+
+    def publish():
+        wait_for_subscribers(bus)
+        # 與快照相同的狀態、其他任務的事件都不推送
+        bus.publish("task-a", {"status": "queued", "progress": 0})
+        bus.publish("task-b", {"progress": 99})
+        bus.publish("task-a", {"status": "processing", "progress": 50})
+        bus.publish("task-a", {"status": "processing", "progress": 50})
+        bus.publish("task-a", {"status": "completed", "progress": 100, "download_url": "/downloads/a.mp4"})
+
+    publisher = threading.Thread(target=publish)
+    publisher.start()
+    # 到達終止狀態後服務端結束響應
+    response = client.get("/api/download/tasks/task-a/events")
+    publisher.join()
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert [(e["status"], e["progress"]) for e in events] == [("queued", 0), ("processing", 50), ("completed", 100)]
+    assert events[-1]["download_url"] == "/downloads/a.mp4"
+    assert not bus._subscribers
+
+def test_sse_for_finished_task_sends_snapshot_only(client, store, bus):
+    create_queued(store, "task-a")
+    store.update("task-a", status="failed")
+    response = client.get("/api/download/tasks/task-a/events")
+    assert response.text.count("event: task") == 1
+    assert client.get("/api/download/tasks/missing/events").status_code == 404
+    assert not bus._subscribers
+
+def test_websocket_subscriptions(client, store, bus):
+    create_queued(store, "task-a")
+    create_queued(store, "task-b")
+    with client.websocket_connect("/api/download/ws/tasks") as ws:
+        ws.send_json({"action": "subscribe", "task_ids": ["task-a", "missing"]})
+        assert ws.receive_json()["task"]["id"] == "task-a"
+        assert ws.receive_json() == {"type": "error", "task_id": "missing", "detail": "任務不存在"}
+
+        bus.publish("task-a", {"status": "queued", "progress": 0})
+        bus.publish("task-a", {"status": "processing", "progress": 30})
+        message = ws.receive_json()
+        assert (message["task"]["id"], message["task"]["progress"]) == ("task-a", 30)
+
+        # 取消訂閱後的事件不再推送，下一條消息是新訂閱任務的快照
+        ws.send_json({"action": "unsubscribe", "task_ids": ["task-a"]})
+        wait_for_subscribers(bus, present=False)
+        bus.publish("task-a", {"progress": 60})
+        ws.send_json({"action": "subscribe", "task_ids": ["task-b"]})
+        assert ws.receive_json()["task"]["id"] == "task-b"
+    # 客戶端斷開後訂閱被清理
+    wait_for_subscribers(bus, present=False)
@@ -1,22 +1,118 @@
 import pytest
-import asyncio
 from pathlib import Path
-from app.core.downloader import YouTubeDownloader
+from core.bandwidth import InMemoryBandwidthScheduler
+from core.checkpoint import DownloadCheckpoint
+from core.downloader import YouTubeDownloader, build_format_selector
+from tests.support.media_origin import MediaOrigin
+
+@pytest.fixture
+def origin():
+    with MediaOrigin(segments=8, segment_size=64 * 1024, latency=0.05) as server:
+        yield server
 
 class TestYouTubeDownloader:
-    def setup_method(self):
-        self.downloader = YouTubeDownloader(download_path="./test_downloads")
+    @pytest.fixture(autouse=True)
+    def setup_downloader(self, tmp_path):
+        self.downloader = YouTubeDownloader(download_path=str(tmp_path / "test_downloads"), fragment_concurrency=4)
         
     def test_init(self):
         assert Path(self.downloader.download_path).exists()
         
-    def test_get_video_info(self):
+    def test_get_video_info(self, origin):
         # 測試獲取視頻信息
-        pass
+        info = self.downloader.get_video_info(f"{origin.base_url}/video.m3u8")
+        assert info["id"] == "video"
+        assert info["formats"]
+        assert not any(path.endswith(".ts") for path in origin.requests)
+        
+    def test_download_video(self, origin):
+        # 測試下載功能（HLS 分片並發下載）
+        progress = []
+        result = self.downloader.download_video(
+            f"{origin.base_url}/video.m3u8",
+            filename="hls_video",
+            progress_callback=progress.append,
+        )
+        assert result["filename"] == "hls_video.mp4"
+        assert result["size"] == origin.media_size
+        assert origin.max_active > 1
+        assert progress[-1]["status"] == "finished"
+        assert progress[-1]["progress"] == 100
+        
+    def test_download_dash_video(self, origin):
+        result = self.downloader.download_video(f"{origin.base_url}/video.mpd", filename="dash_video")
+        assert Path(result["filepath"]).exists()
+        assert result["size"] == origin.media_size
+        
+    def test_download_with_extracted_info(self, origin):
+        # 傳入已提取（可來自元數據緩存）的元數據時不再重複提取
+        url = f"{origin.base_url}/video.m3u8"
+        info = self.downloader.extract_info(url)
+        requests_before = len(origin.requests)
+        result = self.downloader.download_video(url, filename="cached_info", info=info)
+        assert result["size"] == origin.media_size
+        assert origin.requests[requests_before:].count("/video.m3u8") <= 1
+        
+    def test_resume_from_checkpoint(self, origin, tmp_path):
+        # 中斷後以斷點續傳：從已下載的字節處發出 Range 請求，內容與源文件一致
+        class Interrupted(Exception):
+            pass
+        
+        def interrupt(p):
+            if p["downloaded_bytes"] > origin.media_size // 2:
+                raise Interrupted()
+        
+        downloader = YouTubeDownloader(download_path=str(tmp_path / "resume"), http_chunk_size=64 * 1024)
+        url = f"{origin.base_url}/progressive.mp4"
+        checkpoint = DownloadCheckpoint.load(downloader.download_path, "resumed")
+        checkpoint.begin_attempt(url=url)
+        with pytest.raises(Exception):
+            downloader.download_video(url, filename="resumed", progress_callback=interrupt, checkpoint=checkpoint)
+        
+        checkpoint = DownloadCheckpoint.load(downloader.download_path, "resumed")
+        offset = checkpoint.downloaded_bytes
+        assert checkpoint.format_ids and 0 < offset < origin.media_size
+        result = downloader.download_video(url, filename="resumed", checkpoint=checkpoint)
+        assert Path(result["filepath"]).read_bytes() == origin.progressive()
+        assert any(start == offset for start, _ in origin.ranges)
+        assert not Path(checkpoint.path).exists()
+        
+    def test_resume_charges_only_new_bytes(self, origin, tmp_path):
+        # 續傳時只把新下載的字節計入帶寬預算，斷點之前的字節不重複計入
+        class Interrupted(Exception):
+            pass
+        
+        def interrupt(p):
+            if p["downloaded_bytes"] > origin.media_size // 2:
+                raise Interrupted()
+        
+        bandwidth = InMemoryBandwidthScheduler({}, burst_seconds=1, refresh=60)
+        downloader = YouTubeDownloader(download_path=str(tmp_path / "charged"), http_chunk_size=64 * 1024,
+                                       bandwidth=bandwidth)
+        url = f"{origin.base_url}/progressive.mp4"
+        checkpoint = DownloadCheckpoint.load(downloader.download_path, "charged")
+        with pytest.raises(Exception):
+            downloader.download_video(url, filename="charged", progress_callback=interrupt, checkpoint=checkpoint)
+        offset = DownloadCheckpoint.load(downloader.download_path, "charged").downloaded_bytes
+        assert bandwidth.stats()["bytes"] == offset
+        
+        checkpoint = DownloadCheckpoint.load(downloader.download_path, "charged")
+        result = downloader.download_video(url, filename="charged", checkpoint=checkpoint)
+        assert result["size"] == origin.media_size
+        assert bandwidth.stats()["bytes"] == origin.media_size
+        
+    def test_extract_playlist(self, origin):
+        # 平鋪提取：只讀取列表本身，不請求各條目的清單
+        playlist = self.downloader.extract_playlist(f"{origin.base_url}/feed.xml", limit=2)
+        entries = list(playlist["entries"])
+        assert playlist["title"] == "Media Origin"
+        assert [entry["url"] for entry in entries] == [f"{origin.base_url}/video.m3u8", f"{origin.base_url}/video.mpd"]
+        assert entries[0]["duration"] == origin.segments * 2
+        assert origin.requests == ["/feed.xml"]
         
-    def test_download_video(self):
-        # 測試下載功能
-        pass
+    def test_format_selector(self):
+        assert build_format_selector("mp3", "720p") == "bestaudio[ext=mp3]/bestaudio/best"
+        assert build_format_selector("mp4", "1080p").startswith("bestvideo[height<=1080][ext=mp4]+bestaudio")
         
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,96 @@
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+
+from core.events import RedisEventBus
+
+def make_bus():
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    bus = RedisEventBus(client, "redis://unused", prefix="test")
+    bus._connect = lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    return bus, client
+
+def channels(client):
+    return sorted(c.rsplit(":", 1)[1] for c in client.pubsub_channels("test:task_events:*"))
+
+async def settle(bus):
+    # 等待排程中的訂閱同步完成
+    for _ in range(50):
+        await asyncio.sleep(0.01)
+        if not bus._syncs:
+            return
+
+def test_subscribes_only_to_watched_tasks():
+    bus, client = make_bus()
+
+    async def scenario():
+        first = bus.subscribe(["task-a"])
+        await first.ready()
+        assert channels(client) == ["task-a"]
+        
+        second = bus.subscribe(["task-a", "task-b"])
+        await second.ready()
+        assert channels(client) == ["task-a", "task-b"]
+        
+        # 沒有本地訂閱者的任務事件不會送到本進程
+        bus.publish("task-c", {"progress": 1})
+        bus.publish("task-b", {"progress": 2})
+        bus.publish("task-a", {"progress": 3})
+        assert (await second.get(timeout=1))["id"] == "task-b"
+        assert (await second.get(timeout=1))["id"] == "task-a"
+        assert (await first.get(timeout=1)) == {"id": "task-a", "progress": 3}
+        assert await first.get(timeout=0.1) is None
+        
+        # 最後一個訂閱者離開時退訂
+        first.close()
+        await settle(bus)
+        assert channels(client) == ["task-a", "task-b"]
+        second.remove(["task-a"])
+        await settle(bus)
+        assert channels(client) == ["task-b"]
+        second.close()
+        await settle(bus)
+        assert channels(client) == []
+        
+        # 全部退訂後再次訂閱
+        third = bus.subscribe(["task-a"])
+        await third.ready()
+        bus.publish("task-a", {"progress": 4})
+        assert (await third.get(timeout=1))["progress"] == 4
+        third.close()
+        bus._listener.cancel()
+
+    asyncio.run(scenario())
+
+def test_retries_failed_subscription():
+    bus, client = make_bus()
+    bus.RECONNECT_DELAY = 0.05
+    connect = bus._connect
+    attempts = []
+
+    def flaky_connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("redis unavailable")
+        return connect()
+
+    bus._connect = flaky_connect
+
+    async def scenario():
+        subscription = bus.subscribe(["task-a"])
+        await subscription.ready()
+        assert channels(client) == []
+        # 監聽任務稍後重連並恢復訂閱
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if channels(client) == ["task-a"]:
+                break
+        assert len(attempts) == 2
+        bus.publish("task-a", {"progress": 5})
+        assert (await subscription.get(timeout=1))["progress"] == 5
+        subscription.close()
+        bus._listener.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,129 @@
+from email.utils import formatdate
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.endpoints.files import router
+from core.config import settings
+from core.file_delivery import RangeNotSatisfiable, etag_matches, if_range_matches, parse_range
+from core.file_index import InMemoryFileIndex, get_file_index
+from core.storage import InMemoryStorageManager, get_storage_manager
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=900-", [(900, 999)]),
+    ("bytes=-100", [(900, 999)]),
+    ("bytes=-5000", [(0, 999)]),
+    ("bytes=990-2000", [(990, 999)]),
+    ("bytes=0-9, 20-29", [(0, 9), (20, 29)]),
+    # 排序並合併重疊與相鄰的區間
+    ("bytes=50-59,0-9,5-19,20-24", [(0, 24), (50, 59)]),
+    # 超出文件的區間被丟棄
+    ("bytes=0-9,5000-", [(0, 9)]),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000, 10) == expected
+
+@pytest.mark.parametrize("header", [
+    "items=0-9", "bytes=", "bytes=abc", "bytes=5", "bytes=9-0", "bytes=a-9", "bytes=0-1,2-3,4-5",
+])
+def test_invalid_range_is_ignored(header):
+    assert parse_range(header, 1000, 2) is None
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=-0", "bytes=2000-3000,1000-"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000, 10)
+
+def test_etag_matching():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('W/"a"', '"a"') and etag_matches('"a"', 'W/"a"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"a"', '"b"')
+
+def test_if_range_matching():
+    mtime = 1700000000
+    assert if_range_matches('"abc"', '"abc"', mtime)
+    assert not if_range_matches('"abc"', '"def"', mtime)
+    # If-Range 只接受強 ETag
+    assert not if_range_matches('W/"abc"', 'W/"abc"', mtime)
+    assert not if_range_matches('"abc"', 'W/"abc"', mtime)
+    assert if_range_matches(formatdate(mtime, usegmt=True), '"abc"', mtime)
+    assert not if_range_matches(formatdate(mtime - 60, usegmt=True), '"abc"', mtime)
+    assert not if_range_matches("not a date", '"abc"', mtime)
+
+DATA = bytes(range(256)) * 4
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DOWNLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "DOWNLOAD_ACCEL_REDIRECT", "")
+    (tmp_path / "a.mp4").write_bytes(DATA)
+    index = InMemoryFileIndex(str(tmp_path))
+    storage = InMemoryStorageManager(index, None, quota=0, high_watermark=0.9, low_watermark=0.8,
+                                     reservation_ttl=60)
+    app = FastAPI()
+    app.include_router(router, prefix="/downloads")
+    app.dependency_overrides[get_file_index] = lambda: index
+    app.dependency_overrides[get_storage_manager] = lambda: storage
+    return TestClient(app)
+
+def test_full_and_single_range(client):
+    response = client.get("/downloads/a.mp4")
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert response.headers["accept-ranges"] == "bytes"
+
+    response = client.get("/downloads/a.mp4", headers={"Range": "bytes=-24"})
+    assert response.status_code == 206
+    assert response.content == DATA[-24:]
+    assert response.headers["content-range"] == "bytes 1000-1023/1024"
+    assert response.headers["content-length"] == "24"
+
+def test_multiple_ranges(client):
+    response = client.get("/downloads/a.mp4", headers={"Range": "bytes=0-9,100-"})
+    assert response.status_code == 206
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1].encode()
+    assert int(response.headers["content-length"]) == len(response.content)
+    parts = response.content.split(b"--" + boundary)
+    assert parts[-1] == b"--\r\n"
+    assert parts[1].endswith(b"\r\n\r\n" + DATA[0:10] + b"\r\n")
+    assert b"Content-Range: bytes 100-1023/1024" in parts[2]
+    assert parts[2].endswith(DATA[100:] + b"\r\n")
+
+def test_unsatisfiable_and_invalid_ranges(client):
+    response = client.get("/downloads/a.mp4", headers={"Range": "bytes=5000-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+    # 語法錯誤時忽略 Range
+    response = client.get("/downloads/a.mp4", headers={"Range": "bytes=oops"})
+    assert response.status_code == 200 and response.content == DATA
+
+def test_conditional_requests(client):
+    # 首次請求時文件尚未索引，返回弱 ETag 並在後台補算摘要
+    weak = client.get("/downloads/a.mp4").headers["etag"]
+    assert weak.startswith('W/"')
+    etag = client.get("/downloads/a.mp4").headers["etag"]
+    assert not etag.startswith("W/")
+    last_modified = client.get("/downloads/a.mp4").headers["last-modified"]
+
+    assert client.get("/downloads/a.mp4", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/downloads/a.mp4", headers={"If-None-Match": weak}).status_code == 200
+    assert client.get("/downloads/a.mp4", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    # If-Range 匹配時按 Range 發送，不匹配時發送整個文件
+    response = client.get("/downloads/a.mp4", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert response.status_code == 206 and response.content == DATA[:10]
+    response = client.get("/downloads/a.mp4", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200 and response.content == DATA
+    response = client.get("/downloads/a.mp4", headers={"Range": "bytes=0-9", "If-Range": last_modified})
+    assert response.status_code == 206
+
+def test_rejects_hidden_and_missing_files(client, tmp_path):
+    (tmp_path / ".hidden").write_bytes(b"x")
+    assert client.get("/downloads/.hidden").status_code == 404
+    assert client.get("/downloads/missing.mp4").status_code == 404
+    assert client.head("/downloads/a.mp4").content == b""
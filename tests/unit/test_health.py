@@ -0,0 +1,37 @@
+import time
+
+from core.health import HealthProber, Probe
+
+def failing():
+    raise ConnectionError("refused")
+
+def test_ready_reflects_cached_probe_results():
+    calls = []
+    prober = HealthProber(
+        [
+            Probe("database", lambda: calls.append("database")),
+            Probe("slow", lambda: time.sleep(1), required=False),
+            Probe("workers", failing, required=False),
+        ],
+        timeout=0.2,
+        max_age=0.5,
+    )
+    assert prober.snapshot()["status"] == "not_ready"
+    
+    started = time.perf_counter()
+    prober.refresh()
+    assert time.perf_counter() - started < 0.5
+    snapshot = prober.snapshot()
+    assert snapshot["status"] == "ready"
+    assert snapshot["checks"]["slow"]["status"] == "timeout"
+    assert snapshot["checks"]["workers"]["status"] == "error"
+    
+    # 讀取就緒狀態不執行探測；結果超過 max_age 後過期
+    for _ in range(100):
+        prober.snapshot()
+    assert calls == ["database"]
+    time.sleep(0.6)
+    snapshot = prober.snapshot()
+    assert snapshot["status"] == "not_ready"
+    assert snapshot["checks"]["database"]["status"] == "stale"
+    prober.stop()
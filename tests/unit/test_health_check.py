@@ -0,0 +1,77 @@
+import threading
+import time
+
+from health_check import HealthChecker
+
+SERVICES = ("database", "redis", "backend_api", "celery", "flower", "frontend")
+
+class HangingConnection:
+    """檢查阻塞在連接上，直到連接被關閉"""
+
+    def __init__(self):
+        self.dropped = threading.Event()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        self.dropped.set()
+
+    release = close
+
+    def wait(self):
+        if not self.dropped.wait(5):
+            raise AssertionError("超時後連接未被丟棄")
+        raise ConnectionError("connection closed")
+
+def make_checker(tmp_path, monkeypatch, check_timeout, total_timeout, hanging=()):
+    checker = HealthChecker(log_dir=str(tmp_path), environment="host",
+                            check_timeout=check_timeout, total_timeout=total_timeout)
+    checker._db_conn = HangingConnection()
+    checker._celery_conn = HangingConnection()
+    connections = {"database": checker._db_conn, "celery": checker._celery_conn}
+    for name in SERVICES:
+        if name in hanging:
+            def check(conn=connections.get(name)):
+                conn.wait() if conn else time.sleep(1)
+        else:
+            def check():
+                return {"status": "HEALTHY"}
+        monkeypatch.setattr(checker, f"check_{name}", check)
+    return checker, connections
+
+def test_timed_out_checks_drop_shared_connections(tmp_path, monkeypatch):
+    checker, connections = make_checker(tmp_path, monkeypatch, 0.2, 5, hanging=("database", "celery"))
+    started = time.perf_counter()
+    results = checker.run_all_checks()
+    # 單項時限從整體開始時間起算，兩項超時不會疊加
+    assert time.perf_counter() - started < 1
+    services = results["services"]
+    assert services["database"]["timed_out"] and services["celery"]["timed_out"]
+    assert services["redis"]["status"] == "HEALTHY"
+    assert results["overall"] == "UNHEALTHY"
+    # 丟棄連接讓仍在運行的檢查儘快失敗，下次檢查重新建立連接
+    assert connections["database"].closed and connections["celery"].closed
+    assert checker._db_conn is None and checker._celery_conn is None
+    checker.close()
+
+def test_total_deadline_bounds_run(tmp_path, monkeypatch):
+    checker, connections = make_checker(tmp_path, monkeypatch, 10, 0.3, hanging=("flower", "frontend"))
+    started = time.perf_counter()
+    results = checker.run_all_checks()
+    assert time.perf_counter() - started < 1
+    assert [name for name, s in results["services"].items() if s.get("timed_out")] == ["flower", "frontend"]
+    assert results["summary"]["healthy_services"] == 4
+    # 沒有超時的檢查不丟棄連接
+    assert checker._db_conn is connections["database"] and not connections["database"].closed
+    checker._db_conn = checker._celery_conn = None
+    checker.close()
+
+def test_stale_check_does_not_close_new_connection(tmp_path, monkeypatch):
+    checker = HealthChecker(log_dir=str(tmp_path), environment="host")
+    old, new = HangingConnection(), HangingConnection()
+    checker._db_conn = new
+    checker._reset_db_connection(old)
+    assert old.closed and not new.closed
+    assert checker._db_conn is new
+    checker._reset_db_connection()
+    assert new.closed and checker._db_conn is None
@@ -0,0 +1,38 @@
+import pytest
+
+from tests.support.importtime import format_report, import_profile
+
+# 只在第一次提取 / 下載 / 查詢歷史時才需要的重量級模塊
+LAZY_MODULES = ("yt_dlp", "sqlalchemy", "models", "db.base")
+
+@pytest.fixture
+def env(tmp_path):
+    return {
+        "CELERY_BROKER_URL": "memory://",
+        "CELERY_RESULT_BACKEND": "cache+memory://",
+        "TASK_STORE_BACKEND": "memory",
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'test.db'}",
+        "DOWNLOAD_DIR": str(tmp_path / "downloads"),
+        "LOG_DIR": str(tmp_path / "logs"),
+    }
+
+@pytest.mark.parametrize("statement", ["import main", "import celery_app, tasks"])
+def test_startup_does_not_import_heavy_modules(env, statement):
+    profile = import_profile(statement, env)
+    loaded = [name for name in LAZY_MODULES if name in profile]
+    assert not loaded, f"{statement} 導入了 {loaded}，最慢的模塊:\n{format_report(profile)}"
+
+def test_task_store_defers_history_until_first_write(env):
+    env = dict(env, TASK_HISTORY_ENABLED="true")
+    read = "import main; from core.task_store import get_task_store; get_task_store().list_page(10)"
+    profile = import_profile(read, env)
+    assert "sqlalchemy" not in profile and "core.task_history" not in profile
+    
+    write = read + "; get_task_store().create({'id': 'a', 'url': 'u', 'status': 'queued', 'created_at': '2024-01-01T00:00:00'})"
+    assert "core.task_history" in import_profile(write, env)
+
+def test_worker_preloads_extractors_before_fork(env):
+    # worker_init 在主進程中執行，之後 fork 出的子進程直接共享已導入的模塊
+    profile = import_profile("import celery_app; celery_app.preload_worker_modules()", env)
+    assert "yt_dlp" in profile
+    assert "core.task_history" in profile
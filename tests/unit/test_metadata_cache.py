@@ -0,0 +1,139 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from core.downloader import VideoUnavailable
+from core.metadata_cache import InMemoryMetadataCache, RedisMetadataCache, media_url_expiry, metadata_key
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+def make_info(expire=None, path=False):
+    url = "https://r1---sn-abc.googlevideo.com/videoplayback"
+    if expire is not None:
+        url += f"/expire/{expire}/id/1" if path else f"?expire={expire}&id=1"
+    return {"id": "abcdefghijk", "title": "t", "formats": [{"url": url}]}
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    args = (100, 3600, 60, 300)
+    if request.param == "memory":
+        return InMemoryMetadataCache(*args)
+    return RedisMetadataCache(fakeredis.FakeRedis(decode_responses=True), *args, prefix="test")
+
+def test_keys_and_expiry_parsing():
+    assert metadata_key(URL) == metadata_key("https://youtu.be/abcdefghijk") == "abcdefghijk"
+    assert metadata_key("https://example.com/a.mp4").startswith("url-")
+    assert media_url_expiry(make_info()) is None
+    assert media_url_expiry(make_info(1700000000)) == 1700000000
+    assert media_url_expiry(make_info(1700000000, path=True)) == 1700000000
+    # 取所有媒體 URL 中最早的過期時間
+    info = make_info(1700000500)
+    info["requested_formats"] = [{"manifest_url": "https://m.googlevideo.com/api/manifest/expire/1700000100/x"}]
+    assert media_url_expiry(info) == 1700000100
+
+@pytest.mark.parametrize("path", [False, True])
+def test_ttl_is_capped_by_signed_url_expiry(cache, path):
+    now = time.time()
+    # 簽名 1000 秒後過期，減去 300 秒餘量，約 700 秒，小於默認的 3600
+    entry = cache.put(URL, make_info(int(now) + 1000, path=path))
+    assert entry["expires_at"] - now == pytest.approx(700, abs=2)
+    if isinstance(cache, RedisMetadataCache):
+        assert 690 <= cache.redis.ttl("test:metadata:abcdefghijk") <= 700
+
+def test_entry_within_margin_is_not_cached(cache):
+    cache.put(URL, make_info(int(time.time()) + 100))
+    assert cache.peek(URL) is None
+
+def test_unsigned_info_uses_default_ttl(cache):
+    now = time.time()
+    assert cache.put(URL, make_info())["expires_at"] - now == pytest.approx(3600, abs=2)
+
+def test_negative_entries_are_cached(cache):
+    calls = []
+
+    def extract(url):
+        calls.append(url)
+        raise VideoUnavailable("私有影片")
+
+    for _ in range(2):
+        with pytest.raises(VideoUnavailable, match="私有影片"):
+            cache.get_info(URL, extract)
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["misses"], stats["negative_hits"]) == (1, 1)
+
+def test_transient_errors_are_not_cached(cache):
+    def extract(url):
+        raise ConnectionError("timeout")
+
+    with pytest.raises(ConnectionError):
+        cache.get_info(URL, extract)
+    assert cache.peek(URL) is None
+
+def test_negative_entries_expire():
+    cache = InMemoryMetadataCache(100, 3600, 1, 300)
+    cache.put_unavailable(URL, "已刪除")
+    assert "error" in cache.peek(URL)
+    time.sleep(1.1)
+    assert cache.peek(URL) is None
+
+def test_local_then_shared_lookup():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    api = RedisMetadataCache(client, 100, 3600, 60, 300, prefix="test")
+    worker = RedisMetadataCache(client, 100, 3600, 60, 300, prefix="test")
+    api.put(URL, make_info())
+
+    assert api.peek(URL)["info"]["title"] == "t"
+    # 另一進程從共享層讀取後寫入本地層，之後不再訪問 Redis
+    assert worker.peek(URL)["info"]["title"] == "t"
+    client.delete("test:metadata:abcdefghijk")
+    assert worker.peek(URL) is not None
+    assert (api.stats()["local_hits"], worker.stats()["shared_hits"], worker.stats()["local_hits"]) == (1, 1, 1)
+
+    worker.invalidate(URL)
+    assert worker.peek(URL) is None
+    assert worker.stats()["local_entries"] == 0
+
+def test_local_layer_is_bounded():
+    cache = InMemoryMetadataCache(2, 3600, 60, 300)
+    for i in range(3):
+        cache.put(f"https://www.youtube.com/watch?v=vid{i:08d}", make_info())
+    assert cache.stats()["local_entries"] == 2
+    assert cache.peek("https://www.youtube.com/watch?v=vid00000000") is None
+
+def test_concurrent_misses_extract_once(cache):
+    calls = []
+    started = threading.Event()
+
+    def extract(url):
+        calls.append(url)
+        started.set()
+        time.sleep(0.1)
+        return make_info()
+
+    threads = [threading.Thread(target=cache.get_info, args=(URL, extract)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+
+def test_late_miss_rechecks_shared_layer_before_extracting():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    api = RedisMetadataCache(client, 100, 3600, 60, 300, prefix="test")
+    worker = RedisMetadataCache(client, 100, 3600, 60, 300, prefix="test")
+    calls = []
+    peek = worker.peek
+
+    def late_peek(url):
+        # worker 查詢未命中之後、取得加載鎖之前，另一進程寫入了結果
+        entry = peek(url)
+        api.get_info(url, lambda u: calls.append(u) or make_info())
+        return entry
+
+    worker.peek = late_peek
+    assert worker.get_info(URL, lambda u: calls.append(u) or make_info())["title"] == "t"
+    assert len(calls) == 1
+    assert not worker._loading
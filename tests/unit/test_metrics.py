@@ -0,0 +1,51 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.metadata_cache import InMemoryMetadataCache
+from core.metrics import CACHE_REQUESTS, HTTP_REQUEST_DURATION, MetricsMiddleware, cache_hit_ratios
+
+def observed(route, status):
+    for sample in HTTP_REQUEST_DURATION.collect()[0].samples:
+        if sample.name.endswith("_count") and sample.labels == {"method": "GET", "route": route, "status": status}:
+            return sample.value
+    return 0
+
+def test_requests_are_labelled_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    
+    @app.get("/metrics-test/tasks/{task_id}")
+    def get_task(task_id: str):
+        return {"id": task_id}
+    
+    client = TestClient(app)
+    before = observed("/metrics-test/tasks/{task_id}", "200")
+    for task_id in ("a", "b", "c"):
+        assert client.get(f"/metrics-test/tasks/{task_id}").status_code == 200
+    client.get("/metrics-test/missing")
+    
+    # 不同任務 ID 歸入同一個路由標籤，未匹配的路徑不產生新的標籤值
+    assert observed("/metrics-test/tasks/{task_id}", "200") == before + 3
+    assert observed("<unmatched>", "404") >= 1
+
+def cache_requests(cache):
+    counts = {}
+    for sample in CACHE_REQUESTS.collect()[0].samples:
+        if sample.name.endswith("_total") and sample.labels["cache"] == cache:
+            counts[sample.labels["result"]] = sample.value
+    return counts
+
+def test_metadata_cache_misses_count_against_hit_ratio():
+    cache = InMemoryMetadataCache(max_entries=10, ttl=60, negative_ttl=60, expiry_margin=0)
+    before = cache_requests("metadata")
+    for i in range(5):
+        cache.peek(f"https://example.com/metrics-test/{i}")
+    cache.put("https://example.com/metrics-test/0", {"id": "0"})
+    cache.peek("https://example.com/metrics-test/0")
+    
+    counts = cache_requests("metadata")
+    assert counts["miss"] == before.get("miss", 0) + 5
+    assert counts["local_hit"] == before.get("local_hit", 0) + 1
+    assert set(counts) <= {"local_hit", "shared_hit", "negative_hit", "miss"}
+    assert cache_hit_ratios()["metadata"] == 1 - counts["miss"] / sum(counts.values())
+    assert cache_hit_ratios()["metadata"] < 1.0
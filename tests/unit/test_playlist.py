@@ -0,0 +1,59 @@
+import pytest
+from celery.exceptions import ChordError
+
+from celery_app import celery_app
+from core import dispatch
+from core.events import InMemoryEventBus
+from core.result_cache import InMemoryResultCache
+from core.routing import PLAYLIST_BATCH_TASK_NAME
+from core.task_store import InMemoryTaskStore
+from tasks import playlist, youtube
+
+@pytest.fixture
+def captured(monkeypatch):
+    calls = []
+    monkeypatch.setattr(dispatch, "chord", lambda header: lambda callback: calls.append((header, callback)))
+    return calls
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = InMemoryTaskStore()
+    cache = InMemoryResultCache(str(tmp_path), ttl=60)
+    for module in (playlist, youtube):
+        monkeypatch.setattr(module, "get_task_store", lambda: store)
+    monkeypatch.setattr(youtube, "get_event_bus", InMemoryEventBus)
+    monkeypatch.setattr(playlist, "get_result_cache", lambda: cache)
+    return store
+
+def child(task_id, status, size=None):
+    return {"id": task_id, "url": f"https://www.youtube.com/watch?v={task_id:0>11}", "format": "mp4",
+            "quality": "720p", "status": status, "size": size, "created_at": "2024-01-01T00:00:00"}
+
+def test_batch_chord_has_tally_errback(captured):
+    dispatch.dispatch_playlist_batch("pl", [child("a", "queued")], ["a", "b"])
+    [(header, callback)] = captured
+    assert len(header) == 1
+    [errback] = callback.options["link_error"]
+    assert errback["task"] == callback["task"] == PLAYLIST_BATCH_TASK_NAME
+    assert tuple(errback["args"]) == ("pl", ["a", "b"])
+
+def test_failed_chord_still_finishes_playlist(captured, store, monkeypatch):
+    # 子任務被硬時限終止：chord 不執行回調，Celery 以 ChordError 調用錯誤回調
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    store.create({"id": "pl", "url": "https://www.youtube.com/playlist?list=x", "status": "processing",
+                  "created_at": "2024-01-01T00:00:00", "total": 2, "batches": 1, "expanded": True})
+    store.create(child("a", "completed", size=100))
+    store.create(child("b", "failed"))
+    dispatch.dispatch_playlist_batch("pl", [child("b", "queued")], ["a", "b"])
+    [(_, callback)] = captured
+    callback.freeze()
+    
+    try:
+        raise ChordError("b 超出執行時限")
+    except ChordError as e:
+        # 與結果後端匯總 chord 時相同，在異常處理中調用
+        celery_app.backend.chord_error_from_stack(callback, e)
+    
+    parent = store.get("pl")
+    assert parent["status"] == "completed"
+    assert (parent["completed"], parent["failed"], parent["bytes"], parent["batches_done"]) == (1, 1, 100, 1)
@@ -0,0 +1,64 @@
+import time
+
+from core.progress import ProgressReporter
+
+class Sink:
+    def __init__(self, fail=False):
+        self.writes = []
+        self.fail = fail
+
+    def __call__(self, state):
+        self.writes.append((time.monotonic(), state))
+        if self.fail:
+            raise ConnectionError("store unavailable")
+
+    @property
+    def states(self):
+        return [state for _, state in self.writes]
+
+def test_writes_are_throttled_and_last_state_is_flushed():
+    sink = Sink()
+    with ProgressReporter(sink, min_interval=0.1, min_delta=1) as reporter:
+        for progress in range(100):
+            reporter.report(progress)
+            time.sleep(0.005)
+    # 約 0.5 秒內報告 100 次，最多按間隔寫出幾次，close 時寫出最後的狀態
+    assert 2 <= len(sink.writes) <= 8
+    assert all(b - a >= 0.09 for (a, _), (b, _) in zip(sink.writes, sink.writes[1:-1]))
+    assert sink.states[-1] == {"progress": 99}
+
+def test_small_deltas_wait_for_close():
+    sink = Sink()
+    reporter = ProgressReporter(sink, min_interval=0, min_delta=5)
+    reporter.report(10)
+    time.sleep(0.05)
+    reporter.report(12)
+    reporter.report(13)
+    time.sleep(0.05)
+    assert sink.states == [{"progress": 10}]
+    reporter.close()
+    assert sink.states == [{"progress": 10}, {"progress": 13}]
+
+def test_status_change_skips_interval():
+    sink = Sink()
+    reporter = ProgressReporter(sink, min_interval=10, min_delta=1)
+    reporter.report(10, status="processing")
+    time.sleep(0.05)
+    reporter.report(11)
+    reporter.report(status="completed")
+    time.sleep(0.05)
+    assert [s.get("status") for s in sink.states] == ["processing", "completed"]
+    reporter.close()
+    # 沒有新的變化時 close 不重複寫出
+    assert len(sink.writes) == 2
+
+def test_sink_errors_do_not_stop_reporter():
+    sink = Sink(fail=True)
+    beats = []
+    with ProgressReporter(sink, min_interval=0, min_delta=1, heartbeat=lambda: beats.append(1),
+                          heartbeat_interval=0.02) as reporter:
+        reporter.report(10)
+        time.sleep(0.1)
+        reporter.report(20)
+    assert sink.states == [{"progress": 10}, {"progress": 20}]
+    assert len(beats) >= 2
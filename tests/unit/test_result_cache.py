@@ -0,0 +1,48 @@
+import time
+
+import fakeredis
+import pytest
+
+from core.result_cache import InMemoryResultCache, RedisResultCache
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryResultCache(str(tmp_path), ttl=60)
+    return RedisResultCache(fakeredis.FakeRedis(decode_responses=True), str(tmp_path), ttl=60, prefix="test")
+
+def put_file(cache, key, filename):
+    with open(f"{cache.download_dir}/{filename}", "wb") as f:
+        f.write(b"data")
+    cache.put(key, {"filename": filename, "download_url": f"/downloads/{filename}"})
+
+def test_hit_and_miss(cache):
+    put_file(cache, "vid1:mp4:720p", "vid1_720p.mp4")
+    assert cache.get("vid1:mp4:720p")["filename"] == "vid1_720p.mp4"
+    assert cache.get("vid2:mp4:720p") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+def test_entry_with_deleted_file_is_evicted(cache, tmp_path):
+    put_file(cache, "vid1:mp4:720p", "vid1_720p.mp4")
+    (tmp_path / "vid1_720p.mp4").unlink()
+    assert cache.get("vid1:mp4:720p") is None
+    # 文件恢復後條目也不會復活
+    (tmp_path / "vid1_720p.mp4").write_bytes(b"data")
+    assert cache.get("vid1:mp4:720p") is None
+    assert cache.stats()["misses"] == 2
+
+def test_get_many_keeps_order(cache, tmp_path):
+    put_file(cache, "a", "a.mp4")
+    put_file(cache, "b", "b.mp4")
+    put_file(cache, "c", "c.mp4")
+    (tmp_path / "b.mp4").unlink()
+    entries = cache.get_many(["c", "missing", "b", "a"])
+    assert [e["filename"] if e else None for e in entries] == ["c.mp4", None, None, "a.mp4"]
+    assert cache.get_many([]) == []
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+def test_entries_expire(cache):
+    cache.ttl = 1
+    put_file(cache, "a", "a.mp4")
+    time.sleep(1.1)
+    assert cache.get("a") is None
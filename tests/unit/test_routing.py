@@ -0,0 +1,76 @@
+import pytest
+
+from core.config import settings
+from core.routing import (
+    AUDIO_QUEUE,
+    DOWNLOAD_TASK_NAME,
+    METADATA_QUEUE,
+    METADATA_TASK_NAME,
+    TRANSCODE_QUEUE,
+    TRANSCODE_TASK_NAME,
+    VIDEO_LONG_QUEUE,
+    VIDEO_SHORT_QUEUE,
+    broker_priority,
+    classify_download,
+    route_task,
+)
+
+@pytest.fixture(autouse=True)
+def short_limit(monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_SHORT_MAX_SECONDS", 1200)
+
+@pytest.mark.parametrize("format", ["mp3", "M4A", "opus", "wav"])
+def test_audio_formats_ignore_duration(format):
+    assert classify_download(format, "2160p", 10 * 3600) == AUDIO_QUEUE
+
+@pytest.mark.parametrize("quality, duration, queue", [
+    # 720p 及以下係數為 1，邊界值本身算短任務
+    ("720p", 1200, VIDEO_SHORT_QUEUE),
+    ("720p", 1201, VIDEO_LONG_QUEUE),
+    ("360p", 1200, VIDEO_SHORT_QUEUE),
+    ("360p", 1300, VIDEO_LONG_QUEUE),
+    # 1080p 係數 2.25：533 秒以內為短任務
+    ("1080p", 533, VIDEO_SHORT_QUEUE),
+    ("1080p", 534, VIDEO_LONG_QUEUE),
+    # 2160p 係數 9
+    ("2160p", 133, VIDEO_SHORT_QUEUE),
+    ("2160p", 134, VIDEO_LONG_QUEUE),
+    # 無法解析的畫質按 720p 計
+    ("best", 1200, VIDEO_SHORT_QUEUE),
+    (None, 1201, VIDEO_LONG_QUEUE),
+])
+def test_video_duration_thresholds(quality, duration, queue):
+    assert classify_download("mp4", quality, duration) == queue
+
+@pytest.mark.parametrize("quality, queue", [
+    ("1080p", VIDEO_SHORT_QUEUE),
+    ("1440p", VIDEO_LONG_QUEUE),
+    ("2160p", VIDEO_LONG_QUEUE),
+    (None, VIDEO_SHORT_QUEUE),
+])
+def test_unknown_duration_routes_by_quality(quality, queue):
+    assert classify_download("mp4", quality) == queue
+
+def test_threshold_follows_settings(monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_SHORT_MAX_SECONDS", 60)
+    assert classify_download("mp4", "720p", 61) == VIDEO_LONG_QUEUE
+
+@pytest.mark.parametrize("priority, expected", [
+    (9, 0), (0, 9), (5, 4), (None, 4),
+    # 超出範圍的值先截斷到 0-9
+    (42, 0), (-3, 9),
+])
+def test_broker_priority_is_inverted(priority, expected):
+    assert broker_priority(priority) == expected
+
+def test_higher_api_priority_sorts_first():
+    ordered = sorted(range(10), key=broker_priority)
+    assert ordered == list(range(9, -1, -1))
+
+def test_route_task():
+    assert route_task(DOWNLOAD_TASK_NAME, (), {"format": "mp4", "quality": "720p", "duration": 60}, {}) == {
+        "queue": VIDEO_SHORT_QUEUE}
+    assert route_task(DOWNLOAD_TASK_NAME, (), None, {}) == {"queue": VIDEO_SHORT_QUEUE}
+    assert route_task(METADATA_TASK_NAME, (), {}, {}) == {"queue": METADATA_QUEUE}
+    assert route_task(TRANSCODE_TASK_NAME, (), {}, {}) == {"queue": TRANSCODE_QUEUE}
+    assert route_task("other", (), {}, {}) is None
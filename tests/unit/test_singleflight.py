@@ -0,0 +1,61 @@
+import time
+
+import fakeredis
+import pytest
+
+from api.endpoints.download import get_task
+from core.singleflight import InMemoryInFlightRegistry, RedisInFlightRegistry
+from core.task_store import InMemoryTaskStore
+
+@pytest.fixture(params=["memory", "redis"])
+def registry(request):
+    if request.param == "memory":
+        return InMemoryInFlightRegistry()
+    return RedisInFlightRegistry(fakeredis.FakeRedis(decode_responses=True), prefix="test")
+
+def test_acquire_and_attach(registry):
+    assert registry.acquire("video:mp4:720p", "task-a", 60) == "task-a"
+    # 後來的請求附加到已有的持有者
+    assert registry.acquire("video:mp4:720p", "task-b", 60) == "task-a"
+    assert registry.owner("video:mp4:720p") == "task-a"
+
+def test_attach_within_batch(registry):
+    # 同一批中重複的影片附加到批內第一個任務
+    owners = registry.acquire_many([("k1", "task-a"), ("k2", "task-b"), ("k1", "task-c")], 60)
+    assert owners == ["task-a", "task-b", "task-a"]
+
+def test_replace_requires_expected_owner(registry):
+    assert registry.replace("k", None, "task-a", 60)
+    assert not registry.replace("k", None, "task-b", 60)
+    assert not registry.replace("k", "task-x", "task-b", 60)
+    assert registry.replace("k", "task-a", "task-b", 60)
+    assert registry.owner("k") == "task-b"
+
+def test_renew_and_release_only_by_owner(registry):
+    registry.acquire("k", "task-a", 60)
+    assert not registry.renew("k", "task-b", 60)
+    assert not registry.release("k", "task-b")
+    assert registry.renew("k", "task-a", 60)
+    assert registry.release("k", "task-a")
+    assert registry.owner("k") is None
+    assert not registry.renew("k", "task-a", 60)
+    assert registry.acquire("k", "task-b", 60) == "task-b"
+
+def test_expired_lease_can_be_taken_over(registry):
+    registry.acquire("k", "task-a", 1)
+    time.sleep(1.1)
+    assert registry.owner("k") is None
+    assert registry.acquire("k", "task-b", 60) == "task-b"
+
+def test_get_task_reports_lost_lease_without_writing():
+    store = InMemoryTaskStore()
+    registry = InMemoryInFlightRegistry()
+    store.create({"id": "task-a", "url": "https://youtu.be/abcdefghijk", "format": "mp4", "quality": "720p",
+                  "status": "processing", "created_at": "2024-01-01T00:00:00", "lease_key": "k"})
+    registry.acquire("k", "task-a", 60)
+    assert get_task("task-a", store=store, registry=registry)["status"] == "processing"
+
+    registry.release("k", "task-a")
+    assert get_task("task-a", store=store, registry=registry)["status"] == "failed"
+    assert store.get("task-a")["status"] == "processing"
+    assert store.get("task-a")["lease_key"] == "k"
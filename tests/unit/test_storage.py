@@ -0,0 +1,70 @@
+import logging
+import os
+from collections import namedtuple
+
+import pytest
+
+from core.file_index import InMemoryFileIndex
+from core.storage import InMemoryStorageManager, InsufficientStorage
+
+def make_manager(tmp_path, count):
+    index = InMemoryFileIndex(str(tmp_path))
+    for i in range(count):
+        (tmp_path / f"f{i}.mp4").write_bytes(b"x" * 100)
+        index.index(f"f{i}.mp4")
+        index.touch(f"f{i}.mp4", 1000 + i)
+    return InMemoryStorageManager(index, None, quota=1000, high_watermark=0.9, low_watermark=0.8,
+                                  reservation_ttl=60)
+
+def test_reserve_evicts_least_recent_unpinned_files(tmp_path):
+    manager = make_manager(tmp_path, 10)
+    manager.index.set_pinned("f0.mp4", True)
+    manager.index.touch("f1.mp4", 2000)
+    
+    manager.reserve("task", 50)
+    
+    # 降到低水位（800 - 50）以下：固定的 f0 與剛訪問過的 f1 保留，按訪問時間淘汰 f2 ~ f4
+    assert sorted(os.listdir(tmp_path)) == ["f0.mp4", "f1.mp4"] + [f"f{i}.mp4" for i in range(5, 10)]
+    assert manager.index.total_bytes() == 700
+    assert manager.reserved_bytes() == 50
+
+def test_reserve_rejects_without_evicting_when_it_cannot_fit(tmp_path):
+    manager = make_manager(tmp_path, 5)
+    manager.reserve("a", 400)
+    with pytest.raises(InsufficientStorage):
+        manager.reserve("b", 700)
+    assert len(os.listdir(tmp_path)) == 5
+    
+    manager.release("a")
+    assert manager.reserved_bytes() == 0
+
+DiskUsage = namedtuple("DiskUsage", "total used free")
+
+def disk_manager(tmp_path, monkeypatch, total, outside):
+    """配額為 0，按磁盤計量：已用 = 下載目錄以外的 outside 字節 + 已索引文件"""
+    manager = make_manager(tmp_path, 10)
+    manager.quota = 0
+    def disk_usage(path):
+        used = outside + manager.index.total_bytes()
+        return DiskUsage(total, used, total - used)
+    monkeypatch.setattr("core.storage.shutil.disk_usage", disk_usage)
+    return manager
+
+def test_disk_filled_by_other_data_keeps_downloads(tmp_path, monkeypatch, caplog):
+    # 低水位 8000，超出 8500 + 1000 - 8000 = 1500 字節，大於全部下載文件的 1000 字節
+    manager = disk_manager(tmp_path, monkeypatch, total=10000, outside=8500)
+    
+    with caplog.at_level(logging.WARNING, logger="core.storage"):
+        assert manager.enforce() == {"files": 0, "bytes": 0}
+    assert len(os.listdir(tmp_path)) == 10
+    assert "下載目錄以外的數據" in caplog.text
+    with pytest.raises(InsufficientStorage):
+        manager.reserve("task", 600)
+    assert len(os.listdir(tmp_path)) == 10
+
+def test_disk_eviction_stops_at_low_watermark(tmp_path, monkeypatch):
+    # 低水位 4000，超出 3600 + 1000 - 4000 = 600 字節，淘汰最舊的 6 個文件即可
+    manager = disk_manager(tmp_path, monkeypatch, total=5000, outside=3600)
+    
+    assert manager.enforce() == {"files": 6, "bytes": 600}
+    assert sorted(os.listdir(tmp_path)) == [f"f{i}.mp4" for i in range(6, 10)]
@@ -0,0 +1,30 @@
+from sqlalchemy.orm import sessionmaker
+
+from core.task_history import TaskHistoryWriter
+from db.base import Base, create_db_engine
+from models import DownloadTaskRecord
+
+def test_writer_coalesces_updates_without_regressing_status(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    writer = TaskHistoryWriter(Session, flush_interval=60, batch_size=100, max_pending=1000)
+    
+    # worker 的狀態變化先於 API 的創建記錄寫入
+    for progress in range(0, 101, 10):
+        writer.record("a1", {"status": "processing", "progress": progress})
+    writer.record("a1", {"status": "completed", "size": 1024})
+    assert writer.flush() == 1
+    
+    task = {"id": "a1", "url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "format": "mp4",
+            "quality": "720p", "status": "queued", "progress": 0, "created_at": "2026-01-01T00:00:00"}
+    writer.record_many([task])
+    assert writer.flush() == 1
+    writer.stop()
+    
+    with Session() as session:
+        row = session.get(DownloadTaskRecord, "a1")
+        assert (row.status, row.progress, row.size) == ("completed", 100, 1024)
+        assert row.video_id == "dQw4w9WgXcQ" and row.created_at.year == 2026
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
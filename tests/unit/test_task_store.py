@@ -0,0 +1,121 @@
+import threading
+from datetime import datetime, timedelta
+
+import fakeredis
+import pytest
+
+from core.pagination import decode_cursor, encode_cursor
+from core.task_store import InMemoryTaskStore, RedisTaskStore
+
+STATUSES = ["pending", "downloading", "completed", "failed"]
+START = datetime(2024, 1, 1)
+
+def make_task(i, status="pending", format="mp4", seconds=None):
+    created_at = START + timedelta(seconds=i if seconds is None else seconds)
+    return {"id": f"task-{i:04d}", "status": status, "format": format, "progress": 0,
+            "created_at": created_at.isoformat()}
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return InMemoryTaskStore()
+    return RedisTaskStore(fakeredis.FakeRedis(decode_responses=True), prefix="test")
+
+def assert_indexes_consistent(store):
+    # 每個任務恰好出現在其當前狀態的索引中
+    tasks = {task["id"]: task for task in store.list()}
+    assert len(tasks) == store.count()
+    assert sum(store.count(status) for status in STATUSES) == len(tasks)
+    for status in STATUSES:
+        assert sorted(t["id"] for t in store.list(status)) == sorted(
+            task_id for task_id, task in tasks.items() if task["status"] == status
+        )
+
+def test_create_update_delete(store):
+    store.create_many([make_task(i) for i in range(3)])
+    assert store.get("task-0001")["status"] == "pending"
+
+    task = store.update("task-0001", status="downloading", progress=40.5)
+    assert task["status"] == "downloading" and task["progress"] == 40.5
+    assert store.get("task-0001") == task
+    assert store.increment("task-0002", progress=3)["progress"] == 3
+    assert [t["id"] for t in store.list("downloading")] == ["task-0001"]
+    assert_indexes_consistent(store)
+
+    assert store.delete("task-0001")
+    assert not store.delete("task-0001")
+    assert store.get("task-0001") is None
+    assert store.get_many(["task-0000", "task-0001"])[1] is None
+    assert_indexes_consistent(store)
+
+def test_update_after_delete_does_not_recreate(store):
+    store.create(make_task(1))
+    store.delete("task-0001")
+    assert store.update("task-0001", status="completed", progress=100) is None
+    assert store.increment("task-0001", completed=1) is None
+    assert store.get("task-0001") is None
+    assert store.count() == 0
+    assert_indexes_consistent(store)
+
+def test_concurrent_status_changes_keep_one_index_entry(store):
+    store.create_many([make_task(i) for i in range(4)])
+
+    def change(offset):
+        for n in range(50):
+            for i in range(4):
+                store.update(f"task-{i:04d}", status=STATUSES[(n + offset) % len(STATUSES)])
+
+    threads = [threading.Thread(target=change, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert_indexes_consistent(store)
+
+def collect_pages(store, limit, **filters):
+    # 經游標編碼 / 解碼翻完所有頁
+    pages = []
+    cursor = None
+    while True:
+        items, next_key = store.list_page(limit, after=decode_cursor(cursor) if cursor else None, **filters)
+        pages.append([item["id"] for item in items])
+        cursor = encode_cursor(next_key)
+        if cursor is None:
+            return pages
+
+def test_cursor_round_trip():
+    key = (1704067200.123456, "task-0001")
+    assert decode_cursor(encode_cursor(key)) == key
+    assert encode_cursor(None) is None
+    for cursor in ("not-base64!", "W10", encode_cursor(key)[:-3] + "xyz"):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+def test_list_page_boundaries(store):
+    # 同一秒創建的任務以 task_id 排序，不會在翻頁時重複或遺漏
+    store.create_many([make_task(i, seconds=i // 3) for i in range(10)])
+    expected = [f"task-{i:04d}" for i in range(10)]
+    for limit in (1, 3, 5, 10, 50):
+        pages = collect_pages(store, limit)
+        assert [task_id for page in pages for task_id in page] == expected
+        assert all(len(page) == limit for page in pages[:-1])
+        # 恰好取完時沒有多餘的空頁
+        assert pages[-1] or len(pages) == 1
+    assert store.list_page(5, after=(float(START.timestamp() + 100), "z")) == ([], None)
+
+def test_list_page_filters(store):
+    formats = ["mp4", "mp3", "webm"]
+    store.create_many([
+        make_task(i, status=STATUSES[i % 2], format=formats[i % 3]) for i in range(30)
+    ])
+    store.update("task-0000", status="completed")
+    tasks = store.list()
+
+    for status in (None, "pending", "downloading", "completed"):
+        for format in (None, "mp4", "mp3"):
+            expected = [
+                t["id"] for t in tasks
+                if (status is None or t["status"] == status) and (format is None or t["format"] == format)
+            ]
+            pages = collect_pages(store, 4, status=status, format=format)
+            assert [task_id for page in pages for task_id in page] == expected, (status, format)
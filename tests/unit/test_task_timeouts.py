@@ -0,0 +1,64 @@
+import pytest
+from celery.contrib.testing.mocks import TaskMessage
+from celery.utils.imports import symbol_by_name
+
+import celery_app  # noqa: F401
+from core.events import InMemoryEventBus
+from core.file_index import InMemoryFileIndex
+from core.singleflight import InMemoryInFlightRegistry
+from core.storage import InMemoryStorageManager
+from core.task_store import InMemoryTaskStore
+from tasks import youtube
+from tasks.transcode import transcode_media
+from tasks.youtube import download_youtube_video
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+LEASE = "abcdefghijk:mp4:720p"
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    store = InMemoryTaskStore()
+    registry = InMemoryInFlightRegistry()
+    storage = InMemoryStorageManager(InMemoryFileIndex(str(tmp_path)), None, quota=10000, high_watermark=0.9,
+                                     low_watermark=0.8, reservation_ttl=3600)
+    monkeypatch.setattr(youtube, "get_task_store", lambda: store)
+    monkeypatch.setattr(youtube, "get_event_bus", InMemoryEventBus)
+    monkeypatch.setattr(youtube, "get_inflight_registry", lambda: registry)
+    monkeypatch.setattr(youtube, "get_storage_manager", lambda: storage)
+    store.create({"id": "task-a", "url": URL, "format": "mp4", "quality": "720p", "status": "processing",
+                  "created_at": "2024-01-01T00:00:00", "lease_key": LEASE})
+    registry.acquire(LEASE, "task-a", 60)
+    return store, registry, storage
+
+def timeout(task, celery_id, soft):
+    message = TaskMessage(task.name, id=celery_id,
+                          kwargs={"task_id": "task-a", "url": URL, "format": "mp4", "quality": "720p"})
+    request = symbol_by_name(task.Request)(message, app=task.app, task=task)
+    request.on_timeout(soft, 1800)
+
+@pytest.mark.parametrize("task, celery_id", [
+    (download_youtube_video, "task-a"),
+    (transcode_media, "task-a-transcode"),
+])
+def test_hard_time_limit_fails_task_and_releases_lease(state, task, celery_id):
+    store, registry, storage = state
+    storage.reserve(celery_id, 100)
+    
+    timeout(task, celery_id, soft=False)
+    
+    assert store.get("task-a")["status"] == "failed"
+    assert registry.owner(LEASE) is None
+    assert storage.reserved_bytes() == 0
+
+def test_soft_time_limit_is_left_to_the_task(state):
+    store, registry, storage = state
+    timeout(download_youtube_video, "task-a", soft=True)
+    assert store.get("task-a")["status"] == "processing"
+    assert registry.owner(LEASE) == "task-a"
+
+def test_lease_taken_over_by_another_task_is_kept(state):
+    store, registry, storage = state
+    registry.release(LEASE, "task-a")
+    registry.acquire(LEASE, "task-b", 60)
+    timeout(download_youtube_video, "task-a", soft=False)
+    assert registry.owner(LEASE) == "task-b"
@@ -0,0 +1,18 @@
+from core.transcoder import ffmpeg_command, needs_transcode, plan_transcode
+
+def test_stream_copy_when_codecs_fit_container():
+    assert plan_transcode("mp4", "avc1.64001f", "mp4a.40.2") == {"video": "copy", "audio": "copy"}
+    assert plan_transcode("opus", "none", "opus") == {"video": None, "audio": "copy"}
+    # avi 可容納 h264，只需把 aac 音軌編碼為 mp3
+    assert plan_transcode("avi", "avc1.4d401f", "mp4a.40.2") == {"video": "copy", "audio": "libmp3lame"}
+
+def test_reencode_incompatible_or_unknown_codecs():
+    assert plan_transcode("mp3", "none", "opus") == {"video": None, "audio": "libmp3lame"}
+    assert plan_transcode("webm", "avc1", None) == {"video": "libvpx-vp9", "audio": "libopus"}
+
+def test_needs_transcode_and_command():
+    assert not needs_transcode("abc_mp4_720p.mp4", "mp4")
+    assert needs_transcode("abc_mp3_720p.webm", "mp3")
+    command = ffmpeg_command("in.webm", "out.mp3.part", "mp3", {"video": None, "audio": "copy"})
+    assert command[-3:] == ["-f", "mp3", "out.mp3.part"]
+    assert "-vn" in command and command[command.index("-c:a") + 1] == "copy"